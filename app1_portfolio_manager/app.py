@@ -4,7 +4,7 @@ Create and manage portfolios, import/export MDR from/to Excel
 """
 
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, session, send_file, Response, stream_with_context
 from werkzeug.utils import secure_filename
 import sys
 
@@ -13,11 +13,20 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from shared.models import db, Portfolio, User, Document, Discipline, Submission
 from shared.database import init_db, get_db_uri, seed_demo_data
-from shared.auth import login_required, role_required, get_current_user
-from shared.excel_handler import MDRExcelExporter, MDRExcelImporter
+from shared.auth import login_required, role_required, get_current_user, get_user_portfolio_ids
+from shared.excel_handler import MDRExcelExporter, MDRExcelImporter, MDRExcelValidator
+from shared.jobs import current_artifact, export_filename
+from shared.flat_export import FLAT_FORMATS, iter_flat_export, write_flat_export
+from shared.multisheet_export import MultiSheetExporter
+from shared.summary import portfolio_summaries
+from shared.measurement import portfolio_progress, parse_weights
+from shared.forecast import forecast_portfolio, DEFAULT_SIMULATIONS
+from shared.turnaround import client_turnarounds
+from shared.search import search_documents, DEFAULT_PAGE_SIZE
 from mdr_stages_config import STANDARD_STAGES
 from datetime import datetime
 import json
+import tempfile
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
@@ -26,6 +35,8 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(__file__), 'uploads')
 app.config['FEEDBACK_FOLDER'] = os.path.join(os.path.dirname(__file__), 'uploads', 'client_feedback')
 app.config['MAX_CONTENT_LENGTH'] = 32 * 1024 * 1024  # 32MB max file size
+app.config['EXPORT_SPOOL_MAX_SIZE'] = 8 * 1024 * 1024  # Exports larger than this spill to a temp file
+app.config['EXPORT_WORKERS'] = int(os.environ.get('MDR_EXPORT_WORKERS', min(4, os.cpu_count() or 1)))
 
 # Ensure upload folders exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -51,18 +62,22 @@ def index():
     
     portfolios = Portfolio.query.order_by(Portfolio.created_at.desc()).all()
     
-    # Get statistics for each portfolio
+    # Get statistics for each portfolio (one read of the summary table)
+    summaries = portfolio_summaries()
     portfolio_stats = []
     for portfolio in portfolios:
-        doc_count = Document.query.filter_by(portfolio_id=portfolio.id).count()
-        discipline_count = Discipline.query.filter_by(portfolio_id=portfolio.id).count()
+        summary = summaries.get(portfolio.id)
         portfolio_stats.append({
             'portfolio': portfolio,
-            'doc_count': doc_count,
-            'discipline_count': discipline_count
+            'doc_count': summary.documents if summary else 0,
+            'discipline_count': summary.disciplines if summary else 0
         })
     
-    return render_template('index.html', portfolio_stats=portfolio_stats, user=user)
+    # Days with client per client and stage, precomputed on write
+    turnarounds = client_turnarounds({portfolio.client for portfolio in portfolios})
+    
+    return render_template('index.html', portfolio_stats=portfolio_stats, turnarounds=turnarounds,
+                           stages=STANDARD_STAGES, user=user)
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -151,6 +166,7 @@ def view_portfolio(portfolio_id):
                          portfolio=portfolio,
                          documents_by_discipline=documents_by_discipline,
                          total_docs=total_docs,
+                         flat_formats=FLAT_FORMATS,
                          user=get_current_user())
 
 
@@ -212,26 +228,119 @@ def import_excel(portfolio_id):
     return render_template('import_excel.html', portfolio=portfolio, user=get_current_user())
 
 
+@app.route('/portfolios/<int:portfolio_id>/import/validate', methods=['POST'])
+@login_required
+@role_required('admin', 'scheduler')
+def validate_import(portfolio_id):
+    """Dry-run an MDR import and download the validation report (no database writes)"""
+    portfolio = Portfolio.query.get_or_404(portfolio_id)
+    
+    file = request.files.get('file')
+    if not file or not file.filename.endswith('.xlsx'):
+        flash('Please upload an Excel file (.xlsx)', 'danger')
+        return redirect(url_for('import_excel', portfolio_id=portfolio_id))
+    
+    # Unique temp name so concurrent validations never share a file
+    fd, filepath = tempfile.mkstemp(suffix='.xlsx', dir=app.config['UPLOAD_FOLDER'])
+    os.close(fd)
+    file.save(filepath)
+    
+    # Read what the import would collide with before streaming starts
+    known_disciplines = [d.name for d in Discipline.query.filter_by(portfolio_id=portfolio_id).all()]
+    existing_doc_numbers = [row[0] for row in db.session.query(Document.doc_number).filter_by(portfolio_id=portfolio_id)]
+    validator = MDRExcelValidator(filepath,
+                                  known_disciplines=known_disciplines,
+                                  existing_doc_numbers=existing_doc_numbers)
+    
+    def remove_upload():
+        try:
+            os.remove(filepath)
+        except OSError:
+            pass
+    
+    report_name = secure_filename(f"{portfolio.code}_{os.path.splitext(file.filename)[0]}_validation.csv")
+    response = Response(validator.iter_csv_report(), mimetype='text/csv')
+    response.headers.set('Content-Disposition', 'attachment', filename=report_name)
+    # Runs even if the client disconnects or the body is never iterated
+    response.call_on_close(remove_upload)
+    return response
+
+
 @app.route('/portfolios/<int:portfolio_id>/export')
 @login_required
 def export_excel(portfolio_id):
-    """Export MDR to Excel"""
+    """
+    Export MDR to Excel
+    
+    ?format=csv|tsv|ndjson|parquet gives an unstyled data file instead, and
+    ?layout=disciplines one worksheet per discipline plus a summary sheet.
+    """
     portfolio = Portfolio.query.get_or_404(portfolio_id)
+    fmt = request.args.get('format', 'xlsx').lower()
+    per_discipline = request.args.get('layout') == 'disciplines'
     
+    if fmt in FLAT_FORMATS:
+        return _export_flat(portfolio, fmt)
+    if fmt != 'xlsx':
+        flash(f'Unknown export format "{fmt}"', 'danger')
+        return redirect(url_for('view_portfolio', portfolio_id=portfolio_id))
+    
+    filename = export_filename(portfolio)
+    
+    # Serve the nightly pre-rendered workbook if nothing changed since it was built
+    artifact = None if per_discipline else current_artifact(portfolio.id)
+    if artifact:
+        try:
+            return send_file(artifact,
+                            as_attachment=True,
+                            download_name=filename,
+                            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        except FileNotFoundError:
+            pass  # Replaced by a newer render between the check and the open; generate live
+    
+    # Generate into a per-request buffer (memory, spilling to disk when large)
+    # so concurrent exports never share a file and nothing is left behind
+    buffer = tempfile.SpooledTemporaryFile(max_size=app.config['EXPORT_SPOOL_MAX_SIZE'])
     try:
-        # Generate Excel file
-        exporter = MDRExcelExporter(portfolio)
-        filename = f"{portfolio.code}_MDR.xlsx"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        exporter.export(filepath)
-        
-        return send_file(filepath, 
-                        as_attachment=True,
-                        download_name=filename,
-                        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        if per_discipline:
+            MultiSheetExporter(portfolio, workers=app.config['EXPORT_WORKERS']).export(buffer)
+        else:
+            MDRExcelExporter(portfolio).export(buffer)
     except Exception as e:
+        buffer.close()
         flash(f'Error exporting Excel: {str(e)}', 'danger')
         return redirect(url_for('view_portfolio', portfolio_id=portfolio_id))
+    
+    # send_file closes the buffer when the response is closed
+    buffer.seek(0)
+    return send_file(buffer,
+                    as_attachment=True,
+                    download_name=filename,
+                    mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+
+def _export_flat(portfolio, fmt):
+    """Data-only export straight from a database cursor (no openpyxl)"""
+    mimetype = FLAT_FORMATS[fmt][0]
+    filename = export_filename(portfolio, fmt)
+    
+    if fmt == 'parquet':
+        # Parquet writes its footer last, so it can't be streamed row by row
+        buffer = tempfile.SpooledTemporaryFile(max_size=app.config['EXPORT_SPOOL_MAX_SIZE'])
+        try:
+            write_flat_export(portfolio.id, buffer, fmt)
+        except Exception as e:
+            buffer.close()
+            flash(f'Error exporting {fmt.upper()}: {str(e)}', 'danger')
+            return redirect(url_for('view_portfolio', portfolio_id=portfolio.id))
+        buffer.seek(0)
+        return send_file(buffer, as_attachment=True, download_name=filename, mimetype=mimetype)
+    
+    # Text formats stream as the cursor advances; the request context stays
+    # open for the database session until the last chunk is sent
+    response = Response(stream_with_context(iter_flat_export(portfolio.id, fmt)), mimetype=mimetype)
+    response.headers.set('Content-Disposition', 'attachment', filename=secure_filename(filename))
+    return response
 
 
 @app.route('/portfolios/<int:portfolio_id>/delete', methods=['POST'])
@@ -330,6 +439,97 @@ def get_spreadsheet_data(portfolio_id):
     return jsonify(data)
 
 
+@app.route('/api/portfolios/<int:portfolio_id>/progress')
+@login_required
+def get_progress(portfolio_id):
+    """
+    API endpoint for weighted % complete and planned-vs-actual S-curves
+    
+    ?period=day|week|month (default week); ?weights=IFR:10,IFD:30,AFC:100
+    overrides the cumulative stage weights of STAGE_PROGRESS_WEIGHTS.
+    """
+    from flask import jsonify
+    
+    Portfolio.query.get_or_404(portfolio_id)
+    try:
+        weights = parse_weights(request.args['weights']) if request.args.get('weights') else None
+        progress = portfolio_progress(portfolio_id, weights=weights, period=request.args.get('period', 'week'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(progress)
+
+
+@app.route('/api/portfolios/<int:portfolio_id>/forecast')
+@login_required
+def get_forecast(portfolio_id):
+    """API endpoint for the Monte Carlo AFC completion forecast (P50/P80 per discipline)"""
+    from flask import jsonify
+    
+    Portfolio.query.get_or_404(portfolio_id)
+    try:
+        simulations = int(request.args.get('simulations', DEFAULT_SIMULATIONS))
+        forecast = forecast_portfolio(portfolio_id, simulations=simulations)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(forecast)
+
+
+@app.route('/search')
+@login_required
+def search():
+    """Search documents, remarks and transmittals across the user's portfolios"""
+    user = get_current_user()
+    query = request.args.get('q', '').strip()
+    results = None
+    if query:
+        try:
+            results = search_documents(query, get_user_portfolio_ids(user), page=request.args.get('page', 1, type=int))
+        except ValueError as e:
+            flash(str(e), 'danger')
+    return render_template('search.html', query=query, results=results, user=user)
+
+
+@app.route('/api/search')
+@login_required
+def api_search():
+    """
+    API endpoint: ranked full-text search over the user's portfolios
+    
+    ?q=words (every word must match, as a prefix), page (from 1) and per_page.
+    """
+    from flask import jsonify
+    
+    try:
+        results = search_documents(request.args.get('q', ''), get_user_portfolio_ids(get_current_user()),
+                                   page=request.args.get('page', 1, type=int),
+                                   per_page=request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(results)
+
+
+@app.route('/api/turnarounds')
+@login_required
+def get_turnarounds():
+    """
+    API endpoint for client turnaround KPIs: working days with the client per client and stage
+    
+    ?client=NAME (repeatable) limits the clients returned.
+    """
+    from flask import jsonify
+    
+    clients = request.args.getlist('client') or None
+    return jsonify([{
+        'client': row.client,
+        'stage': row.stage,
+        'samples': row.samples,
+        'mean_days': row.mean_days,
+        'p90_days': row.p90_days,
+        'outstanding': row.outstanding,
+        'updated_at': row.updated_at.isoformat() if row.updated_at else None,
+    } for row in client_turnarounds(clients)])
+
+
 @app.route('/api/portfolios/<int:portfolio_id>/update-spreadsheet', methods=['POST'])
 @login_required
 @role_required('admin', 'scheduler')
@@ -7,13 +7,19 @@ import os
 import sys
 from flask import Flask, render_template, request, redirect, url_for, flash, session
 from werkzeug.security import generate_password_hash
+from sqlalchemy import func
 
 # Add parent directory to path to import shared modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from shared.models import db, Portfolio, User, Discipline, TeamMembership, Document
+from shared.models import db, Portfolio, User, Discipline, TeamMembership, WorkCalendar
 from shared.database import init_db, get_db_uri
 from shared.auth import login_required, role_required, get_current_user
+from shared.summary import discipline_summaries, UNASSIGNED
+from shared.scheduling import plan_schedule, apply_schedule
+from shared.calendars import WEEKDAYS, parse_holidays, save_calendar, portfolio_calendar
+from shared.dates import parse_date
+from mdr_stages_config import STANDARD_STAGES, STAGE_DURATIONS
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-change-in-production-scheduler'
@@ -79,15 +85,33 @@ def view_portfolio(portfolio_id):
     
     # Get all users for assignment dropdown
     all_users = User.query.order_by(User.name).all()
+    calendars = WorkCalendar.query.order_by(WorkCalendar.name).all()
     
     return render_template('view_portfolio.html', 
                          portfolio=portfolio,
                          disciplines=disciplines,
                          discipline_teams=discipline_teams,
                          all_users=all_users,
+                         calendars=calendars,
                          user=get_current_user())
 
 
+@app.route('/portfolios/<int:portfolio_id>/calendar', methods=['POST'])
+@login_required
+@role_required('admin', 'scheduler')
+def assign_calendar(portfolio_id):
+    """Set the working-day calendar of a portfolio"""
+    portfolio = Portfolio.query.get_or_404(portfolio_id)
+    calendar_id = request.form.get('calendar_id', '')
+    calendar = WorkCalendar.query.get_or_404(int(calendar_id)) if calendar_id else None
+    
+    portfolio.calendar = calendar
+    db.session.commit()
+    
+    flash(f'Working days of "{portfolio.name}" now follow {calendar.name if calendar else "Monday to Friday"}', 'success')
+    return redirect(url_for('view_portfolio', portfolio_id=portfolio_id))
+
+
 @app.route('/portfolios/<int:portfolio_id>/disciplines/add', methods=['POST'])
 @login_required
 @role_required('admin', 'scheduler')
@@ -256,28 +280,158 @@ def delete_user(user_id):
     return redirect(url_for('list_users'))
 
 
+def _calendar_form(form):
+    """(name, weekmask, holidays) from a calendar form; raises ValueError for bad input"""
+    name = form.get('name', '').strip()
+    if not name:
+        raise ValueError('Calendar name is required')
+    weekmask = ''.join('1' if form.get(f'day_{day}') else '0' for day in WEEKDAYS)
+    return name, weekmask, parse_holidays(form.get('holidays', ''))
+
+
+@app.route('/calendars', methods=['GET', 'POST'])
+@login_required
+@role_required('admin', 'scheduler')
+def list_calendars():
+    """Working-day calendars: list them and create new ones"""
+    if request.method == 'POST':
+        try:
+            name, weekmask, holidays = _calendar_form(request.form)
+            if WorkCalendar.query.filter_by(name=name).first():
+                raise ValueError('A calendar with this name already exists')
+            save_calendar(db.session, name, weekmask, holidays)
+            db.session.commit()
+            flash(f'Calendar "{name}" created', 'success')
+            return redirect(url_for('list_calendars'))
+        except ValueError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+    
+    calendars = WorkCalendar.query.order_by(WorkCalendar.name).all()
+    return render_template('calendars.html', calendars=calendars, weekdays=WEEKDAYS, user=get_current_user())
+
+
+@app.route('/calendars/<int:calendar_id>', methods=['POST'])
+@login_required
+@role_required('admin', 'scheduler')
+def update_calendar(calendar_id):
+    """Update a calendar's name, working week and holidays"""
+    calendar = WorkCalendar.query.get_or_404(calendar_id)
+    try:
+        name, weekmask, holidays = _calendar_form(request.form)
+        if WorkCalendar.query.filter(WorkCalendar.name == name, WorkCalendar.id != calendar_id).first():
+            raise ValueError('A calendar with this name already exists')
+        save_calendar(db.session, name, weekmask, holidays, calendar)
+        db.session.commit()
+        flash(f'Calendar "{name}" saved', 'success')
+    except ValueError as e:
+        db.session.rollback()
+        flash(str(e), 'danger')
+    return redirect(url_for('list_calendars'))
+
+
+@app.route('/calendars/<int:calendar_id>/delete', methods=['POST'])
+@login_required
+@role_required('admin', 'scheduler')
+def delete_calendar(calendar_id):
+    """Delete a calendar; its portfolios fall back to Monday to Friday"""
+    calendar = WorkCalendar.query.get_or_404(calendar_id)
+    
+    db.session.delete(calendar)
+    db.session.commit()
+    
+    flash(f'Calendar "{calendar.name}" deleted', 'success')
+    return redirect(url_for('list_calendars'))
+
+
 @app.route('/wbs/<int:portfolio_id>')
 @login_required
 @role_required('admin', 'scheduler')
 def work_breakdown(portfolio_id):
     """Work Breakdown Structure view"""
     portfolio = Portfolio.query.get_or_404(portfolio_id)
-    disciplines = Discipline.query.filter_by(portfolio_id=portfolio_id).all()
+    disciplines = Discipline.query.filter_by(portfolio_id=portfolio_id).order_by(Discipline.name).all()
+    
+    # Progress per discipline from the materialized summaries, team sizes in one grouped query
+    summaries = discipline_summaries(portfolio_id)
+    team_counts = dict(db.session.query(TeamMembership.discipline_id, func.count(TeamMembership.id))
+                       .join(Discipline).filter(Discipline.portfolio_id == portfolio_id)
+                       .group_by(TeamMembership.discipline_id).all())
     
-    # Get documents grouped by discipline
     wbs_data = {}
     for discipline in disciplines:
-        documents = Document.query.filter_by(discipline_id=discipline.id).all()
-        team_count = TeamMembership.query.filter_by(discipline_id=discipline.id).count()
         wbs_data[discipline.name] = {
-            'documents': documents,
-            'team_count': team_count,
+            'summary': summaries.get(discipline.id),
+            'team_count': team_counts.get(discipline.id, 0),
             'discipline_id': discipline.id
         }
+    if UNASSIGNED in summaries:
+        wbs_data['Unassigned'] = {'summary': summaries[UNASSIGNED], 'team_count': 0, 'discipline_id': None}
     
     return render_template('wbs.html', 
                          portfolio=portfolio,
                          wbs_data=wbs_data,
+                         stages=STANDARD_STAGES,
+                         user=get_current_user())
+
+
+# Changes listed on the back-scheduling preview; the rest are only counted
+PREVIEW_LIMIT = 500
+
+
+def _schedule_options(form):
+    """plan_schedule arguments from the back-scheduling form; raises ValueError for bad input"""
+    durations = {}
+    for stage in STANDARD_STAGES[:-1]:
+        value = form.get(f"duration_{stage['code']}", '').strip()
+        if value:
+            if not value.isdigit():
+                raise ValueError(f"Duration of {stage['code']} must be a whole number of working days")
+            durations[stage['code']] = int(value)
+    holidays = [parse_date(text) for text in form.get('holidays', '').replace(',', '\n').split('\n') if text.strip()]
+    discipline = form.get('discipline_id', '')
+    return {
+        'target': parse_date(form.get('target')),
+        'durations': durations,
+        'discipline_id': int(discipline) if discipline else None,
+        'overwrite': bool(form.get('overwrite')),
+        'holidays': holidays,
+    }
+
+
+@app.route('/portfolios/<int:portfolio_id>/schedule', methods=['GET', 'POST'])
+@login_required
+@role_required('admin', 'scheduler')
+def back_schedule(portfolio_id):
+    """Back-schedule planned stage dates from AFC targets: preview the changes, then apply them"""
+    portfolio = Portfolio.query.get_or_404(portfolio_id)
+    disciplines = Discipline.query.filter_by(portfolio_id=portfolio_id).order_by(Discipline.name).all()
+    form = request.form if request.method == 'POST' else {
+        **{f"duration_{code}": days for code, days in STAGE_DURATIONS.items()}, 'overwrite': 'on'}
+    schedule = None
+    
+    if request.method == 'POST':
+        try:
+            schedule = plan_schedule(portfolio_id, **_schedule_options(request.form))
+            if request.form.get('action') == 'apply':
+                if request.form.get('version') != str(schedule.version):
+                    flash('The portfolio changed since the preview; review the updated changes before applying', 'warning')
+                else:
+                    updated = apply_schedule(schedule)
+                    flash(f'Planned dates updated on {updated} documents ({len(schedule.changes)} dates)', 'success')
+                    return redirect(url_for('work_breakdown', portfolio_id=portfolio_id))
+        except ValueError as e:
+            flash(str(e), 'danger')
+            schedule = None
+    
+    return render_template('schedule.html',
+                         portfolio=portfolio,
+                         disciplines=disciplines,
+                         stages=STANDARD_STAGES,
+                         form=form,
+                         schedule=schedule,
+                         calendar=portfolio_calendar(portfolio_id),
+                         preview_limit=PREVIEW_LIMIT,
                          user=get_current_user())
 
 
@@ -9,13 +9,20 @@ import json
 from datetime import datetime, date
 from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file
 from werkzeug.utils import secure_filename
+from sqlalchemy.orm import load_only, joinedload
 
 # Add parent directory to path to import shared modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from shared.models import db, User, Portfolio, Discipline, Document, Submission, TeamMembership
 from shared.database import init_db, get_db_uri
-from shared.auth import login_required, get_current_user, get_user_portfolios, get_user_disciplines, user_can_access_portfolio
+from shared.auth import login_required, get_current_user, get_user_portfolios, get_user_disciplines, user_can_access_portfolio, \
+    get_user_portfolio_ids
+from shared.document_query import query_documents, FEEDBACK_STAGES, STATUS_FILTERS, DEFAULT_PAGE_SIZE, LIST_COLUMNS
+from shared.status import BOARD_COLUMNS
+from shared.summary import discipline_summaries, combine
+from shared.turnaround import client_turnarounds
+from shared.search import search_documents, DEFAULT_PAGE_SIZE as SEARCH_PAGE_SIZE
 from mdr_stages_config import STANDARD_STAGES
 
 app = Flask(__name__)
@@ -35,6 +42,9 @@ init_db(app)
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'pdf', 'dwg', 'xlsx', 'xls', 'doc', 'docx', 'zip', 'rar', 'png', 'jpg', 'jpeg'}
 
+# Documents listed under "Requires Attention" on the dashboard
+ATTENTION_LIMIT = 10
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -52,38 +62,66 @@ def get_document_stats_for_portfolio(user, portfolio_id):
     user_disciplines = get_user_disciplines(user, portfolio_id)
     discipline_ids = [d.id for d in user_disciplines]
     
-    all_docs = Document.query.filter(Document.discipline_id.in_(discipline_ids)).all()
-    
-    stats = {
-        'total': len(all_docs),
-        'pending': 0,
-        'submitted': 0,
-        'approved': 0,
-        'overdue': 0,
-        'requires_attention': []
+    # Counters from the materialized discipline summaries
+    summaries = discipline_summaries(portfolio_id)
+    totals = combine([summaries[d] for d in discipline_ids if d in summaries])
+    
+    # Documents with client feedback (a reply for any stage) require attention
+    attention = Document.query.options(load_only(*LIST_COLUMNS)).filter(
+        Document.discipline_id.in_(discipline_ids), Document.feedback_stage.isnot(None)
+    ).order_by(Document.doc_number, Document.id).limit(ATTENTION_LIMIT).all()
+    
+    return {
+        'total': totals['documents'],
+        'pending': totals['pending'],
+        'submitted': totals['submitted'],
+        'approved': totals['approved'],
+        'overdue': totals['overdue'],
+        'requires_attention_count': totals['requires_attention'],
+        'requires_attention': attention
+    }
+
+
+def status_badge(status):
+    """Bootstrap badge colour for a current_status value"""
+    if not status:
+        return 'warning text-dark'
+    status = status.lower()
+    if 'approved' in status or 'afc' in status:
+        return 'success'
+    if 'client' in status or 'review' in status:
+        return 'info'
+    if 'submitted' in status:
+        return 'primary'
+    return 'secondary'
+
+
+def serialize_document_row(doc):
+    """Document list row, shared by the page and the documents API"""
+    return {
+        'id': doc.id,
+        'doc_number': doc.doc_number,
+        'doc_title': doc.doc_title,
+        'discipline': doc.discipline.name if doc.discipline else None,
+        'feedback_stage': doc.feedback_stage,
+        'status': doc.current_status or 'Draft',
+        'status_badge': status_badge(doc.current_status),
+        'revision': doc.current_revision or None,
+        'feedback_url': url_for('view_feedback', document_id=doc.id),
+        'submit_url': url_for('submit_document', document_id=doc.id),
+    }
+
+
+def document_list_filters(args):
+    """Filter and paging arguments of the document list (query string) for query_documents"""
+    return {
+        'status': args.get('status') or None,
+        'discipline_id': args.get('discipline', type=int),
+        'stage': args.get('stage') or None,
+        'text': args.get('q') or None,
+        'after': args.get('after') or None,
+        'limit': args.get('limit', DEFAULT_PAGE_SIZE, type=int),
     }
-    
-    for doc in all_docs:
-        status = (doc.current_status or '').lower()
-        
-        # Check if document has client feedback (requires attention)
-        for stage in STANDARD_STAGES:
-            stage_code = stage['code'].lower()
-            date_received = getattr(doc, f'{stage_code}_date_received', None)
-            if date_received:
-                # Has feedback - requires attention
-                stats['requires_attention'].append(doc)
-                break
-        
-        # Categorize by status
-        if 'afc' in status or 'approved' in status:
-            stats['approved'] += 1
-        elif 'client' in status or 'review' in status or 'submitted' in status:
-            stats['submitted'] += 1
-        elif 'draft' in status or not status:
-            stats['pending'] += 1
-    
-    return stats
 
 
 @app.route('/')
@@ -102,6 +140,7 @@ def index():
         'submitted': 0,
         'approved': 0,
         'overdue': 0,
+        'requires_attention_count': 0,
         'requires_attention': []
     }
     
@@ -118,7 +157,9 @@ def index():
         total_stats['submitted'] += stats['submitted']
         total_stats['approved'] += stats['approved']
         total_stats['overdue'] += stats['overdue']
+        total_stats['requires_attention_count'] += stats['requires_attention_count']
         total_stats['requires_attention'].extend(stats['requires_attention'])
+    total_stats['requires_attention'] = total_stats['requires_attention'][:ATTENTION_LIMIT]
     
     # Get recent submissions
     user_discipline_ids = []
@@ -130,11 +171,15 @@ def index():
         Submission.created_at.desc()
     ).limit(5).all()
     
+    # Days with client of the clients of the user's portfolios
+    turnarounds = client_turnarounds({portfolio.client for portfolio in portfolios}) if portfolios else []
+    
     return render_template('dashboard_home.html',
                          user=user,
                          portfolio_stats=portfolio_stats,
                          total_stats=total_stats,
-                         recent_submissions=recent_submissions)
+                         recent_submissions=recent_submissions,
+                         turnarounds=turnarounds)
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -198,20 +243,81 @@ def document_list(portfolio_id):
     user_disciplines = get_user_disciplines(user, portfolio_id)
     discipline_ids = [d.id for d in user_disciplines]
     
-    # Get all documents for user's disciplines
-    documents = Document.query.filter(Document.discipline_id.in_(discipline_ids)).order_by(Document.doc_number).all()
+    # First page only; further pages and filter changes come from the documents API
+    filters = document_list_filters(request.args)
+    filters['after'] = None
+    try:
+        documents, next_cursor, total = query_documents(portfolio_id, discipline_ids, with_total=True, **filters)
+    except ValueError as e:
+        flash(str(e), 'warning')
+        filters.update(status=None, discipline_id=None, stage=None, text=None)
+        documents, next_cursor, total = query_documents(portfolio_id, discipline_ids, with_total=True, **filters)
     
     # Get statistics
     stats = get_document_stats_for_portfolio(user, portfolio_id)
     
     return render_template('document_list.html',
                          portfolio=portfolio,
-                         documents=documents,
+                         documents=[serialize_document_row(doc) for doc in documents],
+                         next_cursor=next_cursor,
+                         total=total,
+                         filters=filters,
+                         status_filters=STATUS_FILTERS,
+                         stages=FEEDBACK_STAGES,
                          user_disciplines=user_disciplines,
                          stats=stats,
                          user=user)
 
 
+@app.route('/api/portfolios/<int:portfolio_id>/documents')
+@login_required
+def api_document_list(portfolio_id):
+    """
+    API endpoint: one page of the user's documents in a portfolio
+    
+    Query string: status, discipline (id), stage, q (search words),
+    limit and after (the "next" cursor of the previous page). The total is
+    included for the first page only.
+    """
+    user = get_current_user()
+    if not user_can_access_portfolio(user, portfolio_id):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    discipline_ids = [d.id for d in get_user_disciplines(user, portfolio_id)]
+    filters = document_list_filters(request.args)
+    try:
+        documents, next_cursor, total = query_documents(portfolio_id, discipline_ids,
+                                                        with_total=not filters['after'], **filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'documents': [serialize_document_row(doc) for doc in documents],
+        'next': next_cursor,
+        'total': total
+    })
+
+
+@app.route('/api/search')
+@login_required
+def api_search():
+    """
+    API endpoint: ranked full-text search over the portfolios the user can access
+    
+    Query string: q (every word must match, as a prefix), page (from 1) and
+    per_page. Results link to the document's feedback page.
+    """
+    try:
+        results = search_documents(request.args.get('q', ''), get_user_portfolio_ids(get_current_user()),
+                                   page=request.args.get('page', 1, type=int),
+                                   per_page=request.args.get('per_page', SEARCH_PAGE_SIZE, type=int))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    for result in results['results']:
+        result['feedback_url'] = url_for('view_feedback', document_id=result['id'])
+    return jsonify(results)
+
+
 @app.route('/portfolios/<int:portfolio_id>/kanban')
 @login_required
 def kanban_board(portfolio_id):
@@ -228,29 +334,15 @@ def kanban_board(portfolio_id):
     user_disciplines = get_user_disciplines(user, portfolio_id)
     discipline_ids = [d.id for d in user_disciplines]
     
-    # Get all documents for user's disciplines
-    all_docs = Document.query.filter(Document.discipline_id.in_(discipline_ids)).all()
+    # Cards go to the document's precomputed board column (see shared.status)
+    documents = Document.query.options(load_only(*LIST_COLUMNS, Document.board_column),
+                                       joinedload(Document.discipline)).filter(
+        Document.discipline_id.in_(discipline_ids)
+    ).order_by(Document.doc_number, Document.id).all()
     
-    # Organize documents by stage (To Do, Submitted, Client Review, Approved)
-    kanban_columns = {
-        'To Do': [],
-        'Submitted': [],
-        'Client Review': [],
-        'Approved': []
-    }
-    
-    for doc in all_docs:
-        status = (doc.current_status or '').lower()
-        
-        # Determine which column based on status
-        if 'afc' in status or 'approved for construction' in status:
-            kanban_columns['Approved'].append(doc)
-        elif 'client' in status or 'review' in status or 'awaiting' in status:
-            kanban_columns['Client Review'].append(doc)
-        elif 'submitted' in status or any(getattr(doc, f'{s["code"].lower()}_date_sent', None) for s in STANDARD_STAGES):
-            kanban_columns['Submitted'].append(doc)
-        else:
-            kanban_columns['To Do'].append(doc)
+    kanban_columns = {title: [] for title in BOARD_COLUMNS.values()}
+    for doc in documents:
+        kanban_columns[BOARD_COLUMNS.get(doc.board_column, BOARD_COLUMNS['todo'])].append(doc)
     
     # Get statistics
     stats = get_document_stats_for_portfolio(user, portfolio_id)
@@ -0,0 +1,57 @@
+"""
+Batch import of MDR workbooks
+Parses many .xlsx files in parallel and bulk-inserts each one as a new portfolio
+
+Usage:
+    python batch_import_mdr.py exports/                 # every .xlsx in a directory
+    python batch_import_mdr.py "mdrs/*.xlsx" --workers 4
+"""
+import os
+import sys
+import argparse
+
+# Add shared to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from shared.database import init_db_headless
+from shared.batch_import import BatchImporter, collect_workbooks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import many MDR workbooks in parallel')
+    parser.add_argument('sources', nargs='+', help='Workbook files, directories or glob patterns')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Parser processes (default: number of CPUs)')
+    args = parser.parse_args(argv)
+    
+    files = collect_workbooks(args.sources)
+    if not files:
+        print("[ERROR] No .xlsx files found")
+        return 1
+    
+    init_db_headless()
+    
+    print("\n" + "="*100)
+    print(f"BATCH MDR IMPORT - {len(files)} file(s)")
+    print("="*100)
+    
+    summary = BatchImporter(workers=args.workers, progress=print).run(files)
+    
+    print("\n" + "-"*100)
+    print(f"Imported {summary['imported']}/{summary['files']} file(s), "
+          f"{summary['documents']} documents in {summary['elapsed']}s "
+          f"({summary['workers']} worker(s))")
+    
+    failed = [r for r in summary['results'] if r['status'] == 'failed']
+    if failed:
+        print(f"\n[ERROR] {len(failed)} file(s) failed:")
+        for result in failed:
+            print(f"   - {os.path.basename(result['file'])}: {result['error']}")
+        return 1
+    
+    print("[OK] Batch import completed successfully!")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+MDR rendering benchmark
+Times the shared MDR renderer on synthetic data, on its own and through both
+front ends (desktop MDRExcelGenerator, web MDRExcelExporter). No database needed.
+
+Usage:
+    python benchmark_mdr_render.py                        # 1000, 5000 and 20000 documents
+    python benchmark_mdr_render.py --docs 50000 --sections 10
+"""
+import os
+import sys
+import io
+import time
+import argparse
+
+import openpyxl
+
+# Add shared to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from mdr_stages_config import STANDARD_STAGES, get_stage_fields
+from shared.mdr_renderer import MDRRenderer, Section
+from shared.models import Portfolio, Discipline, Document
+from shared.excel_handler import MDRExcelExporter
+from mdr_planner import MDRExcelGenerator, MDRProject, DocumentRecord, DocumentCategory
+
+
+def stage_values(i):
+    """Planned/actual dates and feedback for every stage field of document i"""
+    values = {}
+    for stage in STANDARD_STAGES:
+        stage_code_lower = stage['code'].lower()
+        for field_name in get_stage_fields(stage['has_next_rev']):
+            if field_name.startswith('date'):
+                value = f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}"
+            else:
+                value = f"{stage['code']}-{i:05d}"
+            values[f"{stage_code_lower}_{field_name}"] = value
+    return values
+
+
+def synthetic_rows(n_docs, n_sections):
+    """Section markers and row tuples, as fed to the renderer"""
+    per_section = max(1, n_docs // n_sections)
+    for i in range(n_docs):
+        if i % per_section == 0:
+            yield Section(f"Discipline {i // per_section + 1}")
+        fields = stage_values(i)
+        yield ((f"DOC-{i:06d}", f"Synthetic document title number {i}", "B", "IFR", f"TR-{i:05d}")
+               + tuple(fields.values()) + ("",))
+
+
+def synthetic_portfolio(n_docs, n_sections):
+    """Transient Portfolio with disciplines and documents (never flushed)"""
+    portfolio = Portfolio(name="Benchmark", code="BENCH-001")
+    disciplines = [Discipline(name=f"Discipline {d + 1}") for d in range(n_sections)]
+    portfolio.documents = [
+        Document(doc_number=f"DOC-{i:06d}", doc_title=f"Synthetic document title number {i}",
+                 current_revision="B", current_status="IFR", current_transmittal_no=f"TR-{i:05d}",
+                 discipline=disciplines[i % n_sections], **stage_values(i))
+        for i in range(n_docs)
+    ]
+    return portfolio
+
+
+def synthetic_project(n_docs):
+    """MDRProject spread across the document categories"""
+    categories = list(DocumentCategory)
+    project = MDRProject(project_name="Benchmark", project_code="BENCH-001", client="Benchmark Client")
+    for i in range(n_docs):
+        project.add_document(DocumentRecord(
+            doc_number=f"DOC-{i:06d}", doc_title=f"Synthetic document title number {i}",
+            category=categories[i % len(categories)], current_rev="B", current_status="IFR",
+            current_transmittal_no=f"TR-{i:05d}", **stage_values(i)))
+    return project
+
+
+def timed(func):
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def run(n_docs, n_sections):
+    rows = list(synthetic_rows(n_docs, n_sections))
+    portfolio = synthetic_portfolio(n_docs, n_sections)
+    project = synthetic_project(n_docs)
+    
+    def renderer():
+        workbook = openpyxl.Workbook(write_only=True)
+        MDRRenderer(workbook.create_sheet("Master Document Register"), "Benchmark").render(rows)
+        workbook.save(io.BytesIO())
+    
+    results = {
+        'renderer': timed(renderer),
+        'exporter': timed(lambda: MDRExcelExporter(portfolio).export(io.BytesIO())),
+        'generator': timed(lambda: MDRExcelGenerator(project).generate(io.BytesIO())),
+    }
+    for name, seconds in results.items():
+        print(f"{n_docs:>8} docs  {name:<10} {seconds:8.2f}s  {n_docs / seconds:10.0f} rows/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark MDR workbook rendering')
+    parser.add_argument('--docs', type=int, nargs='+', default=[1000, 5000, 20000],
+                        help='Document counts to render')
+    parser.add_argument('--sections', type=int, default=8, help='Discipline sections per workbook')
+    args = parser.parse_args(argv)
+    
+    for n_docs in args.docs:
+        run(n_docs, args.sections)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
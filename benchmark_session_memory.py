@@ -0,0 +1,137 @@
+"""
+Desktop session memory benchmark
+Cycles through portfolios the way the desktop planner does (open the list,
+edit a few documents, switch) and reports Python heap usage and identity-map
+size for two session strategies:
+
+    long-lived      one session for the whole run, every document loaded into
+                    the list (the planner before the unit-of-work sessions)
+    unit-of-work    SessionManager sessions per operation, list rows as plain
+                    tuples (the current planner)
+
+Runs on a temporary SQLite database filled with synthetic portfolios.
+
+Usage:
+    python benchmark_session_memory.py
+    python benchmark_session_memory.py --portfolios 6 --docs 5000 --cycles 3
+"""
+import os
+import sys
+import gc
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session, joinedload
+
+# Add shared to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from shared.models import db, Portfolio, Discipline, Document
+from shared.database import SessionManager
+from mdr_planner import DocumentListModel
+
+EDITS_PER_PORTFOLIO = 5
+WINDOW_ROWS = 30
+
+
+def create_database(path, n_portfolios, n_docs, n_disciplines=8):
+    """Synthetic portfolios, written with bulk INSERTs"""
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine)
+    with Session(engine) as session:
+        for p in range(n_portfolios):
+            portfolio = Portfolio(name=f"Benchmark {p + 1}", code=f"BENCH-{p + 1:03d}")
+            session.add(portfolio)
+            session.flush()
+            disciplines = [Discipline(portfolio_id=portfolio.id, name=f"Discipline {d + 1}")
+                           for d in range(n_disciplines)]
+            session.add_all(disciplines)
+            session.flush()
+            session.execute(insert(Document), [
+                {'portfolio_id': portfolio.id, 'discipline_id': disciplines[i % n_disciplines].id,
+                 'doc_number': f"BENCH-{p + 1:03d}-{i:06d}", 'doc_title': f"Synthetic document title number {i}",
+                 'current_status': "IFR", 'ifr_date_planned': "2024-01-15", 'remarks': "Benchmark"}
+                for i in range(n_docs)
+            ])
+        session.commit()
+    return engine
+
+
+def long_lived(engine, portfolio_ids, cycles):
+    """One session for everything; the list holds every Document of the open portfolio"""
+    session = Session(engine)
+    state = {}
+    
+    def open_portfolio(portfolio_id):
+        state['portfolio'] = session.get(Portfolio, portfolio_id)
+        state['documents'] = session.query(Document).options(joinedload(Document.discipline)).filter_by(
+            portfolio_id=portfolio_id).order_by(Document.discipline_id, Document.doc_number).all()
+        for document in state['documents'][:EDITS_PER_PORTFOLIO]:
+            document.remarks = f"Edited {time.time()}"
+            session.commit()
+    
+    try:
+        yield from measure(open_portfolio, portfolio_ids, cycles, lambda: len(session.identity_map))
+    finally:
+        session.close()
+
+
+def unit_of_work(engine, portfolio_ids, cycles):
+    """Short sessions per operation; the list keeps tuples for the rows on screen"""
+    sessions = SessionManager(engine)
+    state = {}
+    
+    def open_portfolio(portfolio_id):
+        with sessions.snapshot() as session:
+            state['portfolio'] = session.get(Portfolio, portfolio_id)
+            state['documents'] = DocumentListModel.load(session, portfolio_id, 0, WINDOW_ROWS)
+        for index in range(EDITS_PER_PORTFOLIO):
+            with sessions.snapshot() as session:
+                document_id = state['documents'].document_id(index, session)
+            with sessions.unit_of_work() as session:
+                session.get(Document, document_id).remarks = f"Edited {time.time()}"
+    
+    yield from measure(open_portfolio, portfolio_ids, cycles, lambda: 0)
+
+
+def measure(open_portfolio, portfolio_ids, cycles, identity_map_size):
+    """Open every portfolio once per cycle; yields (cycle, seconds, current MB, peak MB, identity map)"""
+    for cycle in range(1, cycles + 1):
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        for portfolio_id in portfolio_ids:
+            open_portfolio(portfolio_id)
+        seconds = time.perf_counter() - started
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        yield cycle, seconds, current / 2 ** 20, peak / 2 ** 20, identity_map_size()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark desktop session memory across portfolio switches')
+    parser.add_argument('--portfolios', type=int, default=4, help='Portfolios to cycle through')
+    parser.add_argument('--docs', type=int, default=2000, help='Documents per portfolio')
+    parser.add_argument('--cycles', type=int, default=3, help='Passes over all portfolios')
+    args = parser.parse_args(argv)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"Creating {args.portfolios} portfolios x {args.docs} documents...")
+        engine = create_database(os.path.join(directory, "benchmark.db"), args.portfolios, args.docs)
+        with Session(engine) as session:
+            portfolio_ids = session.execute(select(Portfolio.id).order_by(Portfolio.id)).scalars().all()
+        
+        print(f"{'strategy':<14}{'cycle':>6}{'seconds':>10}{'heap MB':>10}{'peak MB':>10}{'identity map':>14}")
+        for name, strategy in (('long-lived', long_lived), ('unit-of-work', unit_of_work)):
+            tracemalloc.start()
+            for cycle, seconds, current, peak, identity_map in strategy(engine, portfolio_ids, args.cycles):
+                print(f"{name:<14}{cycle:>6}{seconds:>10.2f}{current:>10.1f}{peak:>10.1f}{identity_map:>14}")
+            tracemalloc.stop()
+        engine.dispose()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
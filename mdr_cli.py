@@ -0,0 +1,474 @@
+"""
+MDR command-line tool
+Headless import, export, validation and reporting for scheduled jobs and scripts
+
+Usage:
+    python mdr_cli.py import exports/ --workers 4
+    python mdr_cli.py export --all --output /srv/mdr/exports --workers 4
+    python mdr_cli.py export EPC-2024-001 --format ndjson       # values only, no styling
+    python mdr_cli.py export EPC-2024-001 --per-discipline --workers 8
+    python mdr_cli.py validate incoming.xlsx --portfolio EPC-2024-001 --report issues.csv
+    python mdr_cli.py stats EPC-2024-001 --json
+    python mdr_cli.py prerender --workers 4               # refresh stale cached exports (cron)
+    python mdr_cli.py schedule --at 02:00 --workers 4     # same, nightly, without cron
+    python mdr_cli.py backfill-status                     # one-off: derived status columns
+    python mdr_cli.py backfill-dates                      # one-off: parsed stage dates (overdue)
+    python mdr_cli.py rebuild-summaries                   # recompute the dashboard summary tables
+    python mdr_cli.py backfill-turnarounds                # link feedback to submissions, client KPIs
+    python mdr_cli.py forecast EPC-2024-001 --simulations 5000 --workers 4
+
+Common options (accepted by every command):
+    --workers N   worker processes for parsing/rendering (default: 1)
+    --json        print a machine-readable JSON document on stdout
+    --profile     report the time spent in each phase
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import contextlib
+
+# Add shared to path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import func
+
+from shared.models import db, Portfolio, Discipline, Document
+from shared.database import init_db_headless
+from shared.excel_handler import MDRExcelValidator
+from shared.flat_export import FLAT_FORMATS
+from shared.batch_import import BatchImporter, collect_workbooks
+from shared.multisheet_export import MultiSheetExporter
+from shared.status import backfill_derived_fields
+from shared.overdue import backfill_stage_dates, overdue_by_portfolio, overdue_stages
+from shared.summary import rebuild_summaries
+from shared.turnaround import sync_turnarounds
+from shared.forecast import forecast_portfolio, DEFAULT_SIMULATIONS
+from shared.jobs import export_filename, export_portfolios, validate_workbooks, prerender_exports, run_daily
+
+
+class PhaseTimer:
+    """Wall-clock timings for the named phases of a command"""
+    
+    def __init__(self):
+        self.phases = []
+        # Per-item timings inside a phase (files, portfolios); not added to the total
+        self.details = []
+    
+    @contextlib.contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append({'phase': name, 'seconds': round(time.perf_counter() - started, 3)})
+    
+    def detail(self, name, seconds):
+        """Record the time of one item of the last phase"""
+        self.details.append({'phase': self.phases[-1]['phase'], 'item': name, 'seconds': seconds})
+    
+    def report(self):
+        lines = ["", "PROFILE", "-"*60]
+        for entry in self.phases:
+            lines.append(f"{entry['phase']:<45}{entry['seconds']:>12.3f}s")
+            for detail in self.details:
+                if detail['phase'] == entry['phase']:
+                    lines.append(f"{'  ' + detail['item']:<45}{detail['seconds']:>12.3f}s")
+        lines.append(f"{'total':<45}{sum(e['seconds'] for e in self.phases):>12.3f}s")
+        return "\n".join(lines)
+
+
+class CommandContext:
+    """Options and output helpers shared by all subcommands"""
+    
+    def __init__(self, args):
+        self.args = args
+        self.timer = PhaseTimer()
+    
+    def log(self, message):
+        """Human-readable progress; goes to stderr in JSON mode so stdout stays parseable"""
+        print(message, file=sys.stderr if self.args.json else sys.stdout)
+    
+    def connect(self):
+        with self.timer.phase('connect database'):
+            if self.args.json:
+                with contextlib.redirect_stdout(sys.stderr):
+                    init_db_headless()
+            else:
+                init_db_headless()
+    
+    def get_portfolio(self, code):
+        portfolio = Portfolio.query.filter_by(code=code).first()
+        if portfolio is None:
+            raise SystemExit(f"[ERROR] Portfolio '{code}' not found")
+        return portfolio
+    
+    def select_portfolios(self):
+        """Resolve the CODE arguments / --all flag to portfolios"""
+        if self.args.all:
+            return Portfolio.query.order_by(Portfolio.code).all()
+        return [self.get_portfolio(code) for code in self.args.codes]
+
+
+def cmd_import(ctx):
+    files = collect_workbooks(ctx.args.sources)
+    if not files:
+        raise SystemExit("[ERROR] No .xlsx files found")
+    
+    ctx.connect()
+    with ctx.timer.phase(f'import {len(files)} file(s)'):
+        summary = BatchImporter(workers=ctx.args.workers, progress=ctx.log).run(files)
+    
+    for result in summary['results']:
+        name = os.path.basename(result['file'])
+        if result['parse_seconds'] is not None:
+            ctx.timer.detail(f'parse {name}', result['parse_seconds'])
+        if result['write_seconds'] is not None:
+            ctx.timer.detail(f'write {name}', result['write_seconds'])
+    
+    ctx.log(f"Imported {summary['imported']}/{summary['files']} file(s), {summary['documents']} documents")
+    return summary, 1 if summary['failed'] else 0
+
+
+def export_per_discipline(portfolio, output_dir, workers):
+    """Multi-sheet workbook for one portfolio, sheets rendered in parallel"""
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, export_filename(portfolio))
+    started = time.perf_counter()
+    try:
+        exporter = MultiSheetExporter(portfolio, workers=workers)
+        exporter.export(output_path)
+    except Exception as e:
+        db.session.rollback()
+        return {'portfolio_id': portfolio.id, 'code': portfolio.code, 'error': str(e)}
+    return {
+        'portfolio_id': portfolio.id,
+        'code': portfolio.code,
+        'file': output_path,
+        'documents': Document.query.filter_by(portfolio_id=portfolio.id).count(),
+        'seconds': round(time.perf_counter() - started, 3),
+        'timings': exporter.timings
+    }
+
+
+def cmd_export(ctx):
+    ctx.connect()
+    portfolios = ctx.select_portfolios()
+    ids = [p.id for p in portfolios]
+    
+    def progress(done, total, result):
+        if 'error' in result:
+            ctx.log(f"[{done}/{total}] FAILED - {result['error']}")
+        else:
+            ctx.log(f"[{done}/{total}] {result['code']}: {result['documents']} documents -> {result['file']}")
+    
+    with ctx.timer.phase(f'export {len(ids)} portfolio(s)'):
+        if ctx.args.per_discipline:
+            # Parallelism goes into the sheets of each workbook, one portfolio at a time
+            results = [export_per_discipline(portfolio, ctx.args.output, ctx.args.workers) for portfolio in portfolios]
+            for done, result in enumerate(results, 1):
+                progress(done, len(results), result)
+        else:
+            results = export_portfolios(ids, ctx.args.output, workers=ctx.args.workers, progress=progress,
+                                        fmt=ctx.args.format)
+    
+    for result in results:
+        if 'error' not in result:
+            ctx.timer.detail(f"render {result['code']}", result['seconds'])
+    
+    failed = [r for r in results if 'error' in r]
+    summary = {
+        'portfolios': len(results),
+        'exported': len(results) - len(failed),
+        'failed': len(failed),
+        'results': results
+    }
+    return summary, 1 if failed else 0
+
+
+def cmd_validate(ctx):
+    files = collect_workbooks(ctx.args.files)
+    if not files:
+        raise SystemExit("[ERROR] No .xlsx files found")
+    
+    known_disciplines = existing_doc_numbers = None
+    if ctx.args.portfolio:
+        ctx.connect()
+        with ctx.timer.phase('load portfolio context'):
+            portfolio = ctx.get_portfolio(ctx.args.portfolio)
+            known_disciplines = [d.name for d in portfolio.disciplines]
+            existing_doc_numbers = [n for (n,) in db.session.query(Document.doc_number)
+                                    .filter_by(portfolio_id=portfolio.id)]
+    
+    def progress(done, total, result):
+        if 'error' in result and 'issues' not in result:
+            ctx.log(f"[{done}/{total}] {os.path.basename(result['file'])}: FAILED - {result['error']}")
+        else:
+            ctx.log(f"[{done}/{total}] {os.path.basename(result['file'])}: {result['documents']} documents, "
+                    f"{result['errors']} errors, {result['warnings']} warnings")
+    
+    with ctx.timer.phase(f'validate {len(files)} file(s)'):
+        reports = validate_workbooks(files, known_disciplines, existing_doc_numbers,
+                                     workers=ctx.args.workers, progress=progress)
+    
+    if ctx.args.report:
+        with ctx.timer.phase('write report'):
+            with open(ctx.args.report, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['file'] + MDRExcelValidator.REPORT_COLUMNS)
+                for report in reports:
+                    for issue in report.get('issues', []):
+                        writer.writerow([report['file']] + [
+                            issue[col] if issue[col] is not None else '' for col in MDRExcelValidator.REPORT_COLUMNS
+                        ])
+        ctx.log(f"Report written to {ctx.args.report}")
+    
+    failed = any(r.get('errors') or ('error' in r and 'issues' not in r) for r in reports)
+    return {'files': len(reports), 'results': reports}, 1 if failed else 0
+
+
+def cmd_stats(ctx):
+    ctx.connect()
+    portfolios = ctx.select_portfolios()
+    results = []
+    
+    with ctx.timer.phase(f'stats for {len(portfolios)} portfolio(s)'):
+        overdue = overdue_by_portfolio()
+        for portfolio in portfolios:
+            by_discipline = (
+                db.session.query(Discipline.name, func.count(Document.id))
+                .outerjoin(Document, Document.discipline_id == Discipline.id)
+                .filter(Discipline.portfolio_id == portfolio.id)
+                .group_by(Discipline.id, Discipline.name)
+                .order_by(Discipline.name)
+                .all()
+            )
+            by_status = (
+                db.session.query(Document.current_status, func.count(Document.id))
+                .filter(Document.portfolio_id == portfolio.id)
+                .group_by(Document.current_status)
+                .all()
+            )
+            oldest = overdue_stages(portfolio.id, limit=1) if portfolio.id in overdue else []
+            results.append({
+                'code': portfolio.code,
+                'name': portfolio.name,
+                'documents': sum(count for _, count in by_status),
+                'overdue_documents': overdue.get(portfolio.id, (0, 0))[0],
+                'overdue_stages': overdue.get(portfolio.id, (0, 0))[1],
+                'max_working_days_late': oldest[0][4] if oldest else 0,
+                'disciplines': {name: count for name, count in by_discipline},
+                'statuses': {(status or 'Not Started'): count for status, count in by_status}
+            })
+    
+    if not ctx.args.json:
+        for entry in results:
+            print(f"\n{entry['code']} - {entry['name']}: {entry['documents']} documents, "
+                  f"{entry['overdue_documents']} overdue ({entry['overdue_stages']} stages, "
+                  f"up to {entry['max_working_days_late']} working days late)")
+            for name, count in entry['disciplines'].items():
+                print(f"   {name:<50}{count:>6}")
+            print("   " + "-"*56)
+            for status, count in sorted(entry['statuses'].items()):
+                print(f"   {status:<50}{count:>6}")
+    
+    return {'portfolios': results}, 0
+
+
+def cmd_prerender(ctx):
+    ctx.connect()
+    
+    def progress(done, total, result):
+        if 'error' in result:
+            ctx.log(f"[{done}/{total}] FAILED - {result['error']}")
+        else:
+            ctx.log(f"[{done}/{total}] {result['code']} v{result['version']} ({result['seconds']}s)")
+    
+    with ctx.timer.phase('prerender exports'):
+        summary = prerender_exports(workers=ctx.args.workers, cache_dir=ctx.args.cache_dir, progress=progress)
+    
+    ctx.log(f"Rendered {summary['rendered']}, up to date {summary['up_to_date']}, failed {summary['failed']}")
+    return summary, 1 if summary['failed'] else 0
+
+
+def cmd_schedule(ctx):
+    ctx.connect()
+    
+    def nightly():
+        ctx.log(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Pre-rendering exports...")
+        summary = prerender_exports(workers=ctx.args.workers, cache_dir=ctx.args.cache_dir)
+        ctx.log(f"Rendered {summary['rendered']}, up to date {summary['up_to_date']}, "
+                f"failed {summary['failed']} in {summary['elapsed']}s")
+    
+    run_daily(nightly, at=ctx.args.at, log=ctx.log)
+    return {}, 0
+
+
+def cmd_backfill_status(ctx):
+    ctx.connect()
+    
+    with ctx.timer.phase('backfill derived status columns'):
+        updated = backfill_derived_fields(db.session, only_missing=not ctx.args.recompute,
+                                          progress=lambda done: ctx.log(f"   {done} documents..."))
+    
+    ctx.log(f"Updated {updated} documents")
+    return {'updated': updated}, 0
+
+
+def cmd_backfill_dates(ctx):
+    ctx.connect()
+    
+    with ctx.timer.phase('parse stage dates'):
+        done = backfill_stage_dates(db.session, progress=lambda n: ctx.log(f"   {n} documents..."))
+    
+    ctx.log(f"Parsed the stage dates of {done} documents")
+    return {'documents': done}, 0
+
+
+def cmd_rebuild_summaries(ctx):
+    ctx.connect()
+    
+    with ctx.timer.phase('rebuild summaries'):
+        portfolios = rebuild_summaries(
+            db.session, progress=lambda done, total: ctx.log(f"   [{done}/{total}] portfolios"))
+    
+    ctx.log(f"Rebuilt the summaries of {portfolios} portfolios")
+    return {'portfolios': portfolios}, 0
+
+
+def cmd_backfill_turnarounds(ctx):
+    ctx.connect()
+    
+    with ctx.timer.phase('match feedback and count days with client'):
+        matched, counted = sync_turnarounds(db.session)
+    
+    ctx.log(f"Linked {matched} submissions to client feedback, updated days with client on {counted}")
+    return {'matched': matched, 'counted': counted}, 0
+
+
+def cmd_forecast(ctx):
+    ctx.connect()
+    portfolios = ctx.select_portfolios()
+    results = []
+    
+    with ctx.timer.phase(f'forecast {len(portfolios)} portfolio(s)'):
+        for portfolio in portfolios:
+            try:
+                forecast = forecast_portfolio(portfolio.id, simulations=ctx.args.simulations,
+                                              workers=ctx.args.workers)
+            except ValueError as e:
+                raise SystemExit(f"[ERROR] {e}")
+            results.append(dict(forecast, code=portfolio.code, name=portfolio.name))
+    
+    if not ctx.args.json:
+        for entry in results:
+            portfolio = entry['portfolio']
+            print(f"\n{entry['code']} - {entry['name']}: {portfolio['open_documents']} of "
+                  f"{portfolio['documents']} documents open, AFC P50 {portfolio['p50'] or '-'}, "
+                  f"P80 {portfolio['p80'] or '-'} ({entry['simulations']} simulations)")
+            for discipline in entry['disciplines']:
+                print(f"   {discipline['name']:<40}{discipline['open_documents']:>6} open"
+                      f"   P50 {discipline['p50'] or '-':<12}P80 {discipline['p80'] or '-'}")
+    
+    return {'portfolios': results}, 0
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--workers', type=int, default=1, help='Worker processes (default: 1)')
+    common.add_argument('--json', action='store_true', help='Print results as JSON on stdout')
+    common.add_argument('--profile', action='store_true', help='Report the time spent in each phase')
+    
+    parser = argparse.ArgumentParser(description='MDR command-line tool')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    p = subparsers.add_parser('import', parents=[common], help='Import workbooks as new portfolios')
+    p.add_argument('sources', nargs='+', help='Workbook files, directories or glob patterns')
+    p.set_defaults(handler=cmd_import)
+    
+    p = subparsers.add_parser('export', parents=[common], help='Export portfolios to Excel')
+    p.add_argument('codes', nargs='*', help='Portfolio codes')
+    p.add_argument('--all', action='store_true', help='Export every portfolio')
+    p.add_argument('--output', default='.', help='Output directory (default: current directory)')
+    p.add_argument('--format', default='xlsx', choices=['xlsx'] + list(FLAT_FORMATS),
+                   help='xlsx (styled MDR, default) or a data-only flat format')
+    p.add_argument('--per-discipline', action='store_true',
+                   help='xlsx only: one worksheet per discipline plus a summary sheet')
+    p.set_defaults(handler=cmd_export)
+    
+    p = subparsers.add_parser('validate', parents=[common], help='Validate workbooks without importing')
+    p.add_argument('files', nargs='+', help='Workbook files, directories or glob patterns')
+    p.add_argument('--portfolio', help='Portfolio code to check disciplines and doc numbers against')
+    p.add_argument('--report', help='Write all issues to this CSV file')
+    p.set_defaults(handler=cmd_validate)
+    
+    p = subparsers.add_parser('stats', parents=[common], help='Document counts per discipline and status')
+    p.add_argument('codes', nargs='*', help='Portfolio codes')
+    p.add_argument('--all', action='store_true', help='Report on every portfolio')
+    p.set_defaults(handler=cmd_stats)
+    
+    p = subparsers.add_parser('prerender', parents=[common], help='Refresh cached exports of changed portfolios')
+    p.add_argument('--cache-dir', help='Artifact directory (default: MDR_EXPORT_CACHE or ./export_cache)')
+    p.set_defaults(handler=cmd_prerender)
+    
+    p = subparsers.add_parser('schedule', parents=[common], help='Run prerender every night (blocking)')
+    p.add_argument('--cache-dir', help='Artifact directory (default: MDR_EXPORT_CACHE or ./export_cache)')
+    p.add_argument('--at', default='02:00', help='Local time of day to run, HH:MM (default: 02:00)')
+    p.set_defaults(handler=cmd_schedule)
+    
+    p = subparsers.add_parser('backfill-status', parents=[common],
+                              help='Fill the derived status/stage/board columns of existing documents')
+    p.add_argument('--recompute', action='store_true',
+                   help='Recompute every document, not only those never classified')
+    p.set_defaults(handler=cmd_backfill_status)
+    
+    p = subparsers.add_parser('backfill-dates', parents=[common],
+                              help='Rebuild the parsed stage dates used for overdue detection')
+    p.set_defaults(handler=cmd_backfill_dates)
+    
+    p = subparsers.add_parser('rebuild-summaries', parents=[common],
+                              help='Recompute the portfolio and discipline summary tables')
+    p.set_defaults(handler=cmd_rebuild_summaries)
+    
+    p = subparsers.add_parser('backfill-turnarounds', parents=[common],
+                              help='Link client feedback to submissions and rebuild the client turnaround table')
+    p.set_defaults(handler=cmd_backfill_turnarounds)
+    
+    p = subparsers.add_parser('forecast', parents=[common],
+                              help='Monte Carlo AFC completion dates (P50/P80) per discipline')
+    p.add_argument('codes', nargs='*', help='Portfolio codes')
+    p.add_argument('--all', action='store_true', help='Forecast every portfolio')
+    p.add_argument('--simulations', type=int, default=DEFAULT_SIMULATIONS,
+                   help=f'Simulated schedules (default: {DEFAULT_SIMULATIONS})')
+    p.set_defaults(handler=cmd_forecast)
+    
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    
+    if getattr(args, 'codes', None) == [] and not getattr(args, 'all', False):
+        parser.error(f"{args.command}: give one or more portfolio codes or --all")
+    if getattr(args, 'per_discipline', False) and args.format != 'xlsx':
+        parser.error("export: --per-discipline only applies to --format xlsx")
+    
+    ctx = CommandContext(args)
+    result, exit_code = args.handler(ctx)
+    
+    if args.json:
+        if args.profile:
+            result['profile'] = ctx.timer.phases
+            result['profile_details'] = ctx.timer.details
+        print(json.dumps(result, indent=2, default=str))
+    elif args.profile:
+        print(ctx.timer.report(), file=sys.stderr)
+    
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
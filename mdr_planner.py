@@ -8,22 +8,33 @@ from dataclasses import dataclass, field
 from typing import List, Dict, Optional, Tuple
 from enum import Enum
 import openpyxl
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
-from openpyxl.drawing.image import Image
-from openpyxl.cell.cell import MergedCell
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import subprocess
 import platform
 from datetime import datetime, date
 import os
-from mdr_stages_config import STANDARD_STAGES, SUBMISSION_COLUMNS, get_feedback_columns, get_column_positions
+import hashlib
+import tempfile
+from mdr_stages_config import STANDARD_STAGES, get_column_positions
+from shared.mdr_renderer import MDRRenderer, Section, document_row
+from shared.progress import ProgressTracker, CancellationToken, OperationCancelled
+from shared.excel_handler import MDRExcelExporter
 
 # Database imports for synchronization with Flask web app
-from shared.models import db, Portfolio, Discipline, Document
-from shared.database import init_db_standalone
-from sqlalchemy.orm import Session
+from shared.models import db, Portfolio, Discipline, Document, get_portfolio_version, documents_changed_since
+from shared.database import init_db_standalone, SessionManager
+from shared.summary import portfolio_summaries
+from sqlalchemy import select, func
+from sqlalchemy.orm import joinedload
+from concurrent.futures import ThreadPoolExecutor
+import queue
+
+# Company logo shown in the MDR header (skipped with a warning when missing)
+LOGO_PATH = "IESL-Logo.png"
+
+# How often the documents list checks the database for changes made elsewhere
+CHANGE_POLL_MS = 5000
 
 
 class DocumentStatus(Enum):
@@ -241,121 +252,34 @@ class MDRProject:
 class MDRExcelGenerator:
     """Generates Excel files with proper MDR formatting"""
 
-    def __init__(self, mdr_project: MDRProject):
+    def __init__(self, mdr_project: MDRProject, progress=None, cancel_token: Optional[CancellationToken] = None):
         self.project = mdr_project
-        self.workbook = openpyxl.Workbook()
-        self.worksheet = self.workbook.active
-        self.worksheet.title = "Master Document Register"
-
-        # Styling constants - following the screenshot colors
-        self.header_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")  # Yellow
-        self.header_font = Font(color="000000", bold=True, size=10)
-        self.category_fill = PatternFill(start_color="92D050", end_color="92D050", fill_type="solid")  # Green
-        self.category_font = Font(color="000000", bold=True, size=11)
-        self.border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'), 
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.worksheet = self.workbook.create_sheet("Master Document Register")
+        self.tracker = ProgressTracker(progress, cancel_token)
 
     def generate(self, output_path: str):
         """Generate the complete MDR Excel file"""
-        current_row = 1
-
-        # Add first header row (IFR/IFA/IFC) with logo
-        current_row = self._add_abbreviations_legend(current_row)
-
-        # Add main headers (rows 2&3) - use dynamic method for all stages
-        current_row = self._add_main_headers_dynamic(current_row)
-
-        # Add document categories and their documents
-        for category in DocumentCategory:
-            documents = self.project.get_documents_by_category(category)
-            if documents:
-                current_row = self._add_category_section(category, documents, current_row)
-                current_row += 1  # Space between categories
-
-        # Apply formatting and adjustments
-        self._apply_formatting()
+        def rows():
+            # Document categories and their documents
+            for category in DocumentCategory:
+                documents = self.project.get_documents_by_category(category)
+                if documents:
+                    yield Section(category.value)
+                    for document in documents:
+                        yield document_row(document, document.current_rev,
+                                           document.current_status or document.status.value)
+        
+        banner = f"Generated: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
+        documents = MDRRenderer(self.worksheet, banner, logo_path=LOGO_PATH, tracker=self.tracker).render(rows())
 
         # Store project information in document properties
         self._store_project_metadata()
 
         # Save file
+        self.tracker.phase('save', documents)
         self.workbook.save(output_path)
-
-    def _add_project_header(self, start_row: int) -> int:
-        """Add project header information"""
-        # Project name
-        if self.project.project_name:
-            cell = self.worksheet.cell(row=start_row, column=1, value=f"Project: {self.project.project_name}")
-            cell.font = Font(size=14, bold=True)
-            self.worksheet.merge_cells(f"A{start_row}:AF{start_row}")
-            start_row += 1
-
-        # Project code  
-        if self.project.project_code:
-            cell = self.worksheet.cell(row=start_row, column=1, value=f"Project Code: {self.project.project_code}")
-            cell.font = Font(size=12, bold=True)
-            self.worksheet.merge_cells(f"A{start_row}:AF{start_row}")
-            start_row += 1
-
-        # Client
-        if self.project.client:
-            cell = self.worksheet.cell(row=start_row, column=1, value=f"Client: {self.project.client}")
-            cell.font = Font(size=12, bold=True)
-            self.worksheet.merge_cells(f"A{start_row}:AF{start_row}")
-            start_row += 1
-
-        return start_row
-
-    def _add_abbreviations_legend(self, start_row: int) -> int:
-        """Add first row with merged headers and logo - now integrated into main header"""
-        # This method is no longer used for a separate row - headers are now 3 rows only
-        # Return start_row directly since we'll handle everything in _add_main_headers
-        return start_row
-
-    def _add_logo_to_header(self, row: int):
-        """Add IESL logo to the merged A-E header cell"""
-        try:
-            # Check if logo file exists
-            logo_path = "IESL-Logo.png"
-            if os.path.exists(logo_path):
-                # Create image object
-                img = Image(logo_path)
-                
-                # Resize image to fit in the cell (adjust as needed)
-                img.width = 150  # Adjust width as needed
-                img.height = 50  # Adjust height as needed
-                
-                # Position the image in cell A (row)
-                # The anchor determines where the image is placed
-                img.anchor = f'A{row}'
-                
-                # Add image to worksheet
-                self.worksheet.add_image(img)
-            else:
-                print(f"Warning: Logo file '{logo_path}' not found. Skipping logo insertion.")
-        except Exception as e:
-            print(f"Warning: Could not add logo to header: {str(e)}")
-
-    def _add_timestamp_to_header(self, row: int):
-        """Add current date/timestamp to the merged A-E header cell"""
-        try:
-            from datetime import datetime
-            
-            # Get current date and time
-            current_time = datetime.now()
-            timestamp_text = f"Generated: {current_time.strftime('%d/%m/%Y %H:%M')}"
-            
-            # Add timestamp text to cell A in the merged range
-            timestamp_cell = self.worksheet.cell(row=row, column=1, value=timestamp_text)
-            timestamp_cell.font = Font(size=8, color="000000")  # Small black font
-            timestamp_cell.alignment = Alignment(horizontal='center', vertical='bottom')
-            
-        except Exception as e:
-            print(f"Warning: Could not add timestamp to header: {str(e)}")
+        self.tracker.finish(documents)
 
     def _store_project_metadata(self):
         """Store project information in Excel document properties"""
@@ -373,733 +297,20 @@ class MDRExcelGenerator:
         except Exception as e:
             print(f"Warning: Could not store project metadata: {str(e)}")
 
-    def _add_main_headers(self, start_row: int) -> int:
-        """Add the main column headers - 3 rows only (rows 1-3)"""
-        
-        row1 = start_row
-        row2 = start_row + 1  
-        row3 = start_row + 2
-        
-        # Set row heights
-        self.worksheet.row_dimensions[row1].height = 60  # Increased for logo
-        self.worksheet.row_dimensions[row2].height = 20
-        self.worksheet.row_dimensions[row3].height = 20
-        
-        # ===== ROW 1: Timestamp/Logo Section (A-F merged) =====
-        # Merge A-F in row 1 for logo/timestamp
-        timestamp_cell = self.worksheet.cell(row=row1, column=1, value="")
-        timestamp_cell.fill = self.header_fill
-        timestamp_cell.border = self.border
-        
-        # Apply styling to all cells in A-F row 1
-        for col in range(1, 7):  # A-F
-            cell = self.worksheet.cell(row=row1, column=col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        
-        self.worksheet.merge_cells(f"A{row1}:F{row1}")
-        
-        # Add logo and timestamp to merged A-F in row 1
-        self._add_logo_to_header(row1)
-        self._add_timestamp_to_header(row1)
-        
-        # ===== COLUMNS A, B, C - Basic Info (merged rows 2-3 only) =====
-        # A: S/No (merged rows 2-3)
-        s_no_cell = self.worksheet.cell(row=row2, column=1, value="S/No")
-        s_no_cell.fill = self.header_fill
-        s_no_cell.font = self.header_font
-        s_no_cell.alignment = Alignment(horizontal='center', vertical='center')
-        s_no_cell.border = self.border
-        self.worksheet.merge_cells(f"A{row2}:A{row3}")
-        
-        # Apply styling to row 3
-        cell = self.worksheet.cell(row=row3, column=1)
-        cell.fill = self.header_fill
-        cell.border = self.border
-        
-        # B: Doc Number (merged rows 2-3)
-        doc_num_cell = self.worksheet.cell(row=row2, column=2, value="Doc Number")
-        doc_num_cell.fill = self.header_fill
-        doc_num_cell.font = self.header_font
-        doc_num_cell.alignment = Alignment(horizontal='center', vertical='center')
-        doc_num_cell.border = self.border
-        self.worksheet.merge_cells(f"B{row2}:B{row3}")
-        
-        # Apply styling to row 3
-        cell = self.worksheet.cell(row=row3, column=2)
-        cell.fill = self.header_fill
-        cell.border = self.border
-        
-        # C: DOC Title (merged rows 2-3)
-        doc_title_cell = self.worksheet.cell(row=row2, column=3, value="DOC Title")
-        doc_title_cell.fill = self.header_fill
-        doc_title_cell.font = self.header_font
-        doc_title_cell.alignment = Alignment(horizontal='center', vertical='center')
-        doc_title_cell.border = self.border
-        self.worksheet.merge_cells(f"C{row2}:C{row3}")
-        
-        # Apply styling to row 3
-        cell = self.worksheet.cell(row=row3, column=3)
-        cell.fill = self.header_fill
-        cell.border = self.border
-        
-        # ===== COLUMNS D-F - Current Status Section =====
-        
-        # Row 2: "Current Status" (merged D-F)
-        current_status_cell = self.worksheet.cell(row=row2, column=4, value="Current Status")
-        current_status_cell.fill = self.header_fill
-        current_status_cell.font = self.header_font
-        current_status_cell.alignment = Alignment(horizontal='center', vertical='center')
-        current_status_cell.border = self.border
-        self.worksheet.merge_cells(f"D{row2}:F{row2}")
-        for col in range(4, 7):
-            cell = self.worksheet.cell(row=row2, column=col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        
-        # Row 3: Individual column headers
-        current_rev_cell = self.worksheet.cell(row=row3, column=4, value="Current Rev")
-        current_rev_cell.fill = self.header_fill
-        current_rev_cell.font = self.header_font
-        current_rev_cell.alignment = Alignment(horizontal='center', vertical='center')
-        current_rev_cell.border = self.border
-        
-        status_cell = self.worksheet.cell(row=row3, column=5, value="Status")
-        status_cell.fill = self.header_fill
-        status_cell.font = self.header_font
-        status_cell.alignment = Alignment(horizontal='center', vertical='center')
-        status_cell.border = self.border
-        
-        transmittal_cell = self.worksheet.cell(row=row3, column=6, value="Current Transmittal No.")
-        transmittal_cell.fill = self.header_fill
-        transmittal_cell.font = self.header_font
-        transmittal_cell.alignment = Alignment(horizontal='center', vertical='center')
-        transmittal_cell.border = self.border
-        
-        # ===== COLUMNS G-J - IFR Section =====
-        # Row 1: "IFR" (merged G-J)
-        ifr_cell = self.worksheet.cell(row=row1, column=7, value="IFR")
-        ifr_cell.fill = self.header_fill
-        ifr_cell.font = self.header_font
-        ifr_cell.alignment = Alignment(horizontal='center', vertical='center')
-        ifr_cell.border = self.border
-        self.worksheet.merge_cells(f"G{row1}:J{row1}")
-        for col in range(7, 11):
-            cell = self.worksheet.cell(row=row1, column=col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        
-        # Row 2: "IFR Date" (merged G-H), "TR No." (merged rows 2-3), "Date Sent" (merged rows 2-3)
-        ifr_date_cell = self.worksheet.cell(row=row2, column=7, value="IFR Date")
-        ifr_date_cell.fill = self.header_fill
-        ifr_date_cell.font = self.header_font
-        ifr_date_cell.alignment = Alignment(horizontal='center', vertical='center')
-        ifr_date_cell.border = self.border
-        self.worksheet.merge_cells(f"G{row2}:H{row2}")
-        for col in range(7, 9):
-            cell = self.worksheet.cell(row=row2, column=col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        
-        tr_no_cell = self.worksheet.cell(row=row2, column=9, value="TR No.")
-        tr_no_cell.fill = self.header_fill
-        tr_no_cell.font = self.header_font
-        tr_no_cell.alignment = Alignment(horizontal='center', vertical='center')
-        tr_no_cell.border = self.border
-        self.worksheet.merge_cells(f"I{row2}:I{row3}")
-        
-        date_sent_cell = self.worksheet.cell(row=row2, column=10, value="Date Sent")
-        date_sent_cell.fill = self.header_fill
-        date_sent_cell.font = self.header_font
-        date_sent_cell.alignment = Alignment(horizontal='center', vertical='center')
-        date_sent_cell.border = self.border
-        self.worksheet.merge_cells(f"J{row2}:J{row3}")
-        
-        # Row 3: "Planned", "Actual"
-        planned_cell = self.worksheet.cell(row=row3, column=7, value="Planned")
-        planned_cell.fill = self.header_fill
-        planned_cell.font = self.header_font
-        planned_cell.alignment = Alignment(horizontal='center', vertical='center')
-        planned_cell.border = self.border
-        
-        actual_cell = self.worksheet.cell(row=row3, column=8, value="Actual")
-        actual_cell.fill = self.header_fill
-        actual_cell.font = self.header_font
-        actual_cell.alignment = Alignment(horizontal='center', vertical='center')
-        actual_cell.border = self.border
-        
-        # Apply styling to merged cells in row 3 for I and J
-        for col in [9, 10]:
-            cell = self.worksheet.cell(row=row3, column=col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        
-        # ===== COLUMNS K-M - IFR Additional Section =====
-        # Row 1: Empty (merged K-M)
-        empty_cell_1 = self.worksheet.cell(row=row1, column=11, value="")
-        empty_cell_1.fill = self.header_fill
-        empty_cell_1.border = self.border
-        self.worksheet.merge_cells(f"K{row1}:M{row1}")
-        for col in range(11, 14):
-            cell = self.worksheet.cell(row=row1, column=col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        
-        # Row 2-3: Individual columns (merged vertically)
-        rev_status_cell = self.worksheet.cell(row=row2, column=11, value="Rev. Status")
-        rev_status_cell.fill = self.header_fill
-        rev_status_cell.font = self.header_font
-        rev_status_cell.alignment = Alignment(horizontal='center', vertical='center')
-        rev_status_cell.border = self.border
-        self.worksheet.merge_cells(f"K{row2}:K{row3}")
-        
-        issue_for_cell = self.worksheet.cell(row=row2, column=12, value="Issue For")
-        issue_for_cell.fill = self.header_fill
-        issue_for_cell.font = self.header_font
-        issue_for_cell.alignment = Alignment(horizontal='center', vertical='center')
-        issue_for_cell.border = self.border
-        self.worksheet.merge_cells(f"L{row2}:L{row3}")
-        
-        date_sent2_cell = self.worksheet.cell(row=row2, column=13, value="Date Sent")
-        date_sent2_cell.fill = self.header_fill
-        date_sent2_cell.font = self.header_font
-        date_sent2_cell.alignment = Alignment(horizontal='center', vertical='center')
-        date_sent2_cell.border = self.border
-        self.worksheet.merge_cells(f"M{row2}:M{row3}")
-        
-        # Apply styling to row 3
-        for col in range(11, 14):
-            cell = self.worksheet.cell(row=row3, column=col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        
-        # ===== COLUMNS N-Q - IFA Section =====
-        # Row 1: "IFA" (merged N-Q)
-        ifa_cell = self.worksheet.cell(row=row1, column=14, value="IFA")
-        ifa_cell.fill = self.header_fill
-        ifa_cell.font = self.header_font
-        ifa_cell.alignment = Alignment(horizontal='center', vertical='center')
-        ifa_cell.border = self.border
-        self.worksheet.merge_cells(f"N{row1}:Q{row1}")
-        for col in range(14, 18):
-            cell = self.worksheet.cell(row=row1, column=col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        
-        # Row 2: "IFA Date" (merged N-O), "TR No." (merged rows 2-3), "Date Sent" (merged rows 2-3)
-        ifa_date_cell = self.worksheet.cell(row=row2, column=14, value="IFA Date")
-        ifa_date_cell.fill = self.header_fill
-        ifa_date_cell.font = self.header_font
-        ifa_date_cell.alignment = Alignment(horizontal='center', vertical='center')
-        ifa_date_cell.border = self.border
-        self.worksheet.merge_cells(f"N{row2}:O{row2}")
-        for col in range(14, 16):
-            cell = self.worksheet.cell(row=row2, column=col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        
-        ifa_tr_cell = self.worksheet.cell(row=row2, column=16, value="TR No.")
-        ifa_tr_cell.fill = self.header_fill
-        ifa_tr_cell.font = self.header_font
-        ifa_tr_cell.alignment = Alignment(horizontal='center', vertical='center')
-        ifa_tr_cell.border = self.border
-        self.worksheet.merge_cells(f"P{row2}:P{row3}")
-        
-        ifa_date_sent_cell = self.worksheet.cell(row=row2, column=17, value="Date Sent")
-        ifa_date_sent_cell.fill = self.header_fill
-        ifa_date_sent_cell.font = self.header_font
-        ifa_date_sent_cell.alignment = Alignment(horizontal='center', vertical='center')
-        ifa_date_sent_cell.border = self.border
-        self.worksheet.merge_cells(f"Q{row2}:Q{row3}")
-        
-        # Row 3: "Planned", "Actual"
-        ifa_planned_cell = self.worksheet.cell(row=row3, column=14, value="Planned")
-        ifa_planned_cell.fill = self.header_fill
-        ifa_planned_cell.font = self.header_font
-        ifa_planned_cell.alignment = Alignment(horizontal='center', vertical='center')
-        ifa_planned_cell.border = self.border
-        
-        ifa_actual_cell = self.worksheet.cell(row=row3, column=15, value="Actual")
-        ifa_actual_cell.fill = self.header_fill
-        ifa_actual_cell.font = self.header_font
-        ifa_actual_cell.alignment = Alignment(horizontal='center', vertical='center')
-        ifa_actual_cell.border = self.border
-        
-        # Apply styling to merged cells in row 3
-        for col in [16, 17]:
-            cell = self.worksheet.cell(row=row3, column=col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        
-        # ===== COLUMNS R-T - IFA Additional Section =====
-        # Row 1: Empty (merged R-T)
-        empty_cell_2 = self.worksheet.cell(row=row1, column=18, value="")
-        empty_cell_2.fill = self.header_fill
-        empty_cell_2.border = self.border
-        self.worksheet.merge_cells(f"R{row1}:T{row1}")
-        for col in range(18, 21):
-            cell = self.worksheet.cell(row=row1, column=col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        
-        # Row 2-3: Individual columns (merged vertically)
-        ifa_rev_status_cell = self.worksheet.cell(row=row2, column=18, value="Rev. Status")
-        ifa_rev_status_cell.fill = self.header_fill
-        ifa_rev_status_cell.font = self.header_font
-        ifa_rev_status_cell.alignment = Alignment(horizontal='center', vertical='center')
-        ifa_rev_status_cell.border = self.border
-        self.worksheet.merge_cells(f"R{row2}:R{row3}")
-        
-        ifa_issue_for_cell = self.worksheet.cell(row=row2, column=19, value="Issue For")
-        ifa_issue_for_cell.fill = self.header_fill
-        ifa_issue_for_cell.font = self.header_font
-        ifa_issue_for_cell.alignment = Alignment(horizontal='center', vertical='center')
-        ifa_issue_for_cell.border = self.border
-        self.worksheet.merge_cells(f"S{row2}:S{row3}")
-        
-        ifa_next_rev_cell = self.worksheet.cell(row=row2, column=20, value="Next Rev.")
-        ifa_next_rev_cell.fill = self.header_fill
-        ifa_next_rev_cell.font = self.header_font
-        ifa_next_rev_cell.alignment = Alignment(horizontal='center', vertical='center')
-        ifa_next_rev_cell.border = self.border
-        self.worksheet.merge_cells(f"T{row2}:T{row3}")
-        
-        # Apply styling to row 3
-        for col in range(18, 21):
-            cell = self.worksheet.cell(row=row3, column=col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        
-        # ===== COLUMNS U-W - IFC Section =====
-        # Row 1: "IFC" (merged U-W)
-        ifc_cell = self.worksheet.cell(row=row1, column=21, value="IFC")
-        ifc_cell.fill = self.header_fill
-        ifc_cell.font = self.header_font
-        ifc_cell.alignment = Alignment(horizontal='center', vertical='center')
-        ifc_cell.border = self.border
-        self.worksheet.merge_cells(f"U{row1}:W{row1}")
-        for col in range(21, 24):
-            cell = self.worksheet.cell(row=row1, column=col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        
-        # Row 2: "IFC Date" (merged U-V), "TR No." (merged rows 2-3)
-        ifc_date_cell = self.worksheet.cell(row=row2, column=21, value="IFC Date")
-        ifc_date_cell.fill = self.header_fill
-        ifc_date_cell.font = self.header_font
-        ifc_date_cell.alignment = Alignment(horizontal='center', vertical='center')
-        ifc_date_cell.border = self.border
-        self.worksheet.merge_cells(f"U{row2}:V{row2}")
-        for col in range(21, 23):
-            cell = self.worksheet.cell(row=row2, column=col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        
-        ifc_tr_cell = self.worksheet.cell(row=row2, column=23, value="TR No.")
-        ifc_tr_cell.fill = self.header_fill
-        ifc_tr_cell.font = self.header_font
-        ifc_tr_cell.alignment = Alignment(horizontal='center', vertical='center')
-        ifc_tr_cell.border = self.border
-        self.worksheet.merge_cells(f"W{row2}:W{row3}")
-        
-        # Row 3: "Planned", "Actual"
-        ifc_planned_cell = self.worksheet.cell(row=row3, column=21, value="Planned")
-        ifc_planned_cell.fill = self.header_fill
-        ifc_planned_cell.font = self.header_font
-        ifc_planned_cell.alignment = Alignment(horizontal='center', vertical='center')
-        ifc_planned_cell.border = self.border
-        
-        ifc_actual_cell = self.worksheet.cell(row=row3, column=22, value="Actual")
-        ifc_actual_cell.fill = self.header_fill
-        ifc_actual_cell.font = self.header_font
-        ifc_actual_cell.alignment = Alignment(horizontal='center', vertical='center')
-        ifc_actual_cell.border = self.border
-        
-        # Apply styling to merged cell in row 3
-        cell = self.worksheet.cell(row=row3, column=23)
-        cell.fill = self.header_fill
-        cell.border = self.border
-        
-        # ===== COLUMN X - Remarks (merged rows 1-3) =====
-        remarks_cell = self.worksheet.cell(row=row1, column=24, value="REMARKS")
-        remarks_cell.fill = self.header_fill
-        remarks_cell.font = self.header_font
-        remarks_cell.alignment = Alignment(horizontal='center', vertical='center')
-        remarks_cell.border = self.border
-        self.worksheet.merge_cells(f"X{row1}:X{row3}")
-        for row in [row2, row3]:
-            cell = self.worksheet.cell(row=row, column=24)
-            cell.fill = self.header_fill
-            cell.border = self.border
-
-        return row3 + 1
-    
-    def _add_main_headers_dynamic(self, start_row: int) -> int:
-        """Add main column headers dynamically based on stages configuration"""
-        
-        row1 = start_row
-        row2 = start_row + 1
-        row3 = start_row + 2
-        
-        # Set row heights
-        self.worksheet.row_dimensions[row1].height = 60
-        self.worksheet.row_dimensions[row2].height = 20
-        self.worksheet.row_dimensions[row3].height = 20
-        
-        # Get column positions
-        col_pos = get_column_positions()
-        
-        # ===== BASIC INFO COLUMNS (A, B, C) =====
-        # Logo/Timestamp section (A-F merged in row 1)
-        for col in range(1, 7):
-            cell = self.worksheet.cell(row=row1, column=col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        self.worksheet.merge_cells(f"A{row1}:F{row1}")
-        self._add_logo_to_header(row1)
-        self._add_timestamp_to_header(row1)
-        
-        # S/No, Doc Number, Doc Title (rows 2-3 merged)
-        basic_columns = [
-            (1, "S/No"),
-            (2, "Doc Number"),
-            (3, "DOC Title")
-        ]
-        
-        for col, header_text in basic_columns:
-            # Row 2
-            cell = self.worksheet.cell(row=row2, column=col, value=header_text)
-            cell.fill = self.header_fill
-            cell.font = self.header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = self.border
-            
-            # Merge rows 2-3
-            col_letter = get_column_letter(col)
-            self.worksheet.merge_cells(f"{col_letter}{row2}:{col_letter}{row3}")
-            
-            # Style row 3
-            cell3 = self.worksheet.cell(row=row3, column=col)
-            cell3.fill = self.header_fill
-            cell3.border = self.border
-        
-        # ===== CURRENT STATUS SECTION (D-F) =====
-        current_col = col_pos['current_status_start']
-        
-        # Row 2: "Current Status" merged across D-F
-        cell = self.worksheet.cell(row=row2, column=current_col, value="Current Status")
-        cell.fill = self.header_fill
-        cell.font = self.header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        cell.border = self.border
-        self.worksheet.merge_cells(f"{get_column_letter(current_col)}{row2}:{get_column_letter(current_col+2)}{row2}")
-        
-        for col in range(current_col, current_col + 3):
-            cell = self.worksheet.cell(row=row2, column=col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        
-        # Row 3: Individual columns
-        status_columns = ["Current Rev", "Status", "Current Transmittal No."]
-        for i, text in enumerate(status_columns):
-            cell = self.worksheet.cell(row=row3, column=current_col + i, value=text)
-            cell.fill = self.header_fill
-            cell.font = self.header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = self.border
-        
-        # ===== STAGE SECTIONS =====
-        for stage in STANDARD_STAGES:
-            stage_code = stage['code']
-            stage_col = col_pos[f"{stage_code.lower()}_start"]
-            feedback_cols = get_feedback_columns(stage['has_next_rev'])
-            
-            # Calculate column spans
-            submission_col_count = len(SUBMISSION_COLUMNS)
-            feedback_col_count = len(feedback_cols)
-            total_cols = submission_col_count + feedback_col_count
-            
-            # ROW 1: Stage name (e.g., "IFR") merged across submission columns only
-            stage_end_col = stage_col + submission_col_count - 1
-            cell = self.worksheet.cell(row=row1, column=stage_col, value=stage_code)
-            cell.fill = self.header_fill
-            cell.font = self.header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = self.border
-            self.worksheet.merge_cells(f"{get_column_letter(stage_col)}{row1}:{get_column_letter(stage_end_col)}{row1}")
-            
-            for col in range(stage_col, stage_end_col + 1):
-                cell = self.worksheet.cell(row=row1, column=col)
-                cell.fill = self.header_fill
-                cell.border = self.border
-            
-            # ROW 1: "Client's Feedback" merged across feedback columns
-            feedback_start_col = stage_col + submission_col_count
-            feedback_end_col = feedback_start_col + feedback_col_count - 1
-            cell = self.worksheet.cell(row=row1, column=feedback_start_col, 
-                                      value=f"Client's Feedback ({stage_code} Stage)")
-            cell.fill = self.header_fill
-            cell.font = self.header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = self.border
-            self.worksheet.merge_cells(f"{get_column_letter(feedback_start_col)}{row1}:{get_column_letter(feedback_end_col)}{row1}")
-            
-            for col in range(feedback_start_col, feedback_end_col + 1):
-                cell = self.worksheet.cell(row=row1, column=col)
-                cell.fill = self.header_fill
-                cell.border = self.border
-            
-            # ROW 2: Date columns merged (Planned/Actual)
-            date_label = f"{stage_code} Date" if stage_code != 'AFC' else "AFC Date"
-            cell = self.worksheet.cell(row=row2, column=stage_col, value=date_label)
-            cell.fill = self.header_fill
-            cell.font = self.header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = self.border
-            self.worksheet.merge_cells(f"{get_column_letter(stage_col)}{row2}:{get_column_letter(stage_col+1)}{row2}")
-            
-            for col in range(stage_col, stage_col + 2):
-                cell = self.worksheet.cell(row=row2, column=col)
-                cell.fill = self.header_fill
-                cell.border = self.border
-            
-            # ROW 3: Planned/Actual
-            cell = self.worksheet.cell(row=row3, column=stage_col, value="Planned")
-            cell.fill = self.header_fill
-            cell.font = self.header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = self.border
-            
-            cell = self.worksheet.cell(row=row3, column=stage_col+1, value="Actual")
-            cell.fill = self.header_fill
-            cell.font = self.header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = self.border
-            
-            # ROW 2-3: TR No. and Date Sent (merged vertically)
-            remaining_submission_cols = ["TR No.", "Date Sent"]
-            for i, col_name in enumerate(remaining_submission_cols):
-                col = stage_col + 2 + i
-                cell = self.worksheet.cell(row=row2, column=col, value=col_name)
-                cell.fill = self.header_fill
-                cell.font = self.header_font
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-                cell.border = self.border
-                self.worksheet.merge_cells(f"{get_column_letter(col)}{row2}:{get_column_letter(col)}{row3}")
-                
-                cell3 = self.worksheet.cell(row=row3, column=col)
-                cell3.fill = self.header_fill
-                cell3.border = self.border
-            
-            # ROW 2-3: Feedback columns (merged vertically)
-            for i, feedback_col in enumerate(feedback_cols):
-                col = feedback_start_col + i
-                cell = self.worksheet.cell(row=row2, column=col, value=feedback_col['name'])
-                cell.fill = self.header_fill
-                cell.font = self.header_font
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-                cell.border = self.border
-                self.worksheet.merge_cells(f"{get_column_letter(col)}{row2}:{get_column_letter(col)}{row3}")
-                
-                cell3 = self.worksheet.cell(row=row3, column=col)
-                cell3.fill = self.header_fill
-                cell3.border = self.border
-        
-        # ===== REMARKS COLUMN =====
-        remarks_col = col_pos['remarks']
-        cell = self.worksheet.cell(row=row1, column=remarks_col, value="REMARKS")
-        cell.fill = self.header_fill
-        cell.font = self.header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        cell.border = self.border
-        self.worksheet.merge_cells(f"{get_column_letter(remarks_col)}{row1}:{get_column_letter(remarks_col)}{row3}")
-        
-        for row in [row2, row3]:
-            cell = self.worksheet.cell(row=row, column=remarks_col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        
-        return row3 + 1
-
-    def _add_category_section(self, category: DocumentCategory, documents: List[DocumentRecord], start_row: int) -> int:
-        """Add a category section with its documents"""
-        # Add category header
-        category_cell = self.worksheet.cell(row=start_row, column=1, value=category.value)
-        category_cell.fill = self.category_fill
-        category_cell.font = self.category_font
-        category_cell.alignment = Alignment(horizontal='left', vertical='center')
-        category_cell.border = self.border
-        # Get the remarks column position (last column)
-        col_pos = get_column_positions()
-        last_col_letter = get_column_letter(col_pos['remarks'])
-        self.worksheet.merge_cells(f"A{start_row}:{last_col_letter}{start_row}")  # Span all columns
-        current_row = start_row + 1
-
-        # Add documents with auto-numbering
-        for i, document in enumerate(documents, 1):
-            self._add_document_row_with_number(document, current_row, i)
-            current_row += 1
-
-        return current_row
-
-    def _add_document_row(self, document: DocumentRecord, row: int):
-        """Add a single document row with simplified format"""
-        # Auto-numbering for S/No (column A)
-        doc_count = 1  # This should be passed as parameter, but for now using 1
-        
-        values = [
-            doc_count,                    # A: S/No (auto-numbered)
-            document.doc_number,          # B: Doc Number
-            document.doc_title,           # C: DOC Title
-            document.status.value,        # D: Status
-            "",                          # E: Definition (empty for now)
-            document.ifr_date_planned or "",    # F: IFR Planned
-            document.ifr_date_actual or "",     # G: IFR Actual
-            document.ifa_planned or "",         # H: IFA Planned
-            document.ifa_actual or "",          # I: IFA Actual
-            document.ifc_date_planned or "",    # J: IFC Planned
-            document.ifc_date_actual or "",     # K: IFC Actual
-            document.remarks or ""              # L: Remarks
-        ]
-
-        for col, value in enumerate(values, 1):
-            cell = self.worksheet.cell(row=row, column=col, value=value)
-            cell.border = self.border
-            
-            # Apply specific formatting
-            if col == 1:  # S/No column - center aligned
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-                cell.font = Font(bold=True)
-            elif col == 2:  # DOC Number - center aligned
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-                cell.font = Font(bold=True)
-            elif col == 3:  # Document title - left aligned
-                cell.alignment = Alignment(horizontal='left', vertical='center')
-            elif col == 4:  # Status - center aligned
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-            else:  # All other columns - center aligned
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-
-    def _add_document_row_with_number(self, document: DocumentRecord, row: int, doc_number: int):
-        """Add a single document row with auto-numbering for all stages dynamically"""
-        col_pos = get_column_positions()
-        
-        # Basic info (A, B, C)
-        self.worksheet.cell(row=row, column=1, value=doc_number).border = self.border
-        self.worksheet.cell(row=row, column=1).alignment = Alignment(horizontal='center', vertical='center')
-        self.worksheet.cell(row=row, column=1).font = Font(bold=True)
-        
-        self.worksheet.cell(row=row, column=2, value=document.doc_number).border = self.border
-        self.worksheet.cell(row=row, column=2).alignment = Alignment(horizontal='center', vertical='center')
-        self.worksheet.cell(row=row, column=2).font = Font(bold=True)
-        
-        self.worksheet.cell(row=row, column=3, value=document.doc_title).border = self.border
-        self.worksheet.cell(row=row, column=3).alignment = Alignment(horizontal='left', vertical='center')
-        
-        # Current Status (D, E, F)
-        current_col = col_pos['current_status_start']
-        status_values = [
-            document.current_rev or "",
-            document.current_status or document.status.value,
-            document.current_transmittal_no or ""
-        ]
-        for i, val in enumerate(status_values):
-            cell = self.worksheet.cell(row=row, column=current_col + i, value=val)
-            cell.border = self.border
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # All stages dynamically
-        for stage in STANDARD_STAGES:
-            stage_code_lower = stage['code'].lower()
-            stage_col = col_pos[f"{stage_code_lower}_start"]
-            
-            # Get values from document using stage code
-            stage_values = [
-                getattr(document, f"{stage_code_lower}_date_planned", "") or "",
-                getattr(document, f"{stage_code_lower}_date_actual", "") or "",
-                getattr(document, f"{stage_code_lower}_tr_no", "") or "",
-                getattr(document, f"{stage_code_lower}_date_sent", "") or "",
-                getattr(document, f"{stage_code_lower}_rev_status", "") or "",
-                getattr(document, f"{stage_code_lower}_issue_for", "") or "",
-                getattr(document, f"{stage_code_lower}_date_received", "") or "",
-                getattr(document, f"{stage_code_lower}_tr_received", "") or "",  # NEW: Transmittal Received
-            ]
-            
-            # Add next_rev if applicable (all except IFR and AFC)
-            if stage['has_next_rev']:
-                stage_values.append(getattr(document, f"{stage_code_lower}_next_rev", "") or "")
-            
-            # Write values to cells
-            for i, val in enumerate(stage_values):
-                cell = self.worksheet.cell(row=row, column=stage_col + i, value=val)
-                cell.border = self.border
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Remarks (last column)
-        remarks_col = col_pos['remarks']
-        cell = self.worksheet.cell(row=row, column=remarks_col, value=document.remarks or "")
-        cell.border = self.border
-        cell.alignment = Alignment(horizontal='left', vertical='center')
-
-    def _apply_formatting(self):
-        """Apply general formatting to the worksheet with autosizing"""
-        col_pos = get_column_positions()
-        max_col = col_pos['remarks']  # Get total number of columns
-        
-        # Auto-size columns based on content
-        for col_idx in range(1, max_col + 1):  # All columns dynamically
-            max_length = 0
-            column_letter = get_column_letter(col_idx)
-            
-            for row in self.worksheet.iter_rows(min_col=col_idx, max_col=col_idx):
-                for cell in row:
-                    try:
-                        # Skip merged cells
-                        if isinstance(cell, MergedCell):
-                            continue
-                        
-                        if cell.value:
-                            # Calculate cell content length
-                            cell_length = len(str(cell.value))
-                            if cell_length > max_length:
-                                max_length = cell_length
-                    except:
-                        pass
-            
-            # Set column width with min and max limits
-            if max_length > 0:
-                adjusted_width = min(max(max_length + 2, 8), 50)  # Min 8, Max 50
-                self.worksheet.column_dimensions[column_letter].width = adjusted_width
-        
-        # Override specific columns with fixed widths for better layout
-        remarks_letter = get_column_letter(col_pos['remarks'])
-        column_widths_override = {
-            'A': 8,   # S/No - fixed small
-            'C': 40,  # DOC Title - fixed large for readability
-            remarks_letter: 30,  # REMARKS - fixed large (dynamic position)
-        }
-        
-        for col_letter, width in column_widths_override.items():
-            self.worksheet.column_dimensions[col_letter].width = width
-
-        # Apply borders to all used cells
-        for row in self.worksheet.iter_rows():
-            for cell in row:
-                if cell.value is not None:
-                    cell.border = self.border
-
 
 class MDRExcelLoader:
     """Loads existing Excel MDR files for editing"""
     
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, progress=None, cancel_token: Optional[CancellationToken] = None):
         self.file_path = file_path
         self.workbook = None
         self.worksheet = None
+        self.tracker = ProgressTracker(progress, cancel_token)
     
     def load_mdr_project(self) -> Optional[MDRProject]:
         """Load MDR project data from Excel file"""
         try:
+            self.tracker.phase('read workbook')
             self.workbook = openpyxl.load_workbook(self.file_path)
             self.worksheet = self.workbook.active
             
@@ -1119,6 +330,8 @@ class MDRExcelLoader:
                 documents=documents
             )
             
+        except OperationCancelled:
+            raise
         except Exception as e:
             raise Exception(f"Error loading MDR Excel file: {str(e)}")
         finally:
@@ -1193,9 +406,11 @@ class MDRExcelLoader:
             raise ValueError("Could not find header row with S/No column")
         
         col_pos = get_column_positions()
+        self.tracker.phase('load documents', self.worksheet.max_row - header_row)
         
         # Process rows after header
         for row in range(header_row + 1, self.worksheet.max_row + 1):
+            self.tracker.advance()
             row_data = self._get_row_data(row)
             
             if not any(row_data):  # Skip empty rows
@@ -1271,6 +486,7 @@ class MDRExcelLoader:
                 # Skip rows with invalid data
                 continue
         
+        self.tracker.finish()
         return documents
     
     def _get_row_data(self, row: int) -> List:
@@ -1307,6 +523,286 @@ class MDRExcelLoader:
         return None
 
 
+class BackgroundExecutor:
+    """
+    Runs blocking work (database queries, openpyxl) on worker threads
+    
+    Tk widgets may only be touched from the main thread, so results, errors and
+    progress updates are queued and delivered by a root.after poll loop. Every
+    task gets a new database session from session_factory.
+    """
+    
+    POLL_MS = 50
+    
+    def __init__(self, root, session_factory, workers=2):
+        self.root = root
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mdr-worker")
+        self._session_factory = session_factory
+        self._callbacks = queue.Queue()
+        self.root.after(self.POLL_MS, self._drain)
+    
+    def submit(self, work, on_success=None, on_error=None):
+        """Run work(session) on a worker; on_success(result) / on_error(exception) run on the Tk thread"""
+        def run():
+            session = self._session_factory()
+            try:
+                result = work(session)
+            except Exception as e:
+                session.rollback()
+                self.call_soon(on_error or self._report_error, e)
+            else:
+                if on_success:
+                    self.call_soon(on_success, result)
+            finally:
+                # Loaded objects stay usable (detached) in the callbacks
+                session.close()
+        
+        return self._pool.submit(run)
+    
+    def call_soon(self, func, *args):
+        """Queue func(*args) to run on the Tk thread (safe to call from any thread)"""
+        self._callbacks.put((func, args))
+    
+    def shutdown(self):
+        """Drop queued work; a task that is already running finishes before the process exits"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+    
+    def _drain(self):
+        while True:
+            try:
+                func, args = self._callbacks.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"[ERROR] Background callback failed: {e}")
+        self.root.after(self.POLL_MS, self._drain)
+    
+    @staticmethod
+    def _report_error(error):
+        print(f"[ERROR] Background task failed: {error}")
+
+
+def write_atomically(path, write):
+    """
+    Call write(temp_path) and move the result over path
+    
+    The temporary file sits next to the target, so the final os.replace is an
+    atomic rename: readers see the old workbook or the new one, never half of one.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".~{name}.", suffix=".tmp", dir=directory)
+    os.close(fd)
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class AutoSaver:
+    """
+    Debounced background auto-save to the file the MDR was last saved as
+    
+    schedule() (re)starts a timer, so a burst of edits produces one save. When
+    it fires, prepare() is called on the Tk thread and returns a snapshot as
+    (fingerprint(session), write(path, session)), or None when there is nothing
+    to save. The worker hashes the fingerprint and skips the write when it
+    matches the last saved content; otherwise the workbook is written atomically.
+    """
+    
+    DELAY_MS = 2000
+    
+    def __init__(self, root, executor, prepare):
+        self.root = root
+        self.executor = executor
+        self.prepare = prepare
+        self.path = None
+        self._digest = None
+        self._timer = None
+        self._running = False
+        self._pending = False
+    
+    def track(self, path):
+        """Auto-save to path from now on (None stops auto-saving)"""
+        self.path = path
+        self._digest = None
+        if path is None and self._timer:
+            self.root.after_cancel(self._timer)
+            self._timer = None
+    
+    def schedule(self):
+        """Save after DELAY_MS without further calls"""
+        if not self.path:
+            return
+        if self._timer:
+            self.root.after_cancel(self._timer)
+        self._timer = self.root.after(self.DELAY_MS, self._save)
+    
+    def _save(self):
+        self._timer = None
+        if self._running:
+            self._pending = True  # Saved again once the running save is done
+            return
+        try:
+            snapshot = self.prepare()
+        except Exception as e:
+            print(f"Auto-save failed: {e}")
+            return
+        if not snapshot or not self.path:
+            return
+        
+        fingerprint, write = snapshot
+        path, saved_digest = self.path, self._digest
+        
+        def work(session):
+            digest = hashlib.sha256(fingerprint(session).encode('utf-8')).hexdigest()
+            if digest == saved_digest and os.path.exists(path):
+                return digest, False
+            write_atomically(path, lambda temp_path: write(temp_path, session))
+            return digest, True
+        
+        def done(result):
+            digest, written = result
+            if path == self.path:
+                self._digest = digest
+            if written:
+                print(f"[OK] Auto-saved {path}")
+            finished()
+        
+        def failed(error):
+            # Log error but don't interrupt user workflow
+            print(f"Auto-save failed: {error}")
+            finished()
+        
+        def finished():
+            self._running = False
+            if self._pending:
+                self._pending = False
+                self.schedule()
+        
+        self._running = True
+        self.executor.submit(work, done, failed)
+
+
+class DocumentListModel:
+    """
+    Database-backed list behind the documents Treeview
+    
+    Holds the portfolio's document count and the display tuples of the pages
+    viewed recently; rows are fetched a page at a time with one joined query,
+    so showing, scrolling and refreshing the list cost the same for any
+    portfolio size. The rows are plain tuples, so no ORM objects are kept.
+    """
+    
+    PAGE_SIZE = 200
+    MAX_PAGES = 20
+    
+    def __init__(self, portfolio_id, total=0, version=0):
+        self.portfolio_id = portfolio_id
+        self.total = total
+        self.version = version
+        self._pages = {}
+    
+    @classmethod
+    def load(cls, session, portfolio_id, offset=0, limit=PAGE_SIZE):
+        """Count the portfolio's documents and fetch the rows of one window (safe on a worker session)"""
+        # Version first: a change made while loading is picked up again by the next poll
+        version = get_portfolio_version(portfolio_id, session)
+        model = cls(portfolio_id, cls.count(session, portfolio_id), version)
+        model.rows(offset, limit, session)
+        return model
+    
+    @staticmethod
+    def count(session, portfolio_id):
+        """Number of documents in a portfolio"""
+        return session.execute(
+            select(func.count(Document.id)).where(Document.portfolio_id == portfolio_id)
+        ).scalar()
+    
+    @staticmethod
+    def display_values(discipline, doc_number, doc_title, status):
+        """Treeview column values for one document"""
+        return (discipline or "Uncategorized", doc_number or "", doc_title or "", status or "Not Started")
+    
+    def __len__(self):
+        return self.total
+    
+    def document_id(self, index, session):
+        """Id of the document at a list position"""
+        rows = self.rows(index, 1, session) if 0 <= index < self.total else []
+        if not rows:
+            raise IndexError(index)
+        return rows[0][0]
+    
+    def rows(self, offset, limit, session):
+        """(document id, column values) of the rows in [offset, offset + limit); session fetches missing pages"""
+        end = min(offset + limit, self.total)
+        rows = []
+        position = max(offset, 0)
+        while position < end:
+            page, start = divmod(position, self.PAGE_SIZE)
+            if page not in self._pages:
+                self._fetch(session, page)
+            chunk = self._pages[page][start:start + end - position]
+            if not chunk:
+                break  # Documents were removed since the count was taken
+            rows.extend(chunk)
+            position += len(chunk)
+        return rows
+    
+    def update(self, document):
+        """Replace a cached row with the document's current values; returns them (None if not cached)"""
+        values = self.display_values(document.discipline.name if document.discipline else None,
+                                     document.doc_number, document.doc_title, document.current_status)
+        return values if self._replace(document.id, values) else None
+    
+    def patch(self, changes):
+        """
+        Apply change-feed rows (id, discipline, number, title, status) to the cached pages
+        
+        Returns the (id, values) pairs to redraw, or None when a change cannot be
+        patched in place (an unknown document, or a new discipline or number,
+        which moves the row) and the list must be reloaded.
+        """
+        patched = []
+        for doc_id, *fields in changes:
+            values = self.display_values(*fields)
+            old = self._replace(doc_id, values, sort_key=values[:2])
+            if old is None:
+                return None
+            patched.append((doc_id, values))
+        return patched
+    
+    def _replace(self, doc_id, values, sort_key=None):
+        """Swap in a cached row's values; returns the old values, None if not cached or (given sort_key) moved"""
+        for page in self._pages.values():
+            for i, (cached_id, old) in enumerate(page):
+                if cached_id == doc_id:
+                    if sort_key is not None and old[:2] != sort_key:
+                        return None
+                    page[i] = (doc_id, values)
+                    return old
+        return None
+    
+    def _fetch(self, session, page):
+        result = session.execute(
+            select(Document.id, Discipline.name, Document.doc_number, Document.doc_title, Document.current_status)
+            .outerjoin(Discipline, Document.discipline_id == Discipline.id)
+            .where(Document.portfolio_id == self.portfolio_id)
+            .order_by(Document.discipline_id, Document.doc_number, Document.id)
+            .offset(page * self.PAGE_SIZE)
+            .limit(self.PAGE_SIZE)
+        )
+        # Keep the most recently fetched pages only
+        if len(self._pages) >= self.MAX_PAGES:
+            del self._pages[next(iter(self._pages))]
+        self._pages[page] = [(row[0], self.display_values(*row[1:])) for row in result]
+
+
 class MDRPlannerGUI:
     """Main GUI application for MDR planning - NOW WITH DATABASE INTEGRATION"""
 
@@ -1320,6 +816,18 @@ class MDRPlannerGUI:
         print("[INFO] Initializing database connection...")
         init_db_standalone()
         
+        # One short-lived session per operation instead of the process-wide db.session
+        self.sessions = SessionManager(db.session.get_bind())
+        
+        # Exports, loads and document queries run here so the window stays responsive
+        self.executor = BackgroundExecutor(self.root, self.sessions.factory)
+        self.auto_saver = AutoSaver(self.root, self.executor, self.auto_save_snapshot)
+        self._refresh_generation = 0
+        
+        # Pick up edits made in the web apps without reloading the whole list
+        self._polling_changes = False
+        self.root.after(CHANGE_POLL_MS, self.poll_changes)
+        
         # Portfolio management
         self.current_portfolio = None
         self.current_portfolio_id = None
@@ -1371,16 +879,22 @@ class MDRPlannerGUI:
         portfolio_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
-        # Load portfolios from database
+        # Load portfolios from database (document counts from the summary table)
         try:
-            portfolios = db.session.query(Portfolio).all()
-            for portfolio in portfolios:
-                doc_count = db.session.query(Document).filter_by(portfolio_id=portfolio.id).count()
+            with self.sessions.snapshot() as session:
+                summaries = portfolio_summaries(session=session)
+                portfolios = [
+                    (portfolio_id, name, code, client,
+                     summaries[portfolio_id].documents if portfolio_id in summaries else 0)
+                    for portfolio_id, name, code, client in session.execute(
+                        select(Portfolio.id, Portfolio.name, Portfolio.code, Portfolio.client).order_by(Portfolio.id))
+                ]
+            for portfolio_id, name, code, client, doc_count in portfolios:
                 portfolio_tree.insert("", tk.END, values=(
-                    portfolio.id,
-                    portfolio.name,
-                    portfolio.code or "",
-                    portfolio.client or "",
+                    portfolio_id,
+                    name,
+                    code or "",
+                    client or "",
                     doc_count
                 ))
         except Exception as e:
@@ -1420,14 +934,14 @@ class MDRPlannerGUI:
                                   f"Are you sure you want to delete portfolio '{portfolio_name}'?\n\n"
                                   f"This will delete all associated documents and cannot be undone."):
                 try:
-                    portfolio = db.session.query(Portfolio).get(portfolio_id)
+                    with self.sessions.unit_of_work() as session:
+                        portfolio = session.get(Portfolio, portfolio_id)
+                        if portfolio:
+                            session.delete(portfolio)
                     if portfolio:
-                        db.session.delete(portfolio)
-                        db.session.commit()
                         portfolio_tree.delete(selected[0])
                         messagebox.showinfo("Success", f"Portfolio '{portfolio_name}' deleted successfully.")
                 except Exception as e:
-                    db.session.rollback()
                     messagebox.showerror("Error", f"Failed to delete portfolio:\n{str(e)}")
         
         ttk.Button(button_frame, text="📂 Open Selected", command=open_selected, width=20).pack(side=tk.LEFT, padx=5)
@@ -1503,8 +1017,8 @@ class MDRPlannerGUI:
                     code=code if code else None,
                     client=client if client else None
                 )
-                db.session.add(portfolio)
-                db.session.commit()
+                with self.sessions.unit_of_work() as session:
+                    session.add(portfolio)
                 
                 self.current_portfolio = portfolio
                 self.current_portfolio_id = portfolio.id
@@ -1514,7 +1028,6 @@ class MDRPlannerGUI:
                 self.setup_ui()
                 
             except Exception as e:
-                db.session.rollback()
                 messagebox.showerror("Error", f"Failed to create portfolio:\n{str(e)}")
         
         def cancel():
@@ -1533,7 +1046,9 @@ class MDRPlannerGUI:
     def load_portfolio_from_db(self, portfolio_id):
         """Load a portfolio and its documents from the database"""
         try:
-            portfolio = db.session.query(Portfolio).get(portfolio_id)
+            # Detached snapshot: only its columns are read (name, code, client)
+            with self.sessions.snapshot() as session:
+                portfolio = session.get(Portfolio, portfolio_id)
             if not portfolio:
                 messagebox.showerror("Error", "Portfolio not found in database!")
                 return
@@ -1555,7 +1070,9 @@ class MDRPlannerGUI:
         for widget in self.root.winfo_children():
             widget.destroy()
         
-        # Reset state
+        # Reset state; drop anything still held by the process-wide session
+        self.auto_saver.track(None)
+        db.session.expunge_all()
         self.current_portfolio = None
         self.current_portfolio_id = None
         self.mdr_project = None
@@ -1572,8 +1089,8 @@ class MDRPlannerGUI:
         
         try:
             # Refresh the portfolio object from DB
-            db.session.expire(self.current_portfolio)
-            self.current_portfolio = db.session.query(Portfolio).get(self.current_portfolio_id)
+            with self.sessions.snapshot() as session:
+                self.current_portfolio = session.get(Portfolio, self.current_portfolio_id)
             
             # Reload the documents list
             self.refresh_documents_list()
@@ -1713,14 +1230,19 @@ class MDRPlannerGUI:
         self.documents_tree.column("Document Title", width=350, minwidth=250)
         self.documents_tree.column("Status", width=120, minwidth=100)
 
-        # Scrollbars
-        v_scrollbar = ttk.Scrollbar(self.list_frame, orient=tk.VERTICAL, command=self.documents_tree.yview)
+        # Scrollbars (database lists only hold the visible rows, so vertical scrolling moves the window)
+        self.document_list_offset = 0
+        self.documents_scrollbar = ttk.Scrollbar(self.list_frame, orient=tk.VERTICAL, command=self.scroll_documents)
         h_scrollbar = ttk.Scrollbar(self.list_frame, orient=tk.HORIZONTAL, command=self.documents_tree.xview)
-        self.documents_tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
+        self.documents_tree.configure(yscrollcommand=self.documents_tree_scrolled, xscrollcommand=h_scrollbar.set)
+        
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.documents_tree.bind(sequence, self.on_documents_mousewheel)
+        self.documents_tree.bind("<Configure>", lambda e: self.render_documents_window())
 
         # Grid layout
         self.documents_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        v_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.documents_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
         h_scrollbar.grid(row=1, column=0, sticky=(tk.W, tk.E))
 
         # Action buttons
@@ -1815,37 +1337,38 @@ class MDRPlannerGUI:
                 messagebox.showerror("Error", "Please enter both DOC Number and Document Title.")
                 return
 
-            # Find or create discipline
-            discipline = db.session.query(Discipline).filter_by(
-                portfolio_id=self.current_portfolio_id,
-                name=category_str
-            ).first()
-            
-            if not discipline:
-                discipline = Discipline(
+            with self.sessions.unit_of_work() as session:
+                # Find or create discipline
+                discipline = session.query(Discipline).filter_by(
+                    portfolio_id=self.current_portfolio_id,
+                    name=category_str
+                ).first()
+                
+                if not discipline:
+                    discipline = Discipline(
+                        portfolio_id=self.current_portfolio_id,
+                        name=category_str,
+                        description=f"{category_str} documents"
+                    )
+                    session.add(discipline)
+                    session.flush()  # Get the discipline ID
+                
+                # Create database document record
+                db_document = Document(
                     portfolio_id=self.current_portfolio_id,
-                    name=category_str,
-                    description=f"{category_str} documents"
+                    discipline_id=discipline.id,
+                    doc_number=doc_number,
+                    doc_title=doc_title,
+                    current_status=status_str
                 )
-                db.session.add(discipline)
-                db.session.flush()  # Get the discipline ID
-            
-            # Create database document record
-            db_document = Document(
-                portfolio_id=self.current_portfolio_id,
-                discipline_id=discipline.id,
-                doc_number=doc_number,
-                doc_title=doc_title,
-                current_status=status_str
-            )
-            
-            db.session.add(db_document)
-            db.session.commit()
+                
+                session.add(db_document)
             
             print(f"[OK] Added document to database: {doc_number}")
 
             # Reload the documents list from database
             self.refresh_documents_list()
+            self.auto_save()
 
             # Clear form
             self.doc_title_var.set("")
@@ -1853,7 +1376,6 @@ class MDRPlannerGUI:
             messagebox.showinfo("Success", f"Document '{doc_number}' added to database successfully!")
 
         except Exception as e:
-            db.session.rollback()
             messagebox.showerror("Error", f"Failed to add document to database:\n{str(e)}")
             print(f"[ERROR] {str(e)}")
 
@@ -1878,12 +1400,28 @@ class MDRPlannerGUI:
         if not confirm:
             return
 
+        if isinstance(self.documents_data, DocumentListModel):
+            # Database list: the tree item id is the document id
+            try:
+                with self.sessions.unit_of_work() as session:
+                    db_document = session.get(Document, int(selected_item[0]))
+                    if db_document:
+                        session.delete(db_document)
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to delete document from database:\n{str(e)}")
+                return
+            self.refresh_documents_list()
+            self.auto_save()
+            messagebox.showinfo("Success", "Document deleted successfully!")
+            return
+        
         # Get the index and remove
         index = self.documents_tree.index(selected_item[0])
         if 0 <= index < len(self.documents_data):
             del self.documents_data[index]
             self.documents_tree.delete(selected_item[0])
             self.update_documents_count()
+            self.auto_save()
             messagebox.showinfo("Success", "Document deleted successfully!")
 
     def clear_all_with_confirmation(self):
@@ -1903,7 +1441,9 @@ class MDRPlannerGUI:
         )
         
         if confirm:
-            self.documents_data.clear()
+            # Never auto-save an empty MDR over the last file
+            self.auto_saver.track(None)
+            self.documents_data = []
             self.documents_tree.delete(*self.documents_tree.get_children())
             self.project_name_var.set("")
             self.project_code_var.set("")
@@ -1917,7 +1457,8 @@ class MDRPlannerGUI:
         """Load demo MDR data"""
         try:
             # Clear existing data first
-            self.documents_data.clear()
+            self.auto_saver.track(None)
+            self.documents_data = []
             self.documents_tree.delete(*self.documents_tree.get_children())
             
             # Set demo project info
@@ -2031,53 +1572,67 @@ class MDRPlannerGUI:
                 return
 
             # Show progress
-            progress_window = tk.Toplevel(self.root)
-            progress_window.title("Generating MDR...")
-            progress_window.geometry("300x100")
-            progress_window.transient(self.root)
-            progress_window.grab_set()
-            
-            progress_window.geometry("+%d+%d" % (
-                self.root.winfo_rootx() + 50,
-                self.root.winfo_rooty() + 50
-            ))
-            
-            ttk.Label(progress_window, text="Generating MDR Excel file...", font=('Arial', 12)).pack(expand=True)
-            progress_window.update()
+            progress_window, progress, cancel_token = self.show_progress_window(
+                "Generating MDR...", "Generating MDR Excel file...")
 
-            # Generate Excel file
-            mdr_project = self.create_mdr_project()
-            generator = MDRExcelGenerator(mdr_project)
-            generator.generate(file_path)
-            
-            # Generate accompanying .txt file
+            # Snapshot the GUI data here; the worker must not touch Tk variables
+            portfolio_id = self.current_portfolio_id if self.has_database_documents() else None
+            mdr_project = None if portfolio_id else self.create_mdr_project()
             txt_file_path = file_path.replace('.xlsx', '_summary.txt')
-            try:
-                preview_text = self.generate_preview_text(mdr_project)
-                with open(txt_file_path, 'w', encoding='utf-8') as txt_file:
-                    txt_file.write(preview_text)
-            except Exception as txt_error:
-                print(f"Warning: Could not create .txt file: {txt_error}")
-            
-            progress_window.destroy()
 
-            # Success message
-            files_created = f"Files created:\n• {file_path}\n• {txt_file_path}"
-            result = messagebox.askyesno(
-                "Success",
-                f"MDR files generated successfully!\n\n"
-                f"{files_created}\n\n"
-                f"Would you like to open the file location?",
-                icon='info'
-            )
-            
-            if result:
-                if platform.system() == "Windows":
-                    subprocess.run(f'explorer /select,"{file_path}"')
-                elif platform.system() == "Darwin":
-                    subprocess.run(["open", "-R", file_path])
+            def work(session):
+                if portfolio_id:
+                    # Documents from the database: export the portfolio with the worker's own session
+                    portfolio = session.get(Portfolio, portfolio_id)
+                    MDRExcelExporter(portfolio, progress=progress, cancel_token=cancel_token).export(file_path)
+                    return [file_path]
+                
+                # Generate Excel file
+                generator = MDRExcelGenerator(mdr_project, progress=progress, cancel_token=cancel_token)
+                generator.generate(file_path)
+                
+                # Generate accompanying .txt file
+                try:
+                    preview_text = self.generate_preview_text(mdr_project)
+                    with open(txt_file_path, 'w', encoding='utf-8') as txt_file:
+                        txt_file.write(preview_text)
+                except Exception as txt_error:
+                    print(f"Warning: Could not create .txt file: {txt_error}")
+                    return [file_path]
+                return [file_path, txt_file_path]
+            
+            def on_success(files):
+                progress_window.destroy()
+                
+                # Later edits are auto-saved to this file
+                self.auto_saver.track(file_path)
+                
+                # Success message
+                files_created = "Files created:\n" + "\n".join(f"• {path}" for path in files)
+                result = messagebox.askyesno(
+                    "Success",
+                    f"MDR files generated successfully!\n\n"
+                    f"{files_created}\n\n"
+                    f"Would you like to open the file location?",
+                    icon='info'
+                )
+                
+                if result:
+                    if platform.system() == "Windows":
+                        subprocess.run(f'explorer /select,"{file_path}"')
+                    elif platform.system() == "Darwin":
+                        subprocess.run(["open", "-R", file_path])
+                    else:
+                        subprocess.run(["xdg-open", os.path.dirname(file_path)])
+            
+            def on_error(error):
+                progress_window.destroy()
+                if isinstance(error, OperationCancelled):
+                    messagebox.showinfo("Cancelled", "MDR generation was cancelled. No file was written.")
                 else:
-                    subprocess.run(["xdg-open", os.path.dirname(file_path)])
+                    messagebox.showerror("Error", f"Failed to generate MDR Excel file:\n{str(error)}")
+            
+            self.executor.submit(work, on_success, on_error)
 
         except Exception as e:
             try:
@@ -2086,6 +1641,50 @@ class MDRPlannerGUI:
                 pass
             messagebox.showerror("Error", f"Failed to generate MDR Excel file:\n{str(e)}")
 
+    def show_progress_window(self, title, message):
+        """Modal progress window with a Cancel button; returns (window, progress callback, cancel token)"""
+        progress_window = tk.Toplevel(self.root)
+        progress_window.title(title)
+        progress_window.geometry("320x140")
+        progress_window.transient(self.root)
+        progress_window.grab_set()
+        
+        progress_window.geometry("+%d+%d" % (
+            self.root.winfo_rootx() + 50,
+            self.root.winfo_rooty() + 50
+        ))
+        
+        ttk.Label(progress_window, text=message, font=('Arial', 12)).pack(pady=(10, 0))
+        status_label = ttk.Label(progress_window, text="")
+        status_label.pack()
+        progress_bar = ttk.Progressbar(progress_window, length=280, maximum=100)
+        progress_bar.pack(pady=5)
+        
+        cancel_token = CancellationToken()
+        
+        def cancel():
+            cancel_token.cancel()
+            status_label.config(text="Cancelling...")
+        
+        ttk.Button(progress_window, text="Cancel", command=cancel).pack()
+        progress_window.protocol("WM_DELETE_WINDOW", cancel)
+        
+        def show(update):
+            if progress_window.winfo_exists() and not cancel_token.cancelled:
+                status_label.config(text=str(update))
+                progress_bar['value'] = (update.fraction or 0) * 100
+        
+        def progress(update):
+            # Called on the worker thread; the widgets are updated on the Tk thread
+            self.executor.call_soon(show, update)
+        
+        return progress_window, progress, cancel_token
+    
+    def has_database_documents(self):
+        """True when the documents list holds database rows rather than records loaded from a workbook"""
+        return bool(self.current_portfolio_id and isinstance(self.documents_data, DocumentListModel)
+                    and len(self.documents_data))
+    
     def validate_mdr(self):
         """Validate MDR data before processing"""
         if not self.project_name_var.get().strip():
@@ -2125,29 +1724,24 @@ class MDRPlannerGUI:
         if not file_path:
             return
         
+        progress_window = None
         try:
             # Show loading progress
-            progress_window = tk.Toplevel(self.root)
-            progress_window.title("Loading MDR File")
-            progress_window.geometry("300x100")
-            progress_window.transient(self.root)
-            progress_window.grab_set()
-            
-            # Center the progress window
-            progress_window.update_idletasks()
-            x = (progress_window.winfo_screenwidth() // 2) - (300 // 2)
-            y = (progress_window.winfo_screenheight() // 2) - (100 // 2)
-            progress_window.geometry(f"300x100+{x}+{y}")
-            
-            progress_label = ttk.Label(progress_window, text="Loading MDR file...")
-            progress_label.pack(expand=True)
-            
-            progress_window.update()
+            progress_window, progress, cancel_token = self.show_progress_window(
+                "Loading MDR File", "Loading MDR file...")
             
             # Load the Excel file
-            loader = MDRExcelLoader(file_path)
-            mdr_project = loader.load_mdr_project()
+            loader = MDRExcelLoader(file_path, progress=progress, cancel_token=cancel_token)
+            self.executor.submit(lambda session: loader.load_mdr_project(),
+                                 lambda mdr_project: self.show_loaded_project(mdr_project, progress_window),
+                                 lambda error: self.show_load_error(error, progress_window))
             
+        except Exception as e:
+            self.show_load_error(e, progress_window)
+    
+    def show_loaded_project(self, mdr_project, progress_window):
+        """Put a project read by MDRExcelLoader into the GUI (Tk thread)"""
+        try:
             # Clear existing data
             self.clear_all_data()
             
@@ -2185,17 +1779,25 @@ class MDRPlannerGUI:
             )
             
         except Exception as e:
-            # Close progress window if still open
-            try:
-                progress_window.destroy()
-            except:
-                pass
-            
-            messagebox.showerror(
-                "Load Error", 
-                f"Failed to load MDR file:\n\n{str(e)}\n\n"
-                f"Please ensure the file was generated by this MDR planner."
-            )
+            self.show_load_error(e, progress_window)
+    
+    def show_load_error(self, error, progress_window):
+        """Close the progress window and report a failed or cancelled load"""
+        # Close progress window if still open
+        try:
+            progress_window.destroy()
+        except:
+            pass
+        
+        if isinstance(error, OperationCancelled):
+            # Nothing was loaded into the GUI
+            return
+        
+        messagebox.showerror(
+            "Load Error", 
+            f"Failed to load MDR file:\n\n{str(error)}\n\n"
+            f"Please ensure the file was generated by this MDR planner."
+        )
     
     def clear_all_data(self):
         """Clear all data from the GUI without confirmation"""
@@ -2210,8 +1812,9 @@ class MDRPlannerGUI:
         self.category_var.set(DocumentCategory.PROJECT_MGMT.value)
         self.status_var.set(DocumentStatus.NOT_STARTED.value)
         
-        # Clear documents data and treeview
-        self.documents_data.clear()
+        # Clear documents data and treeview (and stop auto-saving to the previous file)
+        self.auto_saver.track(None)
+        self.documents_data = []
         for item in self.documents_tree.get_children():
             self.documents_tree.delete(item)
         
@@ -2227,9 +1830,18 @@ class MDRPlannerGUI:
 
         # Get the index and document from database
         index = self.documents_tree.index(selected_item[0])
-        if 0 <= index < len(self.documents_data):
+        if isinstance(self.documents_data, DocumentListModel):
+            index += self.document_list_offset
+        if not 0 <= index < len(self.documents_data):
+            return
+        if isinstance(self.documents_data, DocumentListModel):
+            # Fresh detached snapshot for the editor; saving applies the form in a new unit of work
+            with self.sessions.snapshot() as session:
+                db_document = session.get(Document, self.documents_data.document_id(index, session),
+                                          options=[joinedload(Document.discipline)])
+        else:
             db_document = self.documents_data[index]
-            self.open_document_editor(db_document, index)
+        self.open_document_editor(db_document, index)
 
     def open_document_editor(self, db_document: Document, index: int):
         """Open comprehensive document editor window with all 8 stages"""
@@ -2355,47 +1967,53 @@ class MDRPlannerGUI:
     def save_document_changes(self, db_document, index, form_vars, editor_window):
         """Save changes to the database"""
         try:
-            # Update database document with form data
-            db_document.doc_number = form_vars['doc_number'].get()
-            db_document.doc_title = form_vars['doc_title'].get()
-            
-            # Update basic fields (note: database uses current_revision, not current_rev)
-            db_document.current_revision = form_vars['current_revision'].get()
-            db_document.current_status = form_vars['status'].get()  # Use status as current_status
-            db_document.current_transmittal_no = form_vars['current_transmittal_no'].get()
-            
-            # Update all stage fields dynamically
-            for stage in STANDARD_STAGES:
-                stage_code_lower = stage['code'].lower()
-                # Common fields for all stages
-                setattr(db_document, f'{stage_code_lower}_date_planned', form_vars[f'{stage_code_lower}_date_planned'].get())
-                setattr(db_document, f'{stage_code_lower}_date_actual', form_vars[f'{stage_code_lower}_date_actual'].get())
-                setattr(db_document, f'{stage_code_lower}_tr_no', form_vars[f'{stage_code_lower}_tr_no'].get())
-                setattr(db_document, f'{stage_code_lower}_date_sent', form_vars[f'{stage_code_lower}_date_sent'].get())
-                setattr(db_document, f'{stage_code_lower}_rev_status', form_vars[f'{stage_code_lower}_rev_status'].get())
-                setattr(db_document, f'{stage_code_lower}_issue_for', form_vars[f'{stage_code_lower}_issue_for'].get())
-                setattr(db_document, f'{stage_code_lower}_date_received', form_vars[f'{stage_code_lower}_date_received'].get())
-                setattr(db_document, f'{stage_code_lower}_tr_received', form_vars[f'{stage_code_lower}_tr_received'].get())
+            with self.sessions.unit_of_work() as session:
+                if isinstance(db_document, Document):
+                    # Apply the form to the current row; the editor only held a detached snapshot
+                    db_document = session.get(Document, db_document.id, options=[joinedload(Document.discipline)])
+                    if db_document is None:
+                        raise ValueError("The document no longer exists in the database")
                 
-                # Next Rev (if applicable)
-                if stage['has_next_rev']:
-                    setattr(db_document, f'{stage_code_lower}_next_rev', form_vars[f'{stage_code_lower}_next_rev'].get())
-            
-            # Remarks
-            db_document.remarks = form_vars['remarks_text'].get("1.0", "end-1c")
+                # Update database document with form data
+                db_document.doc_number = form_vars['doc_number'].get()
+                db_document.doc_title = form_vars['doc_title'].get()
+                
+                # Update basic fields (note: database uses current_revision, not current_rev)
+                db_document.current_revision = form_vars['current_revision'].get()
+                db_document.current_status = form_vars['status'].get()  # Use status as current_status
+                db_document.current_transmittal_no = form_vars['current_transmittal_no'].get()
+                
+                # Update all stage fields dynamically
+                for stage in STANDARD_STAGES:
+                    stage_code_lower = stage['code'].lower()
+                    # Common fields for all stages
+                    setattr(db_document, f'{stage_code_lower}_date_planned', form_vars[f'{stage_code_lower}_date_planned'].get())
+                    setattr(db_document, f'{stage_code_lower}_date_actual', form_vars[f'{stage_code_lower}_date_actual'].get())
+                    setattr(db_document, f'{stage_code_lower}_tr_no', form_vars[f'{stage_code_lower}_tr_no'].get())
+                    setattr(db_document, f'{stage_code_lower}_date_sent', form_vars[f'{stage_code_lower}_date_sent'].get())
+                    setattr(db_document, f'{stage_code_lower}_rev_status', form_vars[f'{stage_code_lower}_rev_status'].get())
+                    setattr(db_document, f'{stage_code_lower}_issue_for', form_vars[f'{stage_code_lower}_issue_for'].get())
+                    setattr(db_document, f'{stage_code_lower}_date_received', form_vars[f'{stage_code_lower}_date_received'].get())
+                    setattr(db_document, f'{stage_code_lower}_tr_received', form_vars[f'{stage_code_lower}_tr_received'].get())
+                    
+                    # Next Rev (if applicable)
+                    if stage['has_next_rev']:
+                        setattr(db_document, f'{stage_code_lower}_next_rev', form_vars[f'{stage_code_lower}_next_rev'].get())
+                
+                # Remarks
+                db_document.remarks = form_vars['remarks_text'].get("1.0", "end-1c")
             
-            # Commit changes to database
-            db.session.commit()
+            # Changes are committed when the unit of work ends
             print(f"[OK] Updated document in database: {db_document.doc_number}")
             
-            # Refresh the documents list from database
-            self.refresh_documents_list()
+            # Show the new values in place; the list is re-sorted on the next refresh
+            self.update_document_row(db_document)
+            self.auto_save()
             
             editor_window.destroy()
             messagebox.showinfo("Success", f"Document '{db_document.doc_number}' updated successfully in database!")
             
         except Exception as e:
-            db.session.rollback()
             print(f"[ERROR] Failed to update document: {str(e)}")
             messagebox.showerror("Error", f"Failed to save document changes to database:\n{str(e)}")
 
@@ -2486,59 +2104,179 @@ class MDRPlannerGUI:
         self.category_combo['values'] = all_categories
 
     def auto_save(self):
-        """Auto-save the current MDR to the last used file path"""
-        if hasattr(self, 'current_file_path') and self.current_file_path:
-            try:
-                mdr_project = self.create_mdr_project()
-                generator = MDRExcelGenerator(mdr_project)
-                generator.generate(self.current_file_path)
-                # Silent save - no user notification
-            except Exception as e:
-                # Log error but don't interrupt user workflow
-                print(f"Auto-save failed: {e}")
-
+        """Auto-save the current MDR to the last used file path (debounced, in the background)"""
+        self.auto_saver.schedule()
+    
+    def auto_save_snapshot(self):
+        """Content to auto-save as (fingerprint(session), write(path, session)); None when empty"""
+        if self.has_database_documents():
+            # The portfolio version changes with every committed document change
+            portfolio_id = self.current_portfolio_id
+            
+            def fingerprint(session):
+                return f"portfolio {portfolio_id} v{get_portfolio_version(portfolio_id, session)}"
+            
+            def write(path, session):
+                MDRExcelExporter(session.get(Portfolio, portfolio_id)).export(path)
+        elif self.documents_data:
+            mdr_project = self.create_mdr_project()
+            
+            def fingerprint(session):
+                return repr(mdr_project)
+            
+            def write(path, session):
+                MDRExcelGenerator(mdr_project).generate(path)
+        else:
+            return None
+        return fingerprint, write
+    
     def refresh_documents_list(self):
-        """Reload documents list from database"""
+        """Reload the documents list window from the database (queried on a worker thread)"""
         if not self.current_portfolio_id:
             return
         
-        try:
-            # Clear treeview
-            for item in self.documents_tree.get_children():
-                self.documents_tree.delete(item)
-            
-            # Load documents from database and store them
-            self.documents_data = db.session.query(Document).filter_by(
-                portfolio_id=self.current_portfolio_id
-            ).order_by(Document.discipline_id, Document.doc_number).all()
-            
-            # Populate treeview
-            for doc in self.documents_data:
-                discipline_name = doc.discipline.name if doc.discipline else "Uncategorized"
-                self.documents_tree.insert("", tk.END, values=(
-                    discipline_name,
-                    doc.doc_number or "",
-                    doc.doc_title or "",
-                    doc.current_status or "Not Started"
-                ))
-            
-            # Update count
-            self.update_documents_count_from_db()
+        portfolio_id = self.current_portfolio_id
+        offset, limit = self.document_list_offset, self.visible_row_count()
+        self._refresh_generation += 1
+        generation = self._refresh_generation
+        
+        def show(model):
+            if generation != self._refresh_generation:
+                return  # A newer refresh is on its way
+            self.documents_data = model
+            self.render_documents_window()
+            self.update_documents_count_from_db(len(model))
+            print(f"[OK] {len(model)} documents in database")
+        
+        def failed(error):
+            print(f"[ERROR] Failed to refresh documents: {str(error)}")
+            messagebox.showerror("Error", f"Failed to load documents from database:\n{str(error)}")
+        
+        self.executor.submit(lambda session: DocumentListModel.load(session, portfolio_id, offset, limit),
+                             show, failed)
+    
+    def poll_changes(self):
+        """Patch documents changed in the database since the list was loaded (every CHANGE_POLL_MS)"""
+        self.root.after(CHANGE_POLL_MS, self.poll_changes)
+        model = self.documents_data
+        if self._polling_changes or not isinstance(model, DocumentListModel):
+            return
+        
+        portfolio_id, since = model.portfolio_id, model.version
+        
+        def load(session):
+            # One indexed lookup while nothing changed
+            version = get_portfolio_version(portfolio_id, session)
+            if version == since:
+                return None
+            total = DocumentListModel.count(session, portfolio_id)
+            return version, total, documents_changed_since(portfolio_id, since, session)
+        
+        def show(result):
+            self._polling_changes = False
+            if result is None or self.documents_data is not model:
+                return
+            version, total, changes = result
             
-            print(f"[OK] Loaded {len(self.documents_data)} documents from database")
+            patched = model.patch(changes) if changes and total == len(model) else None
+            if patched is None:
+                # Documents added, deleted or moved, or a discipline renamed: reload the visible window
+                self.refresh_documents_list()
+                return
             
-        except Exception as e:
-            print(f"[ERROR] Failed to refresh documents: {str(e)}")
-            messagebox.showerror("Error", f"Failed to load documents from database:\n{str(e)}")
+            model.version = version
+            for doc_id, values in patched:
+                if self.documents_tree.exists(str(doc_id)):
+                    self.documents_tree.item(str(doc_id), values=values)
+            print(f"[OK] {len(patched)} documents updated from database (v{version})")
+        
+        def failed(error):
+            self._polling_changes = False
+            print(f"[ERROR] Failed to check for database changes: {error}")
+        
+        self._polling_changes = True
+        self.executor.submit(load, show, failed)
+    
+    def visible_row_count(self):
+        """Number of rows that fit in the documents tree at its current size"""
+        height = self.documents_tree.winfo_height()
+        if height <= 1:
+            return int(self.documents_tree.cget('height'))  # Not drawn yet
+        row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
+        return max(1, height // row_height - 1)  # Less the heading row
+    
+    def render_documents_window(self, offset=None):
+        """Show the database rows starting at offset (clamped to the list) in the tree"""
+        model = self.documents_data
+        if not isinstance(model, DocumentListModel):
+            return
+        
+        visible = self.visible_row_count()
+        offset = self.document_list_offset if offset is None else offset
+        offset = max(0, min(offset, len(model) - visible))
+        self.document_list_offset = offset
+        
+        with self.sessions.snapshot() as session:
+            rows = model.rows(offset, visible, session)
+        selected = self.documents_tree.selection()
+        self.documents_tree.delete(*self.documents_tree.get_children())
+        for doc_id, values in rows:
+            self.documents_tree.insert("", tk.END, iid=str(doc_id), values=values)
+        
+        # Keep the selection while it is on screen
+        selected = [iid for iid in selected if self.documents_tree.exists(iid)]
+        if selected:
+            self.documents_tree.selection_set(selected)
+        
+        if len(model):
+            self.documents_scrollbar.set(offset / len(model), (offset + len(rows)) / len(model))
+        else:
+            self.documents_scrollbar.set(0, 1)
+    
+    def scroll_documents(self, *args):
+        """Vertical scrollbar command: move the database window, or scroll an in-memory list"""
+        if not isinstance(self.documents_data, DocumentListModel):
+            self.documents_tree.yview(*args)
+            return
+        
+        if args[0] == 'moveto':
+            offset = int(float(args[1]) * len(self.documents_data))
+        else:
+            # ('scroll', count, 'units' | 'pages')
+            step = self.visible_row_count() if args[2] == 'pages' else 1
+            offset = self.document_list_offset + int(args[1]) * step
+        self.render_documents_window(offset)
+    
+    def documents_tree_scrolled(self, first, last):
+        """Tree yscrollcommand; database windows set the scrollbar themselves"""
+        if not isinstance(self.documents_data, DocumentListModel):
+            self.documents_scrollbar.set(first, last)
     
-    def update_documents_count_from_db(self):
+    def on_documents_mousewheel(self, event):
+        """Scroll the database window by three rows per wheel step"""
+        if not isinstance(self.documents_data, DocumentListModel):
+            return None  # Default Treeview scrolling
+        step = -3 if event.num == 4 or event.delta > 0 else 3
+        self.render_documents_window(self.document_list_offset + step)
+        return "break"
+    
+    def update_document_row(self, db_document):
+        """Show an edited document's values in its existing row, without reloading the list"""
+        if not isinstance(self.documents_data, DocumentListModel):
+            self.refresh_documents_list()
+            return
+        values = self.documents_data.update(db_document)
+        iid = str(db_document.id)
+        if values and self.documents_tree.exists(iid):
+            self.documents_tree.item(iid, values=values)
+    
+    def update_documents_count_from_db(self, count=None):
         """Update the documents list frame title with database count"""
         if not self.current_portfolio_id:
             count = 0
-        else:
-            count = db.session.query(Document).filter_by(
-                portfolio_id=self.current_portfolio_id
-            ).count()
+        elif count is None:
+            with self.sessions.snapshot() as session:
+                count = DocumentListModel.count(session, self.current_portfolio_id)
         
         self.list_frame.config(text=f"📄 Documents List ({count} documents from database)")
     
@@ -2549,7 +2287,10 @@ class MDRPlannerGUI:
 
     def run(self):
         """Start the GUI application"""
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            self.executor.shutdown()
 
 
 def main():
@@ -66,6 +66,56 @@ FEEDBACK_COLUMNS_BASE = [
     {'name': 'Transmittal Received', 'width': 18}  # NEW: Track transmittal number for client feedback
 ]
 
+# Document model field suffixes for each stage, in MDR column order
+# (e.g. 'ifr_date_planned', 'ifr_date_actual', ...)
+STAGE_FIELDS = [
+    'date_planned',
+    'date_actual',
+    'tr_no',
+    'date_sent',
+    'rev_status',
+    'issue_for',
+    'date_received',
+    'tr_received',
+    'next_rev'
+]
+
+# Stage fields that hold dates
+STAGE_DATE_FIELDS = ['date_planned', 'date_actual', 'date_sent', 'date_received']
+
+# Progress measurement: cumulative % complete a document earns when a stage is issued
+# (see shared/measurement.py; stages left out earn nothing beyond the stage before)
+STAGE_PROGRESS_WEIGHTS = {
+    'IFR': 10,
+    'IFH': 15,
+    'IFD': 30,
+    'IFT': 40,
+    'IFP': 50,
+    'IFA': 70,
+    'IFC': 90,
+    'AFC': 100
+}
+
+# Back-scheduling: working days from a stage's planned issue to the next scheduled
+# stage's (see shared/scheduling.py); AFC is the target date itself
+STAGE_DURATIONS = {
+    'IFR': 10,
+    'IFH': 10,
+    'IFD': 15,
+    'IFT': 10,
+    'IFP': 10,
+    'IFA': 15,
+    'IFC': 10
+}
+
+
+def get_stage_fields(has_next_rev=True):
+    """Get stage field suffixes, optionally including next_rev."""
+    if has_next_rev:
+        return list(STAGE_FIELDS)
+    return [f for f in STAGE_FIELDS if f != 'next_rev']
+
+
 def get_feedback_columns(has_next_rev=True):
     """Get feedback columns, optionally including Next Rev."""
     columns = FEEDBACK_COLUMNS_BASE.copy()
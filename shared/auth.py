@@ -63,6 +63,15 @@ def get_user_portfolios(user):
     return Portfolio.query.filter(Portfolio.id.in_(portfolio_ids)).all()
 
 
+def get_user_portfolio_ids(user):
+    """Ids of the portfolios a user can access, or None for all of them (admins and schedulers)"""
+    if not user:
+        return set()
+    if user.role in ['admin', 'scheduler']:
+        return None
+    return {membership.discipline.portfolio_id for membership in user.team_memberships}
+
+
 def user_can_access_portfolio(user, portfolio_id):
     """Check if user can access a specific portfolio"""
     if not user:
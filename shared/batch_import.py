@@ -0,0 +1,145 @@
+"""
+Batch import of MDR workbooks
+Parses workbooks in parallel worker processes and funnels the rows to a single bulk writer
+"""
+
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from sqlalchemy import insert
+
+from shared.models import db, Portfolio, Discipline, Document, bump_portfolio_version, refresh_stage_dates
+from shared.excel_handler import parse_mdr_workbook
+from shared.status import derived_fields
+from shared.summary import refresh_summaries
+
+
+def collect_workbooks(sources):
+    """Expand directories and glob patterns into a sorted list of .xlsx files"""
+    files = set()
+    for source in sources:
+        if os.path.isdir(source):
+            files.update(glob.glob(os.path.join(source, '*.xlsx')))
+        else:
+            files.update(glob.glob(source))
+    
+    # Skip Excel lock files (~$name.xlsx) left behind by open workbooks
+    return sorted(f for f in files if f.endswith('.xlsx') and not os.path.basename(f).startswith('~$'))
+
+
+class BatchImporter:
+    """Import many MDR workbooks: parallel parsing, one database writer"""
+    
+    def __init__(self, workers=None, progress=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.progress = progress or (lambda message: None)
+        self.results = []
+    
+    def run(self, files):
+        """Parse files in worker processes and write each one as it arrives"""
+        started = time.perf_counter()
+        self.results = []
+        total = len(files)
+        
+        with ProcessPoolExecutor(max_workers=min(self.workers, max(total, 1))) as pool:
+            futures = {pool.submit(parse_mdr_workbook, path): path for path in files}
+            
+            for done, future in enumerate(as_completed(futures), 1):
+                path = futures[future]
+                result = {
+                    'file': path,
+                    'status': 'failed',
+                    'portfolio_id': None,
+                    'documents': 0,
+                    'parse_seconds': None,
+                    'write_seconds': None,
+                    'error': None
+                }
+                
+                try:
+                    parsed = future.result()
+                    result['parse_seconds'] = parsed['parse_seconds']
+                    result.update(self._write(parsed))
+                    result['status'] = 'imported'
+                except Exception as e:
+                    db.session.rollback()
+                    result['error'] = str(e)
+                
+                self.results.append(result)
+                self._report(done, total, result)
+        
+        return {
+            'files': total,
+            'imported': sum(1 for r in self.results if r['status'] == 'imported'),
+            'failed': sum(1 for r in self.results if r['status'] == 'failed'),
+            'documents': sum(r['documents'] for r in self.results),
+            'workers': self.workers,
+            'elapsed': round(time.perf_counter() - started, 3),
+            'results': self.results
+        }
+    
+    def _write(self, parsed):
+        """Write one parsed workbook as a new portfolio in a single transaction"""
+        started = time.perf_counter()
+        file_stem = os.path.splitext(os.path.basename(parsed['file']))[0]
+        code = parsed['project_code'] or file_stem
+        
+        if Portfolio.query.filter_by(code=code).first():
+            raise ValueError(f"Portfolio code '{code}' already exists")
+        
+        portfolio = Portfolio(
+            code=code,
+            name=parsed['project_name'] or file_stem,
+            client=parsed['client'] or None
+        )
+        db.session.add(portfolio)
+        db.session.flush()
+        
+        disciplines = {}
+        rows = []
+        for section in parsed['sections']:
+            discipline_id = None
+            name = section['discipline']
+            if name:
+                if name not in disciplines:
+                    discipline = Discipline(portfolio_id=portfolio.id, name=name)
+                    db.session.add(discipline)
+                    db.session.flush()
+                    disciplines[name] = discipline.id
+                discipline_id = disciplines[name]
+            
+            for fields in section['documents']:
+                rows.append(dict(fields, portfolio_id=portfolio.id, discipline_id=discipline_id))
+        
+        # One executemany for all documents instead of one INSERT per ORM object
+        if rows:
+            version = bump_portfolio_version(db.session, portfolio.id)
+            for row in rows:
+                row['change_version'] = version
+                row.update(derived_fields(row.get))
+            ids = db.session.execute(insert(Document).returning(Document.id, sort_by_parameter_order=True),
+                                     rows).scalars()
+            for row, document_id in zip(rows, ids):
+                row['id'] = document_id
+        # The bulk INSERT bypassed the flush hooks that parse stage dates and update the summaries
+        connection = db.session.connection()
+        refresh_stage_dates(connection, rows)
+        refresh_summaries(connection, portfolio.id)
+        db.session.commit()
+        
+        return {
+            'portfolio_id': portfolio.id,
+            'documents': len(rows),
+            'write_seconds': round(time.perf_counter() - started, 3)
+        }
+    
+    def _report(self, done, total, result):
+        """Send a one-line progress message for a finished file"""
+        name = os.path.basename(result['file'])
+        if result['status'] == 'imported':
+            self.progress(f"[{done}/{total}] {name}: {result['documents']} documents "
+                          f"(parse {result['parse_seconds']}s, write {result['write_seconds']}s)")
+        else:
+            self.progress(f"[{done}/{total}] {name}: FAILED - {result['error']}")
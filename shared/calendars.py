@@ -0,0 +1,154 @@
+"""
+Working-day calendars
+Business-day arithmetic that respects a portfolio's working week and holidays.
+Calendars are stored in work_calendars/calendar_holidays and compiled into
+numpy busdaycalendar objects, cached per process until the calendar's version
+changes (or its id is reused by a new calendar), so whole arrays of dates are offset or counted in one call.
+"""
+
+import threading
+
+import numpy as np
+from sqlalchemy import select
+
+from shared.models import db, Portfolio, WorkCalendar, CalendarHoliday
+from shared.dates import parse_date
+
+# Monday to Friday
+DEFAULT_WEEKMASK = '1111100'
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+# Business-day numbers count from here (see BusinessCalendar.day_numbers)
+_ANCHOR = np.datetime64('2000-01-03', 'D')  # a Monday
+
+_compiled = {}  # calendar id -> (key, BusinessCalendar)
+_compiled_lock = threading.Lock()
+
+
+class BusinessCalendar:
+    """
+    A compiled working-day calendar
+    
+    Methods take dates, datetime64[D] values or arrays of either and work on
+    whole arrays at once. key identifies the stored calendar version it was
+    compiled from: (id, version, created_at), as SQLite reuses the id of a
+    deleted calendar (None for ad-hoc calendars).
+    """
+    
+    def __init__(self, weekmask=DEFAULT_WEEKMASK, holidays=(), name='Monday to Friday', key=None):
+        try:
+            self.busdaycal = np.busdaycalendar(weekmask=weekmask, holidays=np.array(list(holidays), dtype='datetime64[D]'))
+        except ValueError as e:
+            raise ValueError(f"Invalid working-day calendar: {e}") from None
+        self.name = name
+        self.key = key
+    
+    def __repr__(self):
+        return f'<BusinessCalendar {self.name} {self.weekmask} holidays={len(self.holidays)}>'
+    
+    @property
+    def weekmask(self):
+        return ''.join('1' if working else '0' for working in self.busdaycal.weekmask)
+    
+    @property
+    def holidays(self):
+        """Sorted holidays on working weekdays, datetime64[D]"""
+        return self.busdaycal.holidays
+    
+    def with_holidays(self, days):
+        """Copy of this calendar with extra holidays"""
+        return BusinessCalendar(self.weekmask, list(self.holidays) + list(days), self.name)
+    
+    def offset(self, dates, days, roll='preceding'):
+        """Dates moved by days working days; non-working dates are rolled first ('preceding'/'forward')"""
+        return np.busday_offset(dates, days, roll=roll, busdaycal=self.busdaycal)
+    
+    def count(self, start, end):
+        """Working days from start (included) to end (excluded); negative when end is earlier"""
+        return np.busday_count(start, end, busdaycal=self.busdaycal)
+    
+    def is_workday(self, dates):
+        return np.is_busday(dates, busdaycal=self.busdaycal)
+    
+    def day_numbers(self, dates):
+        """
+        Consecutive numbers of working days (int64) for dates
+        
+        A non-working date gets the number of the working day after it. Adding
+        n to a day number moves n working days; to_dates converts back.
+        """
+        return self.count(_ANCHOR, dates)
+    
+    def to_dates(self, numbers):
+        """datetime64[D] working days of day numbers"""
+        return self.offset(_ANCHOR, numbers, roll='forward')
+
+
+DEFAULT_CALENDAR = BusinessCalendar()
+
+
+def load_calendar(calendar_id, session=None):
+    """BusinessCalendar of a stored calendar (DEFAULT_CALENDAR for None or a missing one)"""
+    if calendar_id is None:
+        return DEFAULT_CALENDAR
+    session = session or db.session
+    row = session.execute(
+        select(WorkCalendar.name, WorkCalendar.weekmask, WorkCalendar.version, WorkCalendar.created_at)
+        .where(WorkCalendar.id == calendar_id)
+    ).one_or_none()
+    if row is None:
+        return DEFAULT_CALENDAR
+    key = (calendar_id, row.version, row.created_at)
+    with _compiled_lock:
+        cached = _compiled.get(calendar_id)
+    if cached and cached[0] == key:
+        return cached[1]
+    
+    days = session.execute(select(CalendarHoliday.day).where(CalendarHoliday.calendar_id == calendar_id)).scalars()
+    calendar = BusinessCalendar(row.weekmask, list(days), row.name, key=key)
+    with _compiled_lock:
+        _compiled[calendar_id] = (key, calendar)
+    return calendar
+
+
+def portfolio_calendar(portfolio_id, session=None):
+    """BusinessCalendar assigned to a portfolio"""
+    session = session or db.session
+    calendar_id = session.execute(select(Portfolio.calendar_id).where(Portfolio.id == portfolio_id)).scalar()
+    return load_calendar(calendar_id, session)
+
+
+def parse_holidays(text):
+    """
+    [(date, name)] from lines 'YYYY-MM-DD Optional name' (any stage date format)
+    
+    Raises ValueError naming the first line that does not start with a date.
+    """
+    holidays = {}
+    for line in (text or '').splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        day_text, _, name = line.partition(' ')
+        try:
+            day = parse_date(day_text)
+        except ValueError:
+            raise ValueError(f"Invalid holiday line {line!r}, expected 'YYYY-MM-DD Name'") from None
+        holidays[day] = name.strip() or None
+    return sorted(holidays.items())
+
+
+def save_calendar(session, name, weekmask, holidays, calendar=None):
+    """
+    Create a calendar, or update one, replacing its holidays with [(date, name)]
+    
+    Validates the weekmask first (ValueError); the caller commits.
+    """
+    BusinessCalendar(weekmask, [day for day, _ in holidays])
+    if calendar is None:
+        calendar = WorkCalendar()
+        session.add(calendar)
+    calendar.name = name
+    calendar.weekmask = weekmask
+    calendar.holidays = [CalendarHoliday(day=day, name=holiday_name) for day, holiday_name in holidays]
+    return calendar
@@ -3,6 +3,8 @@ Database initialization and utility functions
 """
 
 import os
+from contextlib import contextmanager
+from sqlalchemy.orm import sessionmaker
 from shared.models import db, User, Portfolio, Discipline, TeamMembership, Document, Submission
 
 
@@ -13,6 +15,7 @@ def init_db(app):
     with app.app_context():
         # Create all tables
         db.create_all()
+        upgrade_schema(db.engine)
         print("[OK] Database tables created")
         
         # Create default admin user if none exists
@@ -31,6 +34,44 @@ def init_db(app):
         return db
 
 
+def upgrade_schema(engine):
+    """
+    Add columns and indexes introduced after a database was created, and the search index
+    
+    create_all() only creates missing tables. New columns must be nullable or
+    have a server default so existing rows stay valid.
+    """
+    from sqlalchemy import inspect, text
+    
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    quote = engine.dialect.identifier_preparer.quote
+    
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                ddl = f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} " \
+                      f"{column.type.compile(dialect=engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                connection.execute(text(ddl))
+                print(f"[OK] Added column {table.name}.{column.name}")
+            
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+    
+    # Full-text search index (FTS5 table or GIN index, see shared.search)
+    from shared.search import install_search
+    install_search(engine)
+
+
 def get_db_uri(db_name='mdr_system.db'):
     """
     Get database URI - supports both SQLite (development) and PostgreSQL (production)
@@ -77,12 +118,65 @@ def init_db_standalone():
     
     # Create all tables
     db.metadata.create_all(engine)
+    upgrade_schema(engine)
     
     print(f"[OK] Database connected: {db_uri}")
     
     return db
 
 
+class SessionManager:
+    """
+    Short-lived sessions for long-running clients such as the desktop planner
+    
+    Every operation gets its own session, so the objects it loads are released
+    when it ends instead of piling up in one identity map for the lifetime of
+    the process. Objects keep their loaded attributes after the session is
+    closed (expire_on_commit=False) and can be shown as read-only snapshots.
+    """
+    
+    def __init__(self, engine):
+        self.engine = engine
+        self.factory = sessionmaker(bind=engine, expire_on_commit=False)
+    
+    @contextmanager
+    def unit_of_work(self):
+        """Session committed when the block succeeds, rolled back when it raises; closed either way"""
+        session = self.factory()
+        try:
+            yield session
+            session.commit()
+        except BaseException:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    
+    @contextmanager
+    def snapshot(self):
+        """Session for reading only: nothing is flushed and the transaction is discarded at the end"""
+        session = self.factory(autoflush=False)
+        try:
+            yield session
+        finally:
+            session.close()
+
+
+def init_db_headless():
+    """Initialize database for command-line tools and batch jobs (no web server, no display)"""
+    from flask import Flask
+    
+    app = Flask('mdr_headless')
+    app.config['SQLALCHEMY_DATABASE_URI'] = get_db_uri()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    init_db(app)
+    
+    # Keep an application context open so Model.query works like in the web apps
+    app.app_context().push()
+    
+    return app
+
+
 def seed_demo_data():
     """Seed database with demo data for testing"""
     # Check if demo data already exists
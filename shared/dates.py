@@ -0,0 +1,120 @@
+"""
+Date parsing helpers for MDR stage dates
+Stage dates are stored as free-form strings, so every reader goes through here
+"""
+
+from datetime import datetime, date, timedelta
+from functools import lru_cache
+
+from mdr_stages_config import STANDARD_STAGES
+
+
+# Formats seen in client MDRs and produced by the apps themselves
+DATE_FORMATS = [
+    '%Y-%m-%d',
+    '%d-%m-%Y',
+    '%d/%m/%Y',
+    '%d.%m.%Y',
+    '%d-%b-%Y',
+    '%d %b %Y',
+    '%d-%b-%y',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y/%m/%d',
+]
+
+# Excel's day zero; serial dates that lost their cell format arrive as numbers
+EXCEL_EPOCH = date(1899, 12, 30)
+EXCEL_SERIAL_RANGE = (20000, 80000)  # 1954-2119
+
+# Stage date fields with a typed copy in the stage_dates table
+PARSED_STAGE_FIELDS = ('date_planned', 'date_actual')
+
+
+def parse_date(value):
+    """
+    Parse a stage date value into a date
+
+    Accepts date/datetime objects (openpyxl cells) and strings in any of
+    DATE_FORMATS. Returns None for empty values and raises ValueError for
+    anything that cannot be interpreted as a date.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+
+    text = str(value).strip()
+    if not text:
+        return None
+
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+
+    raise ValueError(f"Unrecognised date: {text!r}")
+
+
+@lru_cache(maxsize=16384)
+def normalize_date(text):
+    """
+    Tolerant, cached parse of a stored stage date string
+    
+    Besides DATE_FORMATS this accepts a trailing time ('2024-01-15T08:00',
+    '15-01-2024 00:00') and Excel serial numbers ('45306', '45306.0').
+    Returns None instead of raising for anything that is not a date. Stage
+    dates repeat heavily across a portfolio, so each distinct string is only
+    parsed once.
+    """
+    text = (text or '').strip()
+    if not text:
+        return None
+    try:
+        return parse_date(text)
+    except ValueError:
+        pass
+    
+    head = text.replace('T', ' ').split(' ')[0]
+    if head != text:
+        try:
+            return parse_date(head)
+        except ValueError:
+            pass
+    
+    try:
+        serial = float(text)
+    except ValueError:
+        return None
+    if EXCEL_SERIAL_RANGE[0] <= serial < EXCEL_SERIAL_RANGE[1]:
+        return EXCEL_EPOCH + timedelta(days=int(serial))
+    return None
+
+
+def _as_date(value):
+    if value is None or isinstance(value, date):
+        return parse_date(value)
+    return normalize_date(str(value))
+
+
+def stage_date_values(get):
+    """
+    Parsed planned/actual dates of one document, one dict per stage that has either
+    
+    get(field_name) returns a stored field value (a Document's getattr or a row
+    dict's get). 'done' is set when an actual date was entered at all, even one
+    that could not be parsed, so such stages never count as overdue.
+    """
+    values = []
+    for stage in STANDARD_STAGES:
+        code = stage['code']
+        planned_text = get(f"{code.lower()}_date_planned")
+        actual_text = get(f"{code.lower()}_date_actual")
+        planned = _as_date(planned_text)
+        actual = _as_date(actual_text)
+        done = bool(actual or str(actual_text or '').strip())
+        if planned or done:
+            values.append({'stage': code, 'planned': planned, 'actual': actual, 'done': done})
+    return values
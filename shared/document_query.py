@@ -0,0 +1,100 @@
+"""
+Paginated document queries for list views and APIs
+Filtering happens in the database and pages are fetched by keyset on
+(doc_number, id), so the tenth page costs the same as the first. Text filters
+go through the full-text index of shared.search.
+"""
+
+import base64
+import json
+
+from sqlalchemy import tuple_, func
+from sqlalchemy.orm import load_only, joinedload
+
+from shared.models import db, Document, Discipline
+from shared.search import search_condition
+from shared.status import STATUS_DRAFT, STATUS_SUBMITTED, STATUS_CLIENT_REVIEW, STATUS_APPROVED, STATUS_AFC
+from mdr_stages_config import STANDARD_STAGES
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Status filter values -> normalized status codes (Document.status_code)
+STATUS_FILTERS = {
+    'draft': (STATUS_DRAFT,),
+    'submitted': (STATUS_SUBMITTED,),
+    'review': (STATUS_CLIENT_REVIEW,),
+    'approved': (STATUS_APPROVED, STATUS_AFC),
+}
+
+# Stage codes a document's feedback stage can take, in stage order
+FEEDBACK_STAGES = [stage['code'] for stage in STANDARD_STAGES]
+
+# Columns the list views need; the stage fields are not loaded
+LIST_COLUMNS = [
+    Document.id, Document.portfolio_id, Document.discipline_id, Document.doc_number, Document.doc_title,
+    Document.current_status, Document.current_revision, Document.feedback_stage,
+]
+
+
+def encode_cursor(document):
+    """Opaque cursor for the page after document"""
+    raw = json.dumps([document.doc_number, document.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """(doc_number, id) from a cursor; raises ValueError when it is malformed"""
+    try:
+        doc_number, document_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from None
+    if not isinstance(doc_number, str) or not isinstance(document_id, int):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return doc_number, document_id
+
+
+def query_documents(portfolio_id, discipline_ids, status=None, discipline_id=None, stage=None, text=None,
+                    after=None, limit=DEFAULT_PAGE_SIZE, with_total=False):
+    """
+    One page of a portfolio's documents in the given disciplines, ordered by doc number
+    
+    status is one of STATUS_FILTERS, stage a stage code (the document's feedback
+    stage: the latest stage with a client reply), text words to find as the
+    document search does (word prefixes of the doc number, title, remarks or
+    transmittal numbers), after a cursor from a previous page. Returns
+    (documents, next cursor or None, total or None); the total of all matching
+    documents is only counted when with_total is set.
+    Raises ValueError for unknown filter values or a malformed cursor.
+    """
+    if status and status not in STATUS_FILTERS:
+        raise ValueError(f"Unknown status filter: {status!r}")
+    if stage:
+        stage = stage.upper()
+        if stage not in FEEDBACK_STAGES:
+            raise ValueError(f"Unknown stage: {stage!r}")
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    
+    conditions = [Document.portfolio_id == portfolio_id, Document.discipline_id.in_(discipline_ids)]
+    if discipline_id:
+        conditions.append(Document.discipline_id == discipline_id)
+    if status:
+        conditions.append(Document.status_code.in_(STATUS_FILTERS[status]))
+    if stage:
+        conditions.append(Document.feedback_stage == stage)
+    if text and text.strip():
+        conditions.append(search_condition(text.strip()))
+    
+    total = None
+    if with_total:
+        total = db.session.query(func.count(Document.id)).filter(*conditions).scalar()
+    
+    query = Document.query.options(load_only(*LIST_COLUMNS),
+                                   joinedload(Document.discipline).load_only(Discipline.name))
+    if after:
+        query = query.filter(tuple_(Document.doc_number, Document.id) > decode_cursor(after))
+    
+    # One extra row tells whether there is a next page
+    documents = query.filter(*conditions).order_by(Document.doc_number, Document.id).limit(limit + 1).all()
+    next_cursor = encode_cursor(documents[limit - 1]) if len(documents) > limit else None
+    return documents[:limit], next_cursor, total
@@ -5,47 +5,71 @@ Uses the same format as mdr_planner.py for consistency
 """
 
 import openpyxl
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
-from openpyxl.cell.cell import MergedCell
 from datetime import datetime
+from sqlalchemy.orm import object_session
+import csv
+import io
 import os
 import sys
+import time
 
 # Import the stage configuration
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from mdr_stages_config import STANDARD_STAGES, SUBMISSION_COLUMNS, get_feedback_columns, get_column_positions
+from mdr_stages_config import STANDARD_STAGES, STAGE_DATE_FIELDS, get_column_positions, get_stage_fields
 
 from shared.models import Document, Discipline, Portfolio
+from shared.dates import parse_date
+from shared.mdr_renderer import MDRRenderer, Section, document_row
+from shared.progress import ProgressTracker, OperationCancelled
+from shared.measurement import portfolio_progress, write_progress_sheet
+
+
+def _stage_fields_from_row(row_data, col_pos):
+    """Map a row of cell values to the stage and remarks fields of a Document"""
+    fields = {}
+    for stage in STANDARD_STAGES:
+        stage_code_lower = stage['code'].lower()
+        stage_col = col_pos[f"{stage_code_lower}_start"] - 1  # Convert to 0-indexed
+        
+        for i, field_name in enumerate(get_stage_fields(stage['has_next_rev'])):
+            fields[f"{stage_code_lower}_{field_name}"] = row_data[stage_col + i] if len(row_data) > stage_col + i else ""
+    
+    # Remarks
+    remarks_col = col_pos['remarks'] - 1  # Convert to 0-indexed
+    fields['remarks'] = row_data[remarks_col] if len(row_data) > remarks_col else ""
+    return fields
+
+
+def _is_section_values(row_data):
+    """Check if row values form a discipline header (a name in column A and nothing else)
+    
+    Read-only worksheets carry no merge information, so streaming readers
+    recognise the merged green row by its values instead.
+    """
+    return isinstance(row_data[0], str) and not any(row_data[1:])
+
+
+def _cell_text(value):
+    """Normalise a cell value to the string stored in the Document model"""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    return str(value).strip()
 
 
 class MDRExcelExporter:
     """Export MDR data to Excel with full 8-stage formatting"""
     
-    def __init__(self, portfolio):
+    def __init__(self, portfolio, progress=None, cancel_token=None):
         self.portfolio = portfolio
-        self.workbook = openpyxl.Workbook()
-        self.worksheet = self.workbook.active
-        self.worksheet.title = "Master Document Register"
-        
-        # Styling constants
-        self.header_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")  # Yellow
-        self.header_font = Font(color="000000", bold=True, size=10)
-        self.discipline_fill = PatternFill(start_color="92D050", end_color="92D050", fill_type="solid")  # Green
-        self.discipline_font = Font(color="000000", bold=True, size=11)
-        self.border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.worksheet = self.workbook.create_sheet("Master Document Register")
+        self.tracker = ProgressTracker(progress, cancel_token)
     
     def export(self, output_path):
         """Generate Excel file with MDR data"""
-        current_row = 1
-        
-        # Add headers with all 8 stages
-        current_row = self._add_main_headers_dynamic(current_row)
+        self.tracker.phase('load documents')
         
         # Group documents by discipline
         documents_by_discipline = {}
@@ -55,342 +79,40 @@ class MDRExcelExporter:
                 documents_by_discipline[discipline_name] = []
             documents_by_discipline[discipline_name].append(doc)
         
-        # Add disciplines and their documents
-        for discipline_name in sorted(documents_by_discipline.keys()):
-            documents = documents_by_discipline[discipline_name]
-            current_row = self._add_discipline_section(discipline_name, documents, current_row)
-            current_row += 1  # Space between sections
-        
-        # Apply formatting
-        self._apply_formatting()
+        sections = [(name, documents_by_discipline[name]) for name in sorted(documents_by_discipline)]
+        return self._render(output_path, sections, progress_sheet=True)
+    
+    def export_section(self, output_path, discipline_name, documents):
+        """Generate a workbook holding the headers and a single discipline section"""
+        return self._render(output_path, [(discipline_name, documents)])
+    
+    def _render(self, output_path, sections, progress_sheet=False):
+        """
+        Write (discipline name, documents) sections through the shared MDR renderer and save
+        
+        progress_sheet adds the portfolio's S-curves on a "Progress" sheet when
+        the portfolio is stored in the database.
+        """
+        def rows():
+            for discipline_name, documents in sections:
+                yield Section(discipline_name)
+                for doc in documents:
+                    yield document_row(doc, doc.current_revision, doc.current_status)
+        
+        banner = f"Generated: {datetime.now().strftime('%d/%m/%Y %H:%M')}\nPortfolio: {self.portfolio.name}"
+        documents = MDRRenderer(self.worksheet, banner, tracker=self.tracker).render(rows())
+        session = object_session(self.portfolio)
+        if progress_sheet and session is not None and self.portfolio.id is not None:
+            self.tracker.phase('progress')
+            write_progress_sheet(self.workbook.create_sheet("Progress"),
+                                 portfolio_progress(self.portfolio.id, session=session), self.portfolio.name)
         self._store_metadata()
         
-        # Save file
+        self.tracker.phase('save', documents)
         self.workbook.save(output_path)
+        self.tracker.finish(documents)
         return output_path
     
-    def _add_main_headers_dynamic(self, start_row):
-        """Add main column headers dynamically based on stages configuration"""
-        
-        row1 = start_row
-        row2 = start_row + 1
-        row3 = start_row + 2
-        
-        # Set row heights
-        self.worksheet.row_dimensions[row1].height = 60
-        self.worksheet.row_dimensions[row2].height = 20
-        self.worksheet.row_dimensions[row3].height = 20
-        
-        # Get column positions
-        col_pos = get_column_positions()
-        
-        # ===== BASIC INFO COLUMNS (A, B, C) =====
-        # Logo/Timestamp section (A-F merged in row 1)
-        timestamp_cell = self.worksheet.cell(row=row1, column=1, 
-                                            value=f"Generated: {datetime.now().strftime('%d/%m/%Y %H:%M')}\nPortfolio: {self.portfolio.name}")
-        timestamp_cell.fill = self.header_fill
-        timestamp_cell.font = Font(size=8, color="000000")
-        timestamp_cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        timestamp_cell.border = self.border
-        
-        for col in range(1, 7):
-            cell = self.worksheet.cell(row=row1, column=col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        self.worksheet.merge_cells(f"A{row1}:F{row1}")
-        
-        # S/No, Doc Number, Doc Title (rows 2-3 merged)
-        basic_columns = [
-            (1, "S/No"),
-            (2, "Doc Number"),
-            (3, "DOC Title")
-        ]
-        
-        for col, header_text in basic_columns:
-            # Row 2
-            cell = self.worksheet.cell(row=row2, column=col, value=header_text)
-            cell.fill = self.header_fill
-            cell.font = self.header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = self.border
-            
-            # Merge rows 2-3
-            col_letter = get_column_letter(col)
-            self.worksheet.merge_cells(f"{col_letter}{row2}:{col_letter}{row3}")
-            
-            # Style row 3
-            cell3 = self.worksheet.cell(row=row3, column=col)
-            cell3.fill = self.header_fill
-            cell3.border = self.border
-        
-        # ===== CURRENT STATUS SECTION (D-F) =====
-        current_col = col_pos['current_status_start']
-        
-        # Row 2: "Current Status" merged across D-F
-        cell = self.worksheet.cell(row=row2, column=current_col, value="Current Status")
-        cell.fill = self.header_fill
-        cell.font = self.header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        cell.border = self.border
-        self.worksheet.merge_cells(f"{get_column_letter(current_col)}{row2}:{get_column_letter(current_col+2)}{row2}")
-        
-        for col in range(current_col, current_col + 3):
-            cell = self.worksheet.cell(row=row2, column=col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        
-        # Row 3: Individual columns
-        status_columns = ["Current Rev", "Status", "Current Transmittal No."]
-        for i, text in enumerate(status_columns):
-            cell = self.worksheet.cell(row=row3, column=current_col + i, value=text)
-            cell.fill = self.header_fill
-            cell.font = self.header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = self.border
-        
-        # ===== STAGE SECTIONS =====
-        for stage in STANDARD_STAGES:
-            stage_code = stage['code']
-            stage_col = col_pos[f"{stage_code.lower()}_start"]
-            feedback_cols = get_feedback_columns(stage['has_next_rev'])
-            
-            # Calculate column spans
-            submission_col_count = len(SUBMISSION_COLUMNS)
-            feedback_col_count = len(feedback_cols)
-            total_cols = submission_col_count + feedback_col_count
-            
-            # ROW 1: Stage name (e.g., "IFR") merged across submission columns only
-            stage_end_col = stage_col + submission_col_count - 1
-            cell = self.worksheet.cell(row=row1, column=stage_col, value=stage_code)
-            cell.fill = self.header_fill
-            cell.font = self.header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = self.border
-            self.worksheet.merge_cells(f"{get_column_letter(stage_col)}{row1}:{get_column_letter(stage_end_col)}{row1}")
-            
-            for col in range(stage_col, stage_end_col + 1):
-                cell = self.worksheet.cell(row=row1, column=col)
-                cell.fill = self.header_fill
-                cell.border = self.border
-            
-            # ROW 1: "Client's Feedback" merged across feedback columns
-            feedback_start_col = stage_col + submission_col_count
-            feedback_end_col = feedback_start_col + feedback_col_count - 1
-            cell = self.worksheet.cell(row=row1, column=feedback_start_col, 
-                                      value=f"Client's Feedback ({stage_code} Stage)")
-            cell.fill = self.header_fill
-            cell.font = self.header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = self.border
-            self.worksheet.merge_cells(f"{get_column_letter(feedback_start_col)}{row1}:{get_column_letter(feedback_end_col)}{row1}")
-            
-            for col in range(feedback_start_col, feedback_end_col + 1):
-                cell = self.worksheet.cell(row=row1, column=col)
-                cell.fill = self.header_fill
-                cell.border = self.border
-            
-            # ROW 2: Date columns merged (Planned/Actual)
-            date_label = f"{stage_code} Date" if stage_code != 'AFC' else "AFC Date"
-            cell = self.worksheet.cell(row=row2, column=stage_col, value=date_label)
-            cell.fill = self.header_fill
-            cell.font = self.header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = self.border
-            self.worksheet.merge_cells(f"{get_column_letter(stage_col)}{row2}:{get_column_letter(stage_col+1)}{row2}")
-            
-            for col in range(stage_col, stage_col + 2):
-                cell = self.worksheet.cell(row=row2, column=col)
-                cell.fill = self.header_fill
-                cell.border = self.border
-            
-            # ROW 3: Planned/Actual
-            cell = self.worksheet.cell(row=row3, column=stage_col, value="Planned")
-            cell.fill = self.header_fill
-            cell.font = self.header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = self.border
-            
-            cell = self.worksheet.cell(row=row3, column=stage_col+1, value="Actual")
-            cell.fill = self.header_fill
-            cell.font = self.header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = self.border
-            
-            # ROW 2-3: TR No. and Date Sent (merged vertically)
-            remaining_submission_cols = ["TR No.", "Date Sent"]
-            for i, col_name in enumerate(remaining_submission_cols):
-                col = stage_col + 2 + i
-                cell = self.worksheet.cell(row=row2, column=col, value=col_name)
-                cell.fill = self.header_fill
-                cell.font = self.header_font
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-                cell.border = self.border
-                self.worksheet.merge_cells(f"{get_column_letter(col)}{row2}:{get_column_letter(col)}{row3}")
-                
-                cell3 = self.worksheet.cell(row=row3, column=col)
-                cell3.fill = self.header_fill
-                cell3.border = self.border
-            
-            # ROW 2-3: Feedback columns (merged vertically)
-            for i, feedback_col in enumerate(feedback_cols):
-                col = feedback_start_col + i
-                cell = self.worksheet.cell(row=row2, column=col, value=feedback_col['name'])
-                cell.fill = self.header_fill
-                cell.font = self.header_font
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-                cell.border = self.border
-                self.worksheet.merge_cells(f"{get_column_letter(col)}{row2}:{get_column_letter(col)}{row3}")
-                
-                cell3 = self.worksheet.cell(row=row3, column=col)
-                cell3.fill = self.header_fill
-                cell3.border = self.border
-        
-        # ===== REMARKS COLUMN =====
-        remarks_col = col_pos['remarks']
-        cell = self.worksheet.cell(row=row1, column=remarks_col, value="REMARKS")
-        cell.fill = self.header_fill
-        cell.font = self.header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        cell.border = self.border
-        self.worksheet.merge_cells(f"{get_column_letter(remarks_col)}{row1}:{get_column_letter(remarks_col)}{row3}")
-        
-        for row in [row2, row3]:
-            cell = self.worksheet.cell(row=row, column=remarks_col)
-            cell.fill = self.header_fill
-            cell.border = self.border
-        
-        return row3 + 1
-    
-    def _add_discipline_section(self, discipline_name, documents, start_row):
-        """Add a discipline section with its documents"""
-        col_pos = get_column_positions()
-        max_col = col_pos['remarks']
-        
-        # Add discipline header (green row)
-        discipline_cell = self.worksheet.cell(row=start_row, column=1, value=discipline_name)
-        discipline_cell.fill = self.discipline_fill
-        discipline_cell.font = self.discipline_font
-        discipline_cell.alignment = Alignment(horizontal='left', vertical='center')
-        discipline_cell.border = self.border
-        self.worksheet.merge_cells(f"A{start_row}:{get_column_letter(max_col)}{start_row}")
-        
-        # Apply styling to all cells in merged range
-        for col in range(2, max_col + 1):
-            cell = self.worksheet.cell(row=start_row, column=col)
-            cell.fill = self.discipline_fill
-            cell.border = self.border
-        
-        current_row = start_row + 1
-        
-        # Add documents
-        for i, doc in enumerate(documents, 1):
-            self._add_document_row(doc, current_row, i)
-            current_row += 1
-        
-        return current_row
-    
-    def _add_document_row(self, doc, row, s_no):
-        """Add a single document row with all stage data"""
-        col_pos = get_column_positions()
-        
-        # Basic info (A, B, C)
-        self.worksheet.cell(row=row, column=1, value=s_no).border = self.border
-        self.worksheet.cell(row=row, column=1).alignment = Alignment(horizontal='center', vertical='center')
-        self.worksheet.cell(row=row, column=1).font = Font(bold=True)
-        
-        self.worksheet.cell(row=row, column=2, value=doc.doc_number or "").border = self.border
-        self.worksheet.cell(row=row, column=2).alignment = Alignment(horizontal='center', vertical='center')
-        self.worksheet.cell(row=row, column=2).font = Font(bold=True)
-        
-        self.worksheet.cell(row=row, column=3, value=doc.doc_title or "").border = self.border
-        self.worksheet.cell(row=row, column=3).alignment = Alignment(horizontal='left', vertical='center')
-        
-        # Current Status (D, E, F)
-        current_col = col_pos['current_status_start']
-        status_values = [
-            doc.current_revision or "",
-            doc.current_status or "",
-            doc.current_transmittal_no or ""
-        ]
-        for i, val in enumerate(status_values):
-            cell = self.worksheet.cell(row=row, column=current_col + i, value=val)
-            cell.border = self.border
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # All stages dynamically
-        for stage in STANDARD_STAGES:
-            stage_code_lower = stage['code'].lower()
-            stage_col = col_pos[f"{stage_code_lower}_start"]
-            
-            # Get values from document using stage code
-            stage_values = [
-                getattr(doc, f"{stage_code_lower}_date_planned", "") or "",
-                getattr(doc, f"{stage_code_lower}_date_actual", "") or "",
-                getattr(doc, f"{stage_code_lower}_tr_no", "") or "",
-                getattr(doc, f"{stage_code_lower}_date_sent", "") or "",
-                getattr(doc, f"{stage_code_lower}_rev_status", "") or "",
-                getattr(doc, f"{stage_code_lower}_issue_for", "") or "",
-                getattr(doc, f"{stage_code_lower}_date_received", "") or "",
-                getattr(doc, f"{stage_code_lower}_tr_received", "") or "",  # NEW: Transmittal Received
-            ]
-            
-            # Add next_rev if applicable (all except IFR and AFC)
-            if stage['has_next_rev']:
-                stage_values.append(getattr(doc, f"{stage_code_lower}_next_rev", "") or "")
-            
-            # Write values to cells
-            for i, val in enumerate(stage_values):
-                cell = self.worksheet.cell(row=row, column=stage_col + i, value=val)
-                cell.border = self.border
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-        
-        # Remarks (last column)
-        remarks_col = col_pos['remarks']
-        cell = self.worksheet.cell(row=row, column=remarks_col, value=doc.remarks or "")
-        cell.border = self.border
-        cell.alignment = Alignment(horizontal='left', vertical='center')
-    
-    def _apply_formatting(self):
-        """Apply column widths and general formatting"""
-        col_pos = get_column_positions()
-        max_col = col_pos['remarks']
-        
-        # Auto-size columns based on content
-        for col_idx in range(1, max_col + 1):
-            max_length = 0
-            column_letter = get_column_letter(col_idx)
-            
-            for row in self.worksheet.iter_rows(min_col=col_idx, max_col=col_idx):
-                for cell in row:
-                    try:
-                        # Skip merged cells
-                        if isinstance(cell, MergedCell):
-                            continue
-                        
-                        if cell.value:
-                            # Calculate cell content length
-                            cell_length = len(str(cell.value))
-                            if cell_length > max_length:
-                                max_length = cell_length
-                    except:
-                        pass
-            
-            # Set column width with min and max limits
-            if max_length > 0:
-                adjusted_width = min(max(max_length + 2, 8), 50)  # Min 8, Max 50
-                self.worksheet.column_dimensions[column_letter].width = adjusted_width
-        
-        # Override specific columns with fixed widths for better layout
-        remarks_letter = get_column_letter(col_pos['remarks'])
-        column_widths_override = {
-            'A': 8,   # S/No - fixed small
-            'C': 40,  # DOC Title - fixed large for readability
-            remarks_letter: 30,  # REMARKS - fixed large (dynamic position)
-        }
-        
-        for col_letter, width in column_widths_override.items():
-            self.worksheet.column_dimensions[col_letter].width = width
-    
     def _store_metadata(self):
         """Store portfolio metadata in Excel properties"""
         props = self.workbook.properties
@@ -404,15 +126,18 @@ class MDRExcelExporter:
 class MDRExcelImporter:
     """Import MDR data from Excel with structure recognition for all 8 stages"""
     
-    def __init__(self, file_path):
+    def __init__(self, file_path, progress=None, cancel_token=None):
         self.file_path = file_path
         self.workbook = None
         self.worksheet = None
+        self.tracker = ProgressTracker(progress, cancel_token)
     
     def import_to_portfolio(self, portfolio):
-        """Import Excel data into a portfolio"""
+        """Import Excel data into a portfolio; nothing is committed if the import is cancelled"""
+        from shared.models import db
         try:
             # Open workbook
+            self.tracker.phase('read workbook')
             self.workbook = openpyxl.load_workbook(self.file_path)
             self.worksheet = self.workbook.active
             
@@ -423,9 +148,11 @@ class MDRExcelImporter:
             col_pos = get_column_positions()
             current_discipline = None
             documents_imported = 0
+            self.tracker.phase('import', self.worksheet.max_row - header_row)
             
             # Process rows after header
             for row in range(header_row + 1, self.worksheet.max_row + 1):
+                self.tracker.advance()
                 row_data = self._get_row_data(row)
                 
                 if not any(row_data):  # Skip empty rows
@@ -446,7 +173,6 @@ class MDRExcelImporter:
                                 portfolio_id=portfolio.id,
                                 name=discipline_name
                             )
-                            from shared.models import db
                             db.session.add(current_discipline)
                             db.session.flush()
                     continue
@@ -476,34 +202,9 @@ class MDRExcelImporter:
                             'current_status': current_status,
                             'current_transmittal_no': current_transmittal_no,
                         }
-                        
-                        # Extract data for each stage
-                        for stage in STANDARD_STAGES:
-                            stage_code_lower = stage['code'].lower()
-                            stage_col = col_pos[f"{stage_code_lower}_start"] - 1  # Convert to 0-indexed
-                            
-                            # Submission columns
-                            doc_kwargs[f"{stage_code_lower}_date_planned"] = row_data[stage_col] if len(row_data) > stage_col else ""
-                            doc_kwargs[f"{stage_code_lower}_date_actual"] = row_data[stage_col + 1] if len(row_data) > stage_col + 1 else ""
-                            doc_kwargs[f"{stage_code_lower}_tr_no"] = row_data[stage_col + 2] if len(row_data) > stage_col + 2 else ""
-                            doc_kwargs[f"{stage_code_lower}_date_sent"] = row_data[stage_col + 3] if len(row_data) > stage_col + 3 else ""
-                            
-                            # Feedback columns
-                            doc_kwargs[f"{stage_code_lower}_rev_status"] = row_data[stage_col + 4] if len(row_data) > stage_col + 4 else ""
-                            doc_kwargs[f"{stage_code_lower}_issue_for"] = row_data[stage_col + 5] if len(row_data) > stage_col + 5 else ""
-                            doc_kwargs[f"{stage_code_lower}_date_received"] = row_data[stage_col + 6] if len(row_data) > stage_col + 6 else ""
-                            doc_kwargs[f"{stage_code_lower}_tr_received"] = row_data[stage_col + 7] if len(row_data) > stage_col + 7 else ""  # NEW
-                            
-                            # Next Rev (if applicable)
-                            if stage['has_next_rev']:
-                                doc_kwargs[f"{stage_code_lower}_next_rev"] = row_data[stage_col + 8] if len(row_data) > stage_col + 8 else ""
-                        
-                        # Remarks
-                        remarks_col = col_pos['remarks'] - 1  # Convert to 0-indexed
-                        doc_kwargs['remarks'] = row_data[remarks_col] if len(row_data) > remarks_col else ""
+                        doc_kwargs.update(_stage_fields_from_row(row_data, col_pos))
                         
                         document = Document(**doc_kwargs)
-                        from shared.models import db
                         db.session.add(document)
                         documents_imported += 1
                         
@@ -511,10 +212,15 @@ class MDRExcelImporter:
                     # Skip rows with invalid data
                     continue
             
-            from shared.models import db
+            self.tracker.phase('commit', documents_imported)
             db.session.commit()
+            self.tracker.finish(documents_imported)
             return documents_imported
         
+        except OperationCancelled:
+            db.session.rollback()
+            raise
+        
         finally:
             # Always close the workbook to release the file
             if self.workbook:
@@ -545,3 +251,235 @@ class MDRExcelImporter:
         col_pos = get_column_positions()
         max_col = col_pos['remarks']
         return [self.worksheet.cell(row=row, column=col).value for col in range(1, max_col + 1)]
+
+
+class MDRExcelValidator:
+    """
+    Validate an MDR workbook without touching the database
+    
+    Streams the sheet once in read-only mode and reports the rows that
+    MDRExcelImporter would silently drop or mis-file: duplicate doc numbers,
+    unparseable stage dates, unknown disciplines and documents outside any
+    discipline section.
+    """
+    
+    REPORT_COLUMNS = ['row', 'severity', 'code', 'field', 'value', 'message']
+    
+    def __init__(self, file_path, known_disciplines=None, existing_doc_numbers=None):
+        self.file_path = file_path
+        self.known_disciplines = {name.strip().lower() for name in known_disciplines or []}
+        self.existing_doc_numbers = set(existing_doc_numbers or [])
+        self.summary = {
+            'rows_scanned': 0,
+            'documents': 0,
+            'disciplines': 0,
+            'errors': 0,
+            'warnings': 0,
+            'elapsed': 0.0
+        }
+    
+    def validate(self):
+        """Run the validation and return the summary with the full issue list"""
+        issues = list(self.iter_issues())
+        return dict(self.summary, issues=issues)
+    
+    def iter_issues(self):
+        """Yield validation issues as they are found (single pass over the sheet)"""
+        started = time.perf_counter()
+        col_pos = get_column_positions()
+        max_col = col_pos['remarks']
+        
+        workbook = openpyxl.load_workbook(self.file_path, read_only=True, data_only=True)
+        try:
+            worksheet = workbook.active
+            header_row = None
+            current_discipline = None
+            seen_doc_numbers = {}
+            
+            for row, values in enumerate(worksheet.iter_rows(max_col=max_col, values_only=True), 1):
+                row_data = list(values) + [None] * (max_col - len(values))
+                
+                # Skip the title block until the 'S/No' header row
+                if header_row is None:
+                    if row_data[0] == "S/No":
+                        header_row = row
+                    elif row >= 20:
+                        yield self._issue(row, 'error', 'missing_header', 'S/No', None,
+                                          "Could not find header row in Excel file")
+                        return
+                    continue
+                
+                if not any(row_data):  # Skip empty rows
+                    continue
+                self.summary['rows_scanned'] += 1
+                
+                if _is_section_values(row_data):
+                    current_discipline = row_data[0].strip()
+                    self.summary['disciplines'] += 1
+                    if self.known_disciplines and current_discipline.lower() not in self.known_disciplines:
+                        yield self._issue(row, 'warning', 'unknown_discipline', 'discipline', current_discipline,
+                                          f"Discipline '{current_discipline}' does not exist in this portfolio and will be created")
+                    continue
+                
+                doc_number = str(row_data[1]).strip() if row_data[1] is not None else ""
+                doc_title = str(row_data[2]).strip() if row_data[2] is not None else ""
+                
+                if not doc_number and not doc_title:
+                    # Sub-header rows and notes carry no document
+                    continue
+                
+                if not doc_number or not doc_title:
+                    missing = 'doc_number' if not doc_number else 'doc_title'
+                    yield self._issue(row, 'error', 'incomplete_row', missing, doc_number or doc_title,
+                                      f"Row has no {missing.replace('_', ' ')} and will be skipped on import")
+                    continue
+                
+                self.summary['documents'] += 1
+                
+                if current_discipline is None:
+                    yield self._issue(row, 'warning', 'outside_section', 'discipline', doc_number,
+                                      "Document appears before any discipline row and will be imported unassigned")
+                
+                if doc_number in seen_doc_numbers:
+                    yield self._issue(row, 'error', 'duplicate_doc_number', 'doc_number', doc_number,
+                                      f"Duplicate doc number (first seen on row {seen_doc_numbers[doc_number]})")
+                else:
+                    seen_doc_numbers[doc_number] = row
+                    if doc_number in self.existing_doc_numbers:
+                        yield self._issue(row, 'warning', 'existing_doc_number', 'doc_number', doc_number,
+                                          "Doc number already exists in this portfolio; import will add a second copy")
+                
+                # Stage dates
+                fields = _stage_fields_from_row(row_data, col_pos)
+                for stage in STANDARD_STAGES:
+                    stage_code_lower = stage['code'].lower()
+                    for field_name in STAGE_DATE_FIELDS:
+                        key = f"{stage_code_lower}_{field_name}"
+                        value = fields[key]
+                        if isinstance(value, (int, float)):
+                            # Excel serial dates survive a round trip as numbers
+                            continue
+                        try:
+                            parse_date(value)
+                        except ValueError:
+                            yield self._issue(row, 'error', 'unparseable_date', key, value,
+                                              f"{stage['code']} {field_name.replace('_', ' ')} is not a valid date")
+
+            if header_row is None:
+                yield self._issue(0, 'error', 'missing_header', 'S/No', None,
+                                  "Could not find header row in Excel file")
+        finally:
+            workbook.close()
+            self.summary['elapsed'] = round(time.perf_counter() - started, 3)
+    
+    def iter_csv_report(self):
+        """Yield the validation report as CSV text, one line at a time"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        
+        def flush(fields):
+            writer.writerow(fields)
+            line = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            return line
+        
+        yield flush(self.REPORT_COLUMNS)
+        for issue in self.iter_issues():
+            yield flush([issue[col] if issue[col] is not None else '' for col in self.REPORT_COLUMNS])
+        
+        yield flush(['', 'info', 'summary', '', '',
+                     f"{self.summary['documents']} documents in {self.summary['disciplines']} disciplines, "
+                     f"{self.summary['errors']} errors, {self.summary['warnings']} warnings "
+                     f"({self.summary['elapsed']}s)"])
+    
+    def _issue(self, row, severity, code, field, value, message):
+        """Build an issue record and update the summary counters"""
+        self.summary['errors' if severity == 'error' else 'warnings'] += 1
+        return {
+            'row': row,
+            'severity': severity,
+            'code': code,
+            'field': field,
+            'value': value,
+            'message': message
+        }
+
+
+def parse_mdr_workbook(file_path):
+    """
+    Parse an MDR workbook into plain, picklable data
+    
+    Used by the batch importer in worker processes, so it never touches the
+    database. Returns the project properties and the documents grouped into
+    discipline sections, in sheet order.
+    """
+    started = time.perf_counter()
+    col_pos = get_column_positions()
+    max_col = col_pos['remarks']
+    current_col = col_pos['current_status_start'] - 1
+    
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        props = workbook.properties
+        project_code = props.subject.replace("Project Code:", "").strip() if props.subject else ""
+        client = props.description.replace("Client:", "").strip() if props.description and "Client:" in props.description else ""
+        
+        worksheet = workbook.active
+        header_found = False
+        sections = []
+        current_section = None
+        rows_scanned = 0
+        
+        for values in worksheet.iter_rows(max_col=max_col, values_only=True):
+            row_data = list(values) + [None] * (max_col - len(values))
+            
+            if not header_found:
+                header_found = row_data[0] == "S/No"
+                continue
+            
+            if not any(row_data):
+                continue
+            rows_scanned += 1
+            
+            if _is_section_values(row_data):
+                current_section = {'discipline': row_data[0].strip(), 'documents': []}
+                sections.append(current_section)
+                continue
+            
+            doc_number = _cell_text(row_data[1])
+            doc_title = _cell_text(row_data[2])
+            if not doc_number or not doc_title:
+                continue
+            
+            if current_section is None:
+                # Documents before the first discipline row are imported unassigned
+                current_section = {'discipline': None, 'documents': []}
+                sections.append(current_section)
+            
+            fields = {key: _cell_text(value) for key, value in _stage_fields_from_row(row_data, col_pos).items()}
+            fields.update({
+                's_no': row_data[0] if isinstance(row_data[0], int) else None,
+                'doc_number': doc_number,
+                'doc_title': doc_title,
+                'current_revision': _cell_text(row_data[current_col]),
+                'current_status': _cell_text(row_data[current_col + 1]),
+                'current_transmittal_no': _cell_text(row_data[current_col + 2]),
+            })
+            current_section['documents'].append(fields)
+        
+        if not header_found:
+            raise ValueError("Could not find header row in Excel file")
+        
+        return {
+            'file': file_path,
+            'project_name': (props.title or "").strip(),
+            'project_code': project_code,
+            'client': client,
+            'sections': sections,
+            'rows_scanned': rows_scanned,
+            'documents': sum(len(section['documents']) for section in sections),
+            'parse_seconds': round(time.perf_counter() - started, 3)
+        }
+    finally:
+        workbook.close()
@@ -0,0 +1,127 @@
+"""
+Data-only MDR export
+Unstyled flat files (CSV, TSV, NDJSON, Parquet) streamed straight from a database cursor.
+Parquet is only offered when the optional pyarrow package is installed.
+"""
+
+import csv
+import importlib.util
+import io
+import json
+
+from sqlalchemy import select
+
+from shared.models import db, Document, Discipline
+from mdr_stages_config import STANDARD_STAGES, get_stage_fields
+
+
+# format -> (mimetype, file extension)
+FLAT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'tsv': ('text/tab-separated-values', 'tsv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+if importlib.util.find_spec('pyarrow') is not None:
+    FLAT_FORMATS['parquet'] = ('application/vnd.apache.parquet', 'parquet')
+
+DOCUMENT_COLUMNS = [
+    's_no',
+    'doc_number',
+    'doc_title',
+    'doc_type',
+    'deliverable_category',
+    'current_revision',
+    'current_status',
+    'current_transmittal_no',
+]
+
+
+def flat_columns():
+    """Column names of a flat export: discipline, document fields, one column per stage field, remarks"""
+    columns = ['discipline'] + DOCUMENT_COLUMNS
+    for stage in STANDARD_STAGES:
+        stage_code_lower = stage['code'].lower()
+        columns += [f"{stage_code_lower}_{field}" for field in get_stage_fields(stage['has_next_rev'])]
+    return columns + ['remarks']
+
+
+def iter_flat_rows(portfolio_id, session=None, batch_size=1000):
+    """Yield one value tuple per document, in MDR order, without building ORM objects"""
+    session = session or db.session
+    table = Document.__table__
+    query = (
+        select(Discipline.name, *[table.c[name] for name in flat_columns()[1:]])
+        .select_from(table)
+        .outerjoin(Discipline, Document.discipline_id == Discipline.id)
+        .where(Document.portfolio_id == portfolio_id)
+        .order_by(Discipline.name, Document.s_no, Document.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for row in session.execute(query):
+        yield tuple(row)
+
+
+def iter_flat_export(portfolio_id, fmt='csv', session=None, batch_size=1000):
+    """Yield a text-format export (csv, tsv or ndjson) as UTF-8 byte chunks"""
+    if fmt not in ('csv', 'tsv', 'ndjson'):
+        raise ValueError(f"'{fmt}' is not a streamable text format")
+    
+    columns = flat_columns()
+    buffer = io.StringIO()
+    
+    if fmt == 'ndjson':
+        def write_row(row):
+            buffer.write(json.dumps(dict(zip(columns, row)), default=str))
+            buffer.write('\n')
+    else:
+        writer = csv.writer(buffer, delimiter='\t' if fmt == 'tsv' else ',')
+        writer.writerow(columns)
+        
+        def write_row(row):
+            writer.writerow(['' if value is None else value for value in row])
+    
+    for count, row in enumerate(iter_flat_rows(portfolio_id, session, batch_size), 1):
+        write_row(row)
+        if count % batch_size == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+    
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def write_flat_export(portfolio_id, fileobj, fmt='csv', session=None, batch_size=1000):
+    """Write a flat export of any format to a binary file object"""
+    if fmt == 'parquet':
+        _write_parquet(portfolio_id, fileobj, session, batch_size)
+    else:
+        for chunk in iter_flat_export(portfolio_id, fmt, session, batch_size):
+            fileobj.write(chunk)
+    return fileobj
+
+
+def _write_parquet(portfolio_id, fileobj, session, batch_size):
+    """Columnar export, one row group per batch of documents (requires pyarrow)"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet export requires pyarrow (pip install pyarrow)")
+    
+    schema = pa.schema([(name, pa.int64() if name == 's_no' else pa.string()) for name in flat_columns()])
+    
+    def to_batch(rows):
+        values = list(zip(*rows))
+        return pa.record_batch([pa.array(list(col), type=field.type) for col, field in zip(values, schema)],
+                               schema=schema)
+    
+    with pq.ParquetWriter(fileobj, schema) as writer:
+        rows = []
+        for row in iter_flat_rows(portfolio_id, session, batch_size):
+            rows.append(row)
+            if len(rows) == batch_size:
+                writer.write_batch(to_batch(rows))
+                rows = []
+        if rows:
+            writer.write_batch(to_batch(rows))
@@ -0,0 +1,381 @@
+"""
+AFC completion forecast
+Monte Carlo simulation of when a portfolio's open documents reach AFC. Client
+turnaround times (stage sent -> client reply received, in working days of the
+portfolio's calendar) are collected from the stage dates and Submission records
+of every portfolio and kept as empirical distributions per client, stage and
+discipline. Each simulation walks every open document through its remaining
+stages - issued on the planned date or as soon as the previous reply is back,
+whichever is later - drawing each turnaround from the closest group with enough
+history. Documents and simulations are arrays of working-day numbers, so the
+only Python loop is over the eight stages.
+"""
+
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+from sqlalchemy import select, func, or_, and_
+
+from shared.models import (db, Portfolio, Discipline, Document, Submission, PortfolioVersion, ClientTurnaround,
+                           WorkCalendar, get_portfolio_version)
+from shared.dates import normalize_date
+from shared.calendars import load_calendar, portfolio_calendar
+from shared.status import STATUS_AFC
+from mdr_stages_config import STANDARD_STAGES
+
+STAGE_CODES = [stage['code'] for stage in STANDARD_STAGES]
+PERCENTILES = (50, 80)
+
+DEFAULT_SIMULATIONS = 2000
+MAX_SIMULATIONS = 20000
+# A group needs this many observed turnarounds before it is used on its own
+MIN_SAMPLES = 5
+# Turnaround assumed when there is no history at all (working days)
+DEFAULT_TURNAROUND = 10
+# Longer gaps are data-entry errors, not turnarounds (working days)
+MAX_TURNAROUND = 520
+# Points of the quantile table each distribution is reduced to; one random byte picks one
+QUANTILES = 256
+# Open documents per vectorized block (and per worker task)
+CHUNK_SIZE = 1000
+
+# Forecasts of recent (portfolio, version, calendar version, history, simulations, day) keys
+CACHE_SIZE = 64
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+_EPOCH = date(1970, 1, 1).toordinal()
+
+
+def _key(text):
+    return (text or '').strip().lower() or None
+
+
+def load_turnarounds(session=None):
+    """
+    Observed client turnarounds in working days, {(client, stage, discipline): [days]}
+    
+    Taken from the *_date_sent/*_date_received pairs of every document and the
+    Submission date_sent/response_date pairs; the same exchange recorded in both
+    places counts once. Working days follow each portfolio's calendar; client
+    and discipline names are lower-cased.
+    """
+    session = session or db.session
+    observed = {}
+    
+    received_columns = [getattr(Document, f"{code.lower()}_date_received") for code in STAGE_CODES]
+    columns = [Document.id, Portfolio.client, Portfolio.calendar_id, Discipline.name]
+    for code in STAGE_CODES:
+        columns += [getattr(Document, f"{code.lower()}_date_sent"), getattr(Document, f"{code.lower()}_date_received")]
+    query = (select(*columns).select_from(Document)
+             .join(Portfolio, Portfolio.id == Document.portfolio_id)
+             .outerjoin(Discipline, Discipline.id == Document.discipline_id)
+             .where(or_(*[and_(column.isnot(None), column != '') for column in received_columns]))
+             .execution_options(yield_per=1000))
+    for row in session.execute(query):
+        document_id, client, calendar_id, discipline = row[:4]
+        for i, code in enumerate(STAGE_CODES):
+            sent = normalize_date(row[4 + 2 * i])
+            received = normalize_date(row[5 + 2 * i])
+            if sent and received:
+                observed[(document_id, code, sent, received)] = (calendar_id, (_key(client), code, _key(discipline)))
+    
+    submissions = (select(Submission.document_id, Submission.stage, Submission.date_sent, Submission.response_date,
+                          Portfolio.client, Portfolio.calendar_id, Discipline.name)
+                   .join(Document, Document.id == Submission.document_id)
+                   .join(Portfolio, Portfolio.id == Document.portfolio_id)
+                   .outerjoin(Discipline, Discipline.id == Document.discipline_id)
+                   .where(Submission.date_sent.isnot(None), Submission.response_date.isnot(None)))
+    for document_id, stage, sent, received, client, calendar_id, discipline in session.execute(submissions):
+        code = (stage or '').strip().upper()
+        if code in STAGE_CODES:
+            observed[(document_id, code, sent, received)] = (calendar_id, (_key(client), code, _key(discipline)))
+    
+    # Count the working days of all exchanges on one calendar at once
+    by_calendar = defaultdict(list)
+    for (_, _, sent, received), (calendar_id, group) in observed.items():
+        by_calendar[calendar_id].append((sent, received, group))
+    samples = defaultdict(list)
+    for calendar_id, exchanges in by_calendar.items():
+        sent, received, groups = zip(*exchanges)
+        counts = load_calendar(calendar_id, session).count(np.array(sent, dtype='datetime64[D]'),
+                                                            np.array(received, dtype='datetime64[D]'))
+        for group, days in zip(groups, counts.tolist()):
+            if 0 <= days <= MAX_TURNAROUND:
+                samples[group].append(days)
+    return dict(samples)
+
+
+class TurnaroundModel:
+    """
+    Empirical turnaround distributions with fallbacks
+    
+    A (client, stage, discipline) with fewer than MIN_SAMPLES observations
+    falls back to (client, stage), then the stage across clients, then all
+    turnarounds, then DEFAULT_TURNAROUND. Each usable group is reduced to a
+    row of QUANTILES evenly spaced quantiles in one table, so drawing for many
+    groups at once is a single fancy-indexing operation on random bytes.
+    """
+    
+    def __init__(self, samples):
+        pooled = defaultdict(list)
+        for (client, stage, discipline), days in samples.items():
+            # dict.fromkeys: an unassigned discipline's key is also its (client, stage) key
+            for key in dict.fromkeys(((client, stage, discipline), (client, stage, None),
+                                      (None, stage, None), (None, None, None))):
+                pooled[key].extend(days)
+        groups = {key: days for key, days in pooled.items() if len(days) >= MIN_SAMPLES}
+        groups.setdefault((None, None, None), pooled.get((None, None, None)) or [DEFAULT_TURNAROUND])
+        
+        self.keys = list(groups)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.samples = [np.array(groups[key], dtype=np.int64) for key in self.keys]
+        levels = (np.arange(QUANTILES) + 0.5) * 100 / QUANTILES
+        self.table = np.array([np.percentile(days, levels, method='inverted_cdf') for days in self.samples],
+                              dtype=np.int32)
+    
+    def group(self, client, stage, discipline):
+        """Index of the group whose distribution applies"""
+        for key in ((client, stage, discipline), (client, stage, None), (None, stage, None)):
+            if key in self.index:
+                return self.index[key]
+        return self.index[(None, None, None)]
+    
+    def describe(self, client):
+        """{stage: {samples, mean, p50, p80, scope}} of the distributions used for a client's stages"""
+        stages = {}
+        for code in STAGE_CODES:
+            key = self.keys[self.group(client, code, None)]
+            days = self.samples[self.index[key]]
+            stages[code] = {
+                'samples': int(len(days)),
+                'mean': round(float(days.mean()), 1),
+                'p50': int(np.percentile(days, 50, method='higher')),
+                'p80': int(np.percentile(days, 80, method='higher')),
+                'scope': 'client' if key[0] else ('stage' if key[1] else 'all'),
+            }
+        return stages
+
+
+def _simulate(task):
+    """
+    Latest AFC day per discipline of one block of open documents, shape (disciplines, simulations)
+    
+    Days are working-day numbers (see BusinessCalendar.day_numbers), handled and
+    returned as int32 offsets from today to halve the memory traffic.
+    """
+    (discipline_index, n_disciplines, base, review_group, floors, remaining, groups,
+     today, table, simulations, seed) = task
+    rng = np.random.default_rng(seed)
+    table = table.ravel()
+    base = (base - today).astype(np.int32)
+    floors = (floors - today).astype(np.int32)
+    
+    def draw(group_ids):
+        picks = rng.integers(0, QUANTILES, (len(group_ids), simulations), dtype=np.uint8).astype(np.int32)
+        picks += (group_ids * QUANTILES).astype(np.int32)[:, None]
+        return table[picks]
+    
+    # Day each document is free to issue its next stage
+    t = np.repeat(base[:, None], simulations, axis=1)
+    review = review_group >= 0
+    if review.any():
+        # Still with the client: the reply cannot come before today
+        t[review] = np.maximum(t[review] + draw(review_group[review]), 0)
+    afc = len(STAGE_CODES) - 1
+    for stage in range(afc):
+        rows = remaining[:, stage]
+        if rows.any():
+            t[rows] = np.maximum(t[rows], floors[rows, stage, None]) + draw(groups[rows, stage])
+    t = np.maximum(t, floors[:, afc, None])
+    
+    completion = np.full((n_disciplines, simulations), np.iinfo(np.int32).min, dtype=np.int32)
+    np.maximum.at(completion, discipline_index, t)
+    return completion
+
+
+def _document_state(row, today):
+    """
+    (done day, base day, stage under review, floors, remaining) of one document
+    
+    done day is set (the AFC issue day, or today if not dated) for documents
+    already at AFC and the rest is None. Otherwise base is the reply or send day
+    of the latest stage started (today if none), stage under review the index of
+    a stage sent but not answered (-1), floors the earliest issue day of every
+    stage and remaining which stages are still to be issued: those after the
+    latest started one that are planned, and always AFC.
+    """
+    afc = len(STAGE_CODES) - 1
+    afc_code = STAGE_CODES[afc].lower()
+    issued_text = row[f'{afc_code}_date_actual'] or row[f'{afc_code}_date_sent']
+    if row['status_code'] == STATUS_AFC or (issued_text or '').strip():
+        issued = normalize_date(row[f'{afc_code}_date_actual']) or normalize_date(row[f'{afc_code}_date_sent'])
+        return (issued or today).toordinal(), None, None, None, None
+    
+    last, base, review = -1, today, -1
+    floors = np.full(len(STAGE_CODES), today.toordinal(), dtype=np.int64)
+    planned = np.zeros(len(STAGE_CODES), dtype=bool)
+    for i, code in enumerate(STAGE_CODES):
+        code = code.lower()
+        planned_date = normalize_date(row[f'{code}_date_planned'])
+        if planned_date:
+            planned[i] = True
+            floors[i] = max(floors[i], planned_date.toordinal())
+        texts = [row[f'{code}_date_actual'], row[f'{code}_date_sent'], row[f'{code}_date_received']]
+        if any((text or '').strip() for text in texts):
+            last = i
+            received = normalize_date(texts[2])
+            sent = normalize_date(texts[1]) or normalize_date(texts[0])
+            base, review = (received, -1) if received else (sent or today, i)
+    
+    remaining = planned & (np.arange(len(STAGE_CODES)) > last)
+    remaining[afc] = True
+    return None, base.toordinal(), review, floors, remaining
+
+
+def _forecast(portfolio_id, version, simulations, today, workers, calendar, session):
+    portfolio = session.get(Portfolio, portfolio_id)
+    client = _key(portfolio.client)
+    model = TurnaroundModel(load_turnarounds(session))
+    
+    names = dict(session.execute(
+        select(Discipline.id, Discipline.name).where(Discipline.portfolio_id == portfolio_id)
+    ).all())
+    keys = sorted(names, key=lambda d: names[d]) + [None]
+    position = {key: i for i, key in enumerate(keys)}
+    stage_groups = np.array([[model.group(client, code, _key(names.get(key))) for code in STAGE_CODES]
+                             for key in keys], dtype=np.int64)
+    
+    fields = ['discipline_id', 'status_code'] + [f"{code.lower()}_{field}" for code in STAGE_CODES
+                                                 for field in ('date_planned', 'date_actual', 'date_sent', 'date_received')]
+    rows = session.execute(
+        select(*[getattr(Document, field) for field in fields]).where(Document.portfolio_id == portfolio_id)
+    ).mappings()
+    
+    documents = np.zeros(len(keys), dtype=np.int64)
+    completed = np.zeros(len(keys), dtype=np.int64)
+    open_rows = []
+    for row in rows:
+        discipline = position[row['discipline_id'] if row['discipline_id'] in names else None]
+        documents[discipline] += 1
+        done, base, review, floors, remaining = _document_state(row, today)
+        if done is not None:
+            completed[discipline] = max(completed[discipline], done)
+        else:
+            open_rows.append((discipline, base, review, floors, remaining))
+    
+    # Simulate on working-day numbers: adding n moves n working days
+    def day_numbers(ordinals):
+        return calendar.day_numbers((np.asarray(ordinals) - _EPOCH).astype('datetime64[D]'))
+    
+    today_number = int(day_numbers(today.toordinal()))
+    completion = np.full((len(keys), simulations), today_number, dtype=np.int64)
+    if open_rows:
+        discipline_index = np.array([r[0] for r in open_rows], dtype=np.int64)
+        base = day_numbers(np.array([r[1] for r in open_rows], dtype=np.int64))
+        review = np.array([r[2] for r in open_rows], dtype=np.int64)
+        review_group = np.where(review >= 0, stage_groups[discipline_index, np.maximum(review, 0)], -1)
+        floors = day_numbers(np.stack([r[3] for r in open_rows]))
+        remaining = np.stack([r[4] for r in open_rows])
+        groups = stage_groups[discipline_index]
+        
+        # Reproducible per portfolio version, whatever the number of blocks or workers
+        seeds = np.random.SeedSequence([portfolio_id, version]).spawn((len(open_rows) - 1) // CHUNK_SIZE + 1)
+        tasks = [
+            (discipline_index[s], len(keys), base[s], review_group[s], floors[s], remaining[s], groups[s],
+             today_number, model.table, simulations, seed)
+            for seed, s in zip(seeds, (slice(i, i + CHUNK_SIZE) for i in range(0, len(open_rows), CHUNK_SIZE)))
+        ]
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                results = list(pool.map(_simulate, tasks))
+        else:
+            results = [_simulate(task) for task in tasks]
+        for result in results:
+            np.maximum(completion, result + today_number, out=completion)
+    
+    open_documents = np.bincount([r[0] for r in open_rows], minlength=len(keys)) if open_rows else np.zeros(len(keys))
+    
+    def dates(numbers, last_done, n_open):
+        done = date.fromordinal(int(last_done)) if last_done else None
+        if not n_open:
+            return {f'p{p}': done.isoformat() if done else None for p in PERCENTILES}
+        values = calendar.to_dates(np.percentile(numbers, PERCENTILES, method='higher').astype(np.int64))
+        return {f'p{p}': max(value.astype(date), done or date.min).isoformat() for p, value in zip(PERCENTILES, values)}
+    
+    result = {
+        'portfolio_id': portfolio_id,
+        'version': version,
+        'as_of': today.isoformat(),
+        'simulations': simulations,
+        'calendar': calendar.name,
+        'portfolio': dict(dates(completion.max(axis=0), completed.max(), len(open_rows)),
+                          documents=int(documents.sum()), open_documents=len(open_rows)),
+        'disciplines': [],
+        'turnaround': model.describe(client),
+    }
+    for i, key in enumerate(keys):
+        if documents[i]:
+            result['disciplines'].append(dict(
+                dates(completion[i], completed[i], open_documents[i]),
+                discipline_id=key, name=names.get(key, 'Unassigned'),
+                documents=int(documents[i]), open_documents=int(open_documents[i])))
+    return result
+
+
+def history_key(portfolio_id, session):
+    """
+    Fingerprint of what a forecast reads beyond the portfolio's own documents
+    
+    The portfolio's client, and the turnaround history of every portfolio: all
+    portfolio and calendar versions and the client_turnarounds rows, which the
+    flush hooks refresh whenever feedback or submissions change.
+    """
+    return tuple(session.execute(select(
+        select(Portfolio.client).where(Portfolio.id == portfolio_id).scalar_subquery(),
+        select(func.count()).select_from(PortfolioVersion).scalar_subquery(),
+        select(func.sum(PortfolioVersion.version)).scalar_subquery(),
+        select(func.sum(WorkCalendar.version)).scalar_subquery(),
+        select(func.count()).select_from(ClientTurnaround).scalar_subquery(),
+        select(func.max(ClientTurnaround.updated_at)).scalar_subquery(),
+    )).one())
+
+
+def forecast_portfolio(portfolio_id, simulations=DEFAULT_SIMULATIONS, workers=1, today=None, session=None):
+    """
+    P50/P80 AFC completion dates of a portfolio and each of its disciplines
+    
+    Returns a JSON-ready dict; disciplines whose documents are all at AFC report
+    their last AFC date; turnaround statistics are in working days. Results are
+    cached per portfolio and calendar version, history_key and day, so repeated
+    requests for an unchanged portfolio cost a dictionary lookup; turnaround
+    history written by bulk statements that skip the flush hooks may take until
+    the next day to be used. With workers > 1 the blocks of documents are
+    simulated in worker processes.
+    Raises ValueError for an unknown portfolio or simulation count.
+    """
+    session = session or db.session
+    today = today or date.today()
+    if not 1 <= simulations <= MAX_SIMULATIONS:
+        raise ValueError(f"simulations must be between 1 and {MAX_SIMULATIONS}")
+    
+    # Version first: a change made while simulating gets a fresh forecast next time
+    version = get_portfolio_version(portfolio_id, session)
+    calendar = portfolio_calendar(portfolio_id, session)
+    key = (portfolio_id, version, calendar.key, history_key(portfolio_id, session), simulations, today)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    
+    if session.get(Portfolio, portfolio_id) is None:
+        raise ValueError(f"Portfolio {portfolio_id} not found")
+    result = _forecast(portfolio_id, version, simulations, today, workers, calendar, session)
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
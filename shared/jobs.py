@@ -0,0 +1,243 @@
+"""
+Background and batch jobs
+Worker-pool helpers shared by the command-line tool and scheduled jobs
+"""
+
+import contextlib
+import glob
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from shared.models import db, Portfolio, Document, get_portfolio_version
+from shared.excel_handler import MDRExcelExporter, MDRExcelValidator
+from shared.flat_export import FLAT_FORMATS, write_flat_export
+
+
+def init_worker():
+    """Give each worker process its own database connection"""
+    from shared.database import init_db_headless
+    
+    # init_db prints its own status lines; keep worker output quiet
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        init_db_headless()
+
+
+def run_pool(func, items, workers=1, initializer=None, progress=None):
+    """
+    Run func(item) for every item and return the results in input order
+    
+    With one worker the calls run in this process, so callers that need the
+    database keep using the current session. Exceptions are captured per item
+    as {'error': message} so one bad input never aborts the batch.
+    """
+    progress = progress or (lambda done, total, result: None)
+    results = [None] * len(items)
+    total = len(items)
+    
+    if workers <= 1 or total <= 1:
+        for index, item in enumerate(items):
+            try:
+                results[index] = func(item)
+            except Exception as e:
+                db.session.rollback()
+                results[index] = {'item': item, 'error': str(e)}
+            progress(index + 1, total, results[index])
+        return results
+    
+    with ProcessPoolExecutor(max_workers=min(workers, total), initializer=initializer) as pool:
+        futures = {pool.submit(func, item): index for index, item in enumerate(items)}
+        for done, future in enumerate(as_completed(futures), 1):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                results[index] = {'item': items[index], 'error': str(e)}
+            progress(done, total, results[index])
+    
+    return results
+
+
+def export_filename(portfolio, fmt='xlsx'):
+    """Standard download name for a portfolio's MDR in the given format"""
+    extension = FLAT_FORMATS[fmt][1] if fmt in FLAT_FORMATS else 'xlsx'
+    return f"{portfolio.code}_MDR.{extension}"
+
+
+def export_portfolio(task):
+    """Export one portfolio; task is (portfolio_id, output_dir, fmt)"""
+    portfolio_id, output_dir, fmt = task
+    started = time.perf_counter()
+    
+    portfolio = db.session.get(Portfolio, portfolio_id)
+    if portfolio is None:
+        raise ValueError(f"Portfolio {portfolio_id} not found")
+    
+    output_path = os.path.join(output_dir, export_filename(portfolio, fmt))
+    if fmt == 'xlsx':
+        MDRExcelExporter(portfolio).export(output_path)
+    else:
+        with open(output_path, 'wb') as f:
+            write_flat_export(portfolio_id, f, fmt)
+    
+    return {
+        'portfolio_id': portfolio_id,
+        'code': portfolio.code,
+        'file': output_path,
+        'documents': Document.query.filter_by(portfolio_id=portfolio_id).count(),
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+def export_portfolios(portfolio_ids, output_dir, workers=1, progress=None, fmt='xlsx'):
+    """Export several portfolios to output_dir, one file each (xlsx or a flat format)"""
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(portfolio_id, output_dir, fmt) for portfolio_id in portfolio_ids]
+    return run_pool(export_portfolio, tasks, workers, initializer=init_worker, progress=progress)
+
+
+def validate_workbook(task):
+    """Validate one workbook; task is (file_path, known_disciplines, existing_doc_numbers)"""
+    file_path, known_disciplines, existing_doc_numbers = task
+    try:
+        report = MDRExcelValidator(file_path, known_disciplines, existing_doc_numbers).validate()
+    except Exception as e:
+        # Unreadable workbook (not a zip, wrong format...): report it against the file
+        return {'file': file_path, 'error': str(e)}
+    report['file'] = file_path
+    return report
+
+
+def validate_workbooks(file_paths, known_disciplines=None, existing_doc_numbers=None, workers=1, progress=None):
+    """Validate several workbooks against the same portfolio context"""
+    tasks = [(path, known_disciplines, existing_doc_numbers) for path in file_paths]
+    return run_pool(validate_workbook, tasks, workers, progress=progress)
+
+
+# ---------------------------------------------------------------------------
+# Pre-rendered export artifacts
+# ---------------------------------------------------------------------------
+
+EXPORT_CACHE_DIR = os.environ.get(
+    'MDR_EXPORT_CACHE',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'export_cache')
+)
+
+
+def artifact_path(portfolio_id, version, rendered_on, cache_dir=None):
+    """
+    Location of the workbook rendered from a given portfolio version on a given day
+    
+    The day is part of the key because the Progress sheet is as of the render
+    date: an unchanged portfolio still needs a new workbook every day.
+    """
+    return os.path.join(cache_dir or EXPORT_CACHE_DIR,
+                        f"portfolio_{portfolio_id}_v{version}_{rendered_on:%Y%m%d}.xlsx")
+
+
+def current_artifact(portfolio_id, cache_dir=None):
+    """Path of the cached workbook if it was built today from the current version, else None"""
+    path = artifact_path(portfolio_id, get_portfolio_version(portfolio_id), date.today(), cache_dir)
+    return path if os.path.exists(path) else None
+
+
+def remove_artifacts(portfolio_id, cache_dir=None, keep=None):
+    """Delete the cached workbooks of a portfolio, except the one at keep"""
+    pattern = os.path.join(cache_dir or EXPORT_CACHE_DIR, f"portfolio_{portfolio_id}_v*.xlsx")
+    for path in glob.glob(pattern):
+        if path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # Still being downloaded (Windows); next run removes it
+
+
+def render_artifact(task):
+    """Render one portfolio into the artifact cache; task is (portfolio_id, cache_dir)"""
+    portfolio_id, cache_dir = task
+    started = time.perf_counter()
+    
+    # Read the version before the data: if anything changes while we render,
+    # the version moves on and this artifact is simply never served
+    rendered_on = date.today()
+    version = get_portfolio_version(portfolio_id)
+    portfolio = db.session.get(Portfolio, portfolio_id)
+    if portfolio is None:
+        raise ValueError(f"Portfolio {portfolio_id} not found")
+    
+    path = artifact_path(portfolio_id, version, rendered_on, cache_dir)
+    if not os.path.exists(path):
+        # Write under a unique temporary name and rename, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(fd)
+        try:
+            MDRExcelExporter(portfolio).export(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+    
+    # Drop artifacts from older versions and days
+    remove_artifacts(portfolio_id, cache_dir, keep=path)
+    
+    return {
+        'portfolio_id': portfolio_id,
+        'code': portfolio.code,
+        'version': version,
+        'file': path,
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+def prerender_exports(workers=1, cache_dir=None, progress=None):
+    """
+    Render the MDR workbook of every portfolio whose cached artifact is missing or stale
+    
+    Portfolios that have not changed since an earlier run the same day keep
+    their artifact and are skipped without opening a worker; the first run of
+    a day renders them all, as their Progress sheet moves on with the date.
+    """
+    cache_dir = cache_dir or EXPORT_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    started = time.perf_counter()
+    
+    portfolio_ids = [pid for (pid,) in db.session.query(Portfolio.id).order_by(Portfolio.id)]
+    stale = [pid for pid in portfolio_ids if current_artifact(pid, cache_dir) is None]
+    
+    results = run_pool(render_artifact, [(pid, cache_dir) for pid in stale], workers,
+                       initializer=init_worker, progress=progress)
+    failed = [r for r in results if 'error' in r]
+    
+    return {
+        'portfolios': len(portfolio_ids),
+        'rendered': len(results) - len(failed),
+        'up_to_date': len(portfolio_ids) - len(stale),
+        'failed': len(failed),
+        'elapsed': round(time.perf_counter() - started, 3),
+        'results': results
+    }
+
+
+def run_daily(job, at='02:00', log=print):
+    """Run job() every day at the given local HH:MM time (blocking loop for cron-less hosts)"""
+    hour, minute = (int(part) for part in at.split(':'))
+    
+    while True:
+        now = datetime.now()
+        next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        log(f"Next run at {next_run:%Y-%m-%d %H:%M}")
+        time.sleep((next_run - now).total_seconds())
+        
+        try:
+            job()
+        except Exception as e:
+            # A failed night must not stop the scheduler
+            db.session.rollback()
+            log(f"[ERROR] Scheduled job failed: {e}")
+        finally:
+            # Start each night with a fresh session rather than yesterday's identity map
+            db.session.remove()
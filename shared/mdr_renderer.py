@@ -0,0 +1,345 @@
+"""
+MDR rendering core
+One streaming sheet writer behind both the desktop MDRExcelGenerator and the
+web MDRExcelExporter: three header rows built from STANDARD_STAGES, green
+section rows and one row per document across all stage columns.
+
+Callers pass an iterable of Section markers and document row tuples (see
+document_row); the renderer numbers the documents within each section and
+streams them into a write-only worksheet with styles prepared once, so cost
+stays linear in the number of rows.
+"""
+
+import io
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.drawing.image import Image
+from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+from openpyxl.utils import get_column_letter
+
+from mdr_stages_config import STANDARD_STAGES, SUBMISSION_COLUMNS, FEEDBACK_COLUMNS_BASE, get_feedback_columns, \
+    get_column_positions, get_stage_fields
+from shared.progress import ProgressTracker, OperationCancelled
+
+# Marks the start of a discipline / category section in the row stream
+Section = namedtuple('Section', 'name')
+
+HEADER_ROWS = 3
+HEADER_HEIGHTS = {1: 60, 2: 20, 3: 20}
+
+# Limits of the content-based column widths
+MIN_WIDTH, MAX_WIDTH = 8, 50
+
+# Logo size in the banner cell
+LOGO_WIDTH, LOGO_HEIGHT = 150, 50
+
+_HEADER_FILL = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")  # Yellow
+_SECTION_FILL = PatternFill(start_color="92D050", end_color="92D050", fill_type="solid")  # Green
+_BORDER = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+_CENTER = Alignment(horizontal='center', vertical='center')
+_LEFT = Alignment(horizontal='left', vertical='center')
+
+# Every kind of cell in an MDR sheet: style name -> (font, fill, border, alignment)
+CELL_STYLES = {
+    'banner': (Font(size=8, color="000000"), _HEADER_FILL, _BORDER,
+               Alignment(horizontal='center', vertical='center', wrap_text=True)),
+    'banner_logo': (Font(size=8, color="000000"), _HEADER_FILL, _BORDER,
+                    Alignment(horizontal='center', vertical='bottom', wrap_text=True)),
+    'header': (Font(color="000000", bold=True, size=10), _HEADER_FILL, _BORDER, _CENTER),
+    'header_fill': (None, _HEADER_FILL, _BORDER, None),
+    'section': (Font(color="000000", bold=True, size=11), _SECTION_FILL, _BORDER, _LEFT),
+    'section_fill': (None, _SECTION_FILL, _BORDER, None),
+    'bold_center': (Font(bold=True), None, _BORDER, _CENTER),
+    'center': (None, None, _BORDER, _CENTER),
+    'left': (None, None, _BORDER, _LEFT),
+}
+
+
+def document_row(source, current_revision="", current_status=""):
+    """
+    Values of one document row after the S/No column
+    
+    source is anything with the Document field names (a Document or a
+    DocumentRecord); the current revision/status are passed in because the
+    two models name and default them differently.
+    """
+    values = [
+        source.doc_number or "",
+        source.doc_title or "",
+        current_revision or "",
+        current_status or "",
+        source.current_transmittal_no or "",
+    ]
+    for stage in STANDARD_STAGES:
+        stage_code_lower = stage['code'].lower()
+        for field_name in get_stage_fields(stage['has_next_rev']):
+            values.append(getattr(source, f"{stage_code_lower}_{field_name}", "") or "")
+    values.append(source.remarks or "")
+    return tuple(values)
+
+
+def stage_config_key():
+    """Hashable snapshot of the stage configuration the header block is built from"""
+    return (
+        tuple((stage['code'], stage['has_next_rev']) for stage in STANDARD_STAGES),
+        tuple(col['name'] for col in SUBMISSION_COLUMNS),
+        tuple(col['name'] for col in FEEDBACK_COLUMNS_BASE),
+    )
+
+
+def header_layout():
+    """The header block for the current stage configuration (see _build_header_layout)"""
+    return _build_header_layout(stage_config_key())
+
+
+@lru_cache(maxsize=4)
+def _build_header_layout(config_key):
+    """
+    The three header rows as a template: per-row (value, style) lists plus merged ranges
+    
+    Built once per process and stage configuration; every sheet clones the
+    rows into cells, with the banner text (A1) filled in per workbook.
+    """
+    col_pos = get_column_positions()
+    cells = {}
+    merges = []
+    
+    def put(row, col, value=None, style='header'):
+        cells[(row, col)] = (value, style)
+    
+    def merge(min_row, min_col, max_row, max_col):
+        merges.append(f"{get_column_letter(min_col)}{min_row}:{get_column_letter(max_col)}{max_row}")
+    
+    # Banner (logo / timestamp) across A-F in row 1
+    put(1, 1, None, 'banner')
+    for col in range(2, 7):
+        put(1, col, None, 'header_fill')
+    merge(1, 1, 1, 6)
+    
+    # S/No, Doc Number, Doc Title (rows 2-3 merged)
+    for col, text in [(1, "S/No"), (2, "Doc Number"), (3, "DOC Title")]:
+        put(2, col, text)
+        put(3, col, None, 'header_fill')
+        merge(2, col, 3, col)
+    
+    # Current Status (D-F)
+    current_col = col_pos['current_status_start']
+    put(2, current_col, "Current Status")
+    for col in range(current_col + 1, current_col + 3):
+        put(2, col, None, 'header_fill')
+    merge(2, current_col, 2, current_col + 2)
+    for i, text in enumerate(["Current Rev", "Status", "Current Transmittal No."]):
+        put(3, current_col + i, text)
+    
+    # Stage sections
+    for stage in STANDARD_STAGES:
+        stage_code = stage['code']
+        stage_col = col_pos[f"{stage_code.lower()}_start"]
+        feedback_cols = get_feedback_columns(stage['has_next_rev'])
+        
+        # Row 1: stage code over the submission columns, client feedback over the rest
+        stage_end_col = stage_col + len(SUBMISSION_COLUMNS) - 1
+        put(1, stage_col, stage_code)
+        for col in range(stage_col + 1, stage_end_col + 1):
+            put(1, col, None, 'header_fill')
+        merge(1, stage_col, 1, stage_end_col)
+        
+        feedback_start_col = stage_end_col + 1
+        feedback_end_col = feedback_start_col + len(feedback_cols) - 1
+        put(1, feedback_start_col, f"Client's Feedback ({stage_code} Stage)")
+        for col in range(feedback_start_col + 1, feedback_end_col + 1):
+            put(1, col, None, 'header_fill')
+        merge(1, feedback_start_col, 1, feedback_end_col)
+        
+        # Rows 2-3: date pair, then TR No. / Date Sent and the feedback columns merged vertically
+        put(2, stage_col, f"{stage_code} Date")
+        put(2, stage_col + 1, None, 'header_fill')
+        merge(2, stage_col, 2, stage_col + 1)
+        put(3, stage_col, "Planned")
+        put(3, stage_col + 1, "Actual")
+        
+        vertical = ["TR No.", "Date Sent"] + [col['name'] for col in feedback_cols]
+        for i, text in enumerate(vertical):
+            col = stage_col + 2 + i
+            put(2, col, text)
+            put(3, col, None, 'header_fill')
+            merge(2, col, 3, col)
+    
+    # Remarks (rows 1-3 merged)
+    remarks_col = col_pos['remarks']
+    put(1, remarks_col, "REMARKS")
+    put(2, remarks_col, None, 'header_fill')
+    put(3, remarks_col, None, 'header_fill')
+    merge(1, remarks_col, 3, remarks_col)
+    
+    rows = tuple(
+        tuple(cells.get((row, col), (None, None)) for col in range(1, remarks_col + 1))
+        for row in range(1, HEADER_ROWS + 1)
+    )
+    # Longest header text per column, the starting point for the column widths
+    widths = [0] * (remarks_col + 1)
+    for (row, col), (value, _) in cells.items():
+        if value:
+            widths[col] = max(widths[col], len(str(value)))
+    
+    return {'rows': rows, 'merges': tuple(merges), 'max_col': remarks_col, 'widths': tuple(widths)}
+
+
+def logo_image(path):
+    """
+    openpyxl Image of the logo at the banner size, or None when the file is missing
+    
+    The file is read and decoded once per process (and again only when it
+    changes on disk); each workbook gets its own Image over the cached bytes.
+    """
+    if not os.path.exists(path):
+        return None
+    data = _load_logo(os.path.abspath(path), os.path.getmtime(path))
+    img = Image(io.BytesIO(data))
+    img.width = LOGO_WIDTH
+    img.height = LOGO_HEIGHT
+    return img
+
+
+@lru_cache(maxsize=4)
+def _load_logo(path, mtime):
+    """Logo file contents, checked to be a readable image (needs Pillow)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    Image(io.BytesIO(data))
+    return data
+
+
+class MDRRenderer:
+    """Write an MDR sheet (headers, sections, documents) into a write-only worksheet"""
+    
+    def __init__(self, worksheet, banner="", logo_path=None, tracker=None):
+        self.worksheet = worksheet
+        self.banner = banner
+        self.logo_path = logo_path
+        self.tracker = tracker or ProgressTracker()
+        self.layout = header_layout()
+        self.max_col = self.layout['max_col']
+        
+        # Register each kind of cell style with the workbook once; every cell then shares it
+        self.styles = {name: self._style(*spec) for name, spec in CELL_STYLES.items()}
+        if logo_path:
+            self.styles['banner'] = self.styles['banner_logo']
+        # S/No, Doc Number, Title, ... , Remarks
+        self.column_styles = ([self.styles['bold_center']] * 2 + [self.styles['left']]
+                              + [self.styles['center']] * (self.max_col - 4) + [self.styles['left']])
+    
+    def _style(self, font, fill, border, alignment):
+        cell = WriteOnlyCell(self.worksheet)
+        if font:
+            cell.font = font
+        if fill:
+            cell.fill = fill
+        if border:
+            cell.border = border
+        if alignment:
+            cell.alignment = alignment
+        return cell._style
+    
+    def _cell(self, value, style):
+        cell = WriteOnlyCell(self.worksheet, value)
+        cell._style = style
+        return cell
+    
+    def render(self, items):
+        """Write the sheet; items are Section markers and document_row() tuples. Returns the document count"""
+        # Column widths have to be set before the first row is streamed
+        items = list(items)
+        self._set_column_widths(items)
+        self.tracker.phase('render', sum(1 for item in items if not isinstance(item, Section)))
+        
+        for row, height in HEADER_HEIGHTS.items():
+            self.worksheet.row_dimensions[row].height = height
+        for cell_range in self.layout['merges']:
+            self.worksheet.merged_cells.add(cell_range)
+        if self.logo_path:
+            self._add_logo()
+        
+        # Clone the header template; only the banner text differs between workbooks
+        for row_number, template in enumerate(self.layout['rows'], 1):
+            cells = [self._cell(value, self.styles[style]) if style else None for value, style in template]
+            if row_number == 1:
+                cells[0].value = self.banner
+            self.worksheet.append(cells)
+        
+        try:
+            documents = self._write_items(items)
+        except OperationCancelled:
+            # Finish the sheet's temporary part so the abandoned workbook is released cleanly
+            self.worksheet.close()
+            raise
+        
+        self.tracker.finish()
+        return documents
+    
+    def _write_items(self, items):
+        """Stream the section and document rows below the header"""
+        row = HEADER_ROWS
+        documents = 0
+        s_no = 0
+        last_col_letter = get_column_letter(self.max_col)
+        section_fill = self.styles['section_fill']
+        column_styles = self.column_styles[1:]
+        
+        for item in items:
+            if isinstance(item, Section):
+                if row > HEADER_ROWS:
+                    self.worksheet.append([])  # Space between sections
+                    row += 1
+                row += 1
+                self.worksheet.append([self._cell(item.name, self.styles['section'])]
+                                      + [self._cell(None, section_fill) for _ in range(self.max_col - 1)])
+                self.worksheet.merged_cells.add(f"A{row}:{last_col_letter}{row}")
+                s_no = 0
+            else:
+                row += 1
+                s_no += 1
+                documents += 1
+                self.tracker.advance()
+                self.worksheet.append([self._cell(s_no, self.column_styles[0])]
+                                      + [self._cell(value, style) for value, style in zip(item, column_styles)])
+        
+        return documents
+    
+    def _set_column_widths(self, items):
+        """Content-based widths (min 8, max 50) with fixed S/No, title and remarks columns"""
+        longest = list(self.layout['widths'])
+        
+        for item in items:
+            if isinstance(item, Section):
+                longest[1] = max(longest[1], len(item.name))
+                continue
+            for col, value in enumerate(item, 2):
+                if value:
+                    length = len(str(value))
+                    if length > longest[col]:
+                        longest[col] = length
+        
+        for col in range(1, self.max_col + 1):
+            if longest[col]:
+                self.worksheet.column_dimensions[get_column_letter(col)].width = \
+                    min(max(longest[col] + 2, MIN_WIDTH), MAX_WIDTH)
+        
+        self.worksheet.column_dimensions['A'].width = 8    # S/No
+        self.worksheet.column_dimensions['C'].width = 40   # DOC Title
+        self.worksheet.column_dimensions[get_column_letter(self.max_col)].width = 30  # REMARKS
+    
+    def _add_logo(self):
+        """Add the logo to the banner cell (optional: needs the file and Pillow)"""
+        try:
+            img = logo_image(self.logo_path)
+            if img is None:
+                print(f"Warning: Logo file '{self.logo_path}' not found. Skipping logo insertion.")
+                return
+            img.anchor = 'A1'
+            self.worksheet.add_image(img)
+        except Exception as e:
+            print(f"Warning: Could not add logo to header: {str(e)}")
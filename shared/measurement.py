@@ -0,0 +1,253 @@
+"""
+Progress measurement
+Weighted % complete and planned-vs-actual S-curves per portfolio and discipline.
+A portfolio's parsed stage dates (the stage_dates table) are loaded into
+documents x stages arrays of day numbers. A document earns the cumulative weight
+of the latest stage issued (STAGE_PROGRESS_WEIGHTS), so the curves are binned,
+cumulated sums of per-stage weight increments - computed with NumPy, without
+a Python loop over documents.
+"""
+
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+from sqlalchemy import select
+
+from shared.models import db, Document, Discipline, StageDate
+from mdr_stages_config import STANDARD_STAGES, STAGE_PROGRESS_WEIGHTS
+
+STAGE_CODES = [stage['code'] for stage in STANDARD_STAGES]
+STAGE_INDEX = {code: i for i, code in enumerate(STAGE_CODES)}
+PERIODS = ('day', 'week', 'month')
+
+# Day number (date.toordinal) standing for "no date"
+NO_DATE = np.iinfo(np.int64).max
+_EPOCH = date(1970, 1, 1).toordinal()
+
+
+class StageMatrix(namedtuple('StageMatrix', 'document_ids discipline_index disciplines planned actual')):
+    """
+    A portfolio's stage dates as arrays
+    
+    document_ids (n,) sorted ids; discipline_index (n,) positions in disciplines,
+    a list of (discipline id or None, name); planned and actual (n, stages) day
+    numbers, NO_DATE where a stage has no date.
+    """
+    
+    __slots__ = ()
+
+
+def parse_weights(text):
+    """Stage weights from 'IFR:10,IFD:30,AFC:100'; raises ValueError when malformed"""
+    weights = {}
+    for part in filter(None, (part.strip() for part in text.split(','))):
+        code, sep, value = part.partition(':')
+        if not sep:
+            raise ValueError(f"Invalid stage weight {part!r}, expected STAGE:PERCENT")
+        try:
+            weights[code.strip().upper()] = float(value)
+        except ValueError:
+            raise ValueError(f"Invalid stage weight {part!r}, expected STAGE:PERCENT") from None
+    return weights
+
+
+def stage_weights(weights=None):
+    """
+    Cumulative % complete per stage, in STAGE_CODES order
+    
+    weights maps stage codes to the cumulative percentage earned once the stage
+    is issued (default STAGE_PROGRESS_WEIGHTS); stages left out keep the value of
+    the stage before. Raises ValueError for unknown stages or decreasing values.
+    """
+    weights = STAGE_PROGRESS_WEIGHTS if weights is None else weights
+    unknown = set(weights) - set(STAGE_CODES)
+    if unknown:
+        raise ValueError(f"Unknown stage(s) in weights: {', '.join(sorted(unknown))}")
+    values = []
+    current = 0.0
+    for code in STAGE_CODES:
+        if code in weights:
+            value = float(weights[code])
+            if not current <= value <= 100:
+                raise ValueError("Stage weights must be cumulative percentages between 0 and 100")
+            current = value
+        values.append(current)
+    return np.array(values)
+
+
+def load_stage_matrix(portfolio_id, session=None):
+    """StageMatrix of a portfolio: every document, with the planned/actual dates from stage_dates"""
+    session = session or db.session
+    documents = session.execute(
+        select(Document.id, Document.discipline_id)
+        .where(Document.portfolio_id == portfolio_id)
+        .order_by(Document.id)
+    ).all()
+    names = dict(session.execute(
+        select(Discipline.id, Discipline.name).where(Discipline.portfolio_id == portfolio_id)
+    ).all())
+    
+    document_ids = np.array([document_id for document_id, _ in documents], dtype=np.int64)
+    discipline_ids = [discipline_id if discipline_id in names else None for _, discipline_id in documents]
+    keys = sorted(set(discipline_ids), key=lambda d: (d is None, names.get(d, '')))
+    position = {key: i for i, key in enumerate(keys)}
+    discipline_index = np.array([position[d] for d in discipline_ids], dtype=np.int64)
+    disciplines = [(key, names.get(key, 'Unassigned')) for key in keys]
+    
+    planned = np.full((len(documents), len(STAGE_CODES)), NO_DATE, dtype=np.int64)
+    actual = planned.copy()
+    rows = session.execute(
+        select(StageDate.document_id, StageDate.stage, StageDate.planned, StageDate.actual)
+        .where(StageDate.portfolio_id == portfolio_id)
+    ).all()
+    if rows and len(document_ids):
+        ids, stages, planned_dates, actual_dates = zip(*rows)
+        rows_index = np.searchsorted(document_ids, np.array(ids, dtype=np.int64))
+        rows_index = np.minimum(rows_index, len(document_ids) - 1)
+        # Rows of documents created after the document query are ignored
+        present = document_ids[rows_index] == np.array(ids, dtype=np.int64)
+        stage_index = np.array([STAGE_INDEX.get(stage, -1) for stage in stages])
+        present &= stage_index >= 0
+        for target, values in ((planned, planned_dates), (actual, actual_dates)):
+            days = np.array([value.toordinal() if value else NO_DATE for value in values], dtype=np.int64)
+            target[rows_index[present], stage_index[present]] = days[present]
+    
+    return StageMatrix(document_ids, discipline_index, disciplines, planned, actual)
+
+
+def _earned_on(days):
+    """Day each stage's credit is earned: issuing a later stage also earns the earlier ones"""
+    return np.minimum.accumulate(days[:, ::-1], axis=1)[:, ::-1]
+
+
+def _periods(first, last, period):
+    """(start, end) day numbers of the periods covering first..last"""
+    if period == 'day':
+        starts = np.arange(first, last + 1, dtype=np.int64)
+        return starts, starts
+    if period == 'week':
+        # Weeks start on Monday; day number 1 (0001-01-01) was a Monday
+        starts = np.arange(first - (first - 1) % 7, last + 1, 7, dtype=np.int64)
+        return starts, starts + 6
+    months = np.arange(np.datetime64(date.fromordinal(first), 'M'),
+                       np.datetime64(date.fromordinal(last), 'M') + 2)
+    bounds = months.astype('datetime64[D]').astype(np.int64) + _EPOCH
+    return bounds[:-1], bounds[1:] - 1
+
+
+def _curves(earned_on, increments, ends, discipline_index, n_disciplines):
+    """Cumulative earned % points per discipline and period end, shape (disciplines, periods)"""
+    credited = (earned_on != NO_DATE) & (increments > 0)
+    days = earned_on[credited]
+    bins = np.searchsorted(ends, days, side='left')
+    groups = np.broadcast_to(discipline_index[:, None], earned_on.shape)[credited]
+    amounts = np.broadcast_to(increments, earned_on.shape)[credited]
+    flat = np.bincount(groups * len(ends) + bins, weights=amounts, minlength=n_disciplines * len(ends))
+    return flat.reshape(n_disciplines, len(ends)).cumsum(axis=1)
+
+
+def _to_date(earned_on, increments, today, discipline_index, n_disciplines):
+    """Earned % points per discipline as of today"""
+    per_document = (earned_on <= today) @ increments
+    return np.bincount(discipline_index, weights=per_document, minlength=n_disciplines)
+
+
+def s_curves(matrix, weights=None, period='week', today=None):
+    """
+    Planned and actual cumulative % complete of a StageMatrix per period
+    
+    Returns a JSON-ready dict: the period end dates, and for the portfolio and
+    each discipline the document count, planned and actual curves (% of its
+    documents; the actual curve stops at the period holding today) and the
+    planned/actual % complete as of today.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period {period!r}; use one of {', '.join(PERIODS)}")
+    increments = np.diff(stage_weights(weights), prepend=0.0)
+    today = today or date.today()
+    today_number = today.toordinal()
+    planned = _earned_on(matrix.planned)
+    actual = _earned_on(matrix.actual)
+    n_disciplines = len(matrix.disciplines)
+    counts = np.bincount(matrix.discipline_index, minlength=n_disciplines)
+    total = len(matrix.document_ids)
+    
+    known = np.concatenate([planned[planned != NO_DATE], actual[actual != NO_DATE]])
+    if len(known):
+        starts, ends = _periods(int(known.min()), int(known.max()), period)
+    else:
+        starts = ends = np.array([], dtype=np.int64)
+    planned_curves = _curves(planned, increments, ends, matrix.discipline_index, n_disciplines)
+    actual_curves = _curves(actual, increments, ends, matrix.discipline_index, n_disciplines)
+    planned_now = _to_date(planned, increments, today_number, matrix.discipline_index, n_disciplines)
+    actual_now = _to_date(actual, increments, today_number, matrix.discipline_index, n_disciplines)
+    reported = int(np.searchsorted(starts, today_number, side='right'))
+    
+    def entry(documents, planned_points, actual_points, planned_to_date, actual_to_date):
+        scale = 1.0 / documents if documents else 0.0
+        return {
+            'documents': int(documents),
+            'planned': np.round(planned_points * scale, 2).tolist(),
+            'actual': np.round(actual_points[:reported] * scale, 2).tolist(),
+            'planned_to_date': round(float(planned_to_date) * scale, 2),
+            'actual_to_date': round(float(actual_to_date) * scale, 2),
+        }
+    
+    result = {
+        'period': period,
+        'as_of': today.isoformat(),
+        'weights': dict(zip(STAGE_CODES, stage_weights(weights).tolist())),
+        'dates': [date.fromordinal(int(end)).isoformat() for end in ends],
+        'portfolio': entry(total, planned_curves.sum(axis=0), actual_curves.sum(axis=0),
+                           planned_now.sum(), actual_now.sum()),
+        'disciplines': [],
+    }
+    for i, (discipline_id, name) in enumerate(matrix.disciplines):
+        result['disciplines'].append(dict(
+            entry(counts[i], planned_curves[i], actual_curves[i], planned_now[i], actual_now[i]),
+            discipline_id=discipline_id, name=name))
+    return result
+
+
+def portfolio_progress(portfolio_id, weights=None, period='week', today=None, session=None):
+    """S-curves and % complete of a portfolio (see s_curves)"""
+    result = s_curves(load_stage_matrix(portfolio_id, session), weights, period, today)
+    result['portfolio_id'] = portfolio_id
+    return result
+
+
+def write_progress_sheet(worksheet, progress, title):
+    """Append a progress report (portfolio_progress result) to a write-only worksheet"""
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    
+    def bold(*values):
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(worksheet, value=value)
+            cell.font = Font(bold=True)
+            cells.append(cell)
+        return cells
+    
+    worksheet.append(bold(f"Progress Measurement - {title}"))
+    weights = ", ".join(f"{code} {value:g}%" for code, value in progress['weights'].items())
+    worksheet.append([f"As of {progress['as_of']}; cumulative stage weights: {weights}"])
+    worksheet.append([])
+    
+    entries = [('Portfolio', progress['portfolio'])] + [(d['name'], d) for d in progress['disciplines']]
+    worksheet.append(bold('Discipline', 'Documents', 'Planned % to date', 'Actual % to date', 'Variance %'))
+    for name, entry in entries:
+        worksheet.append([name, entry['documents'], entry['planned_to_date'], entry['actual_to_date'],
+                          round(entry['actual_to_date'] - entry['planned_to_date'], 2)])
+    worksheet.append([])
+    
+    header = ['Period end']
+    for name, _ in entries:
+        header += [f"{name} planned %", f"{name} actual %"]
+    worksheet.append(bold(*header))
+    for i, end in enumerate(progress['dates']):
+        row = [date.fromisoformat(end)]
+        for _, entry in entries:
+            row += [entry['planned'][i], entry['actual'][i] if i < len(entry['actual']) else None]
+        worksheet.append(row)
@@ -4,9 +4,19 @@ All three Flask apps share these models via the same SQLite database
 """
 
 from datetime import datetime
+from functools import partial
+from itertools import chain
+from collections.abc import Mapping
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, insert, select, update, delete, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from shared.status import classify
+from shared.dates import stage_date_values, PARSED_STAGE_FIELDS
+from mdr_stages_config import STANDARD_STAGES
+
 db = SQLAlchemy()
 
 
@@ -53,9 +63,12 @@ class Portfolio(db.Model):
     client = db.Column(db.String(255))  # Client/customer name
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Working-day calendar (None: Monday to Friday without holidays)
+    calendar_id = db.Column(db.Integer, db.ForeignKey('work_calendars.id', ondelete='SET NULL'))
     
     # Relationships
     creator = db.relationship('User', back_populates='created_portfolios', foreign_keys=[created_by])
+    calendar = db.relationship('WorkCalendar', back_populates='portfolios')
     disciplines = db.relationship('Discipline', back_populates='portfolio', cascade='all, delete-orphan')
     documents = db.relationship('Document', back_populates='portfolio', cascade='all, delete-orphan')
     
@@ -121,6 +134,13 @@ class Document(db.Model):
     current_transmittal_no = db.Column(db.String(100))
     remarks = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Portfolio version of the last change to this document (see documents_changed_since)
+    change_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Derived from current_status and the stage dates on every flush (see shared.status)
+    status_code = db.Column(db.String(20))
+    current_stage = db.Column(db.String(10))
+    feedback_stage = db.Column(db.String(10))
+    board_column = db.Column(db.String(20))
     
     # IFR (Information For Review) fields
     ifr_date_planned = db.Column(db.String(50))
@@ -213,6 +233,17 @@ class Document(db.Model):
     discipline = db.relationship('Discipline', back_populates='documents')
     submissions = db.relationship('Submission', back_populates='document', cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.Index('ix_documents_portfolio_change', 'portfolio_id', 'change_version'),
+        # Keyset pagination by doc number (document lists, APIs)
+        db.Index('ix_documents_portfolio_number', 'portfolio_id', 'doc_number', 'id'),
+        db.Index('ix_documents_discipline_number', 'discipline_id', 'doc_number', 'id'),
+        # Dashboard counters, kanban board and feedback filters
+        db.Index('ix_documents_discipline_status', 'discipline_id', 'status_code'),
+        db.Index('ix_documents_discipline_board', 'discipline_id', 'board_column'),
+        db.Index('ix_documents_discipline_feedback', 'discipline_id', 'feedback_stage'),
+    )
+    
     def __repr__(self):
         return f'<Document {self.doc_number}: {self.doc_title}>'
 
@@ -241,8 +272,456 @@ class Submission(db.Model):
     
     __table_args__ = (
         db.CheckConstraint("stage IN ('IFR','IFH','IFD','IFT','IFP','IFA','IFC','AFC')", name='check_submission_stage'),
+        # Matching client feedback to the submission it answers
+        db.Index('ix_submissions_document_stage', 'document_id', 'stage', 'date_sent'),
     )
     
     def __repr__(self):
         return f'<Submission {self.stage} for doc={self.document_id}>'
 
+
+class ClientTurnaround(db.Model):
+    """Materialized days-with-client statistics per client and stage (see shared.turnaround)"""
+    __tablename__ = 'client_turnarounds'
+    
+    # Portfolio.client ('' for portfolios without one)
+    client = db.Column(db.String(255), primary_key=True)
+    stage = db.Column(db.String(10), primary_key=True)
+    # Answered submissions and their working days with the client
+    samples = db.Column(db.Integer, nullable=False, default=0)
+    mean_days = db.Column(db.Float)
+    p90_days = db.Column(db.Float)
+    # Submissions still waiting for a reply
+    outstanding = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ClientTurnaround {self.client} {self.stage} mean={self.mean_days} p90={self.p90_days}>'
+
+
+class WorkCalendar(db.Model):
+    """Working days of a client or region: a weekly pattern plus holidays (see shared.calendars)"""
+    __tablename__ = 'work_calendars'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    name = db.Column(db.String(255), nullable=False, unique=True)
+    # numpy weekmask, Monday first: '1111100' works Monday to Friday
+    weekmask = db.Column(db.String(7), nullable=False, default='1111100')
+    # Bumped whenever the calendar or its holidays change; compiled calendars are cached per version
+    version = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    holidays = db.relationship('CalendarHoliday', back_populates='calendar', cascade='all, delete-orphan',
+                               order_by='CalendarHoliday.day')
+    portfolios = db.relationship('Portfolio', back_populates='calendar')
+    
+    def __repr__(self):
+        return f'<WorkCalendar {self.name} {self.weekmask} v{self.version}>'
+
+
+class CalendarHoliday(db.Model):
+    """Non-working day of a calendar"""
+    __tablename__ = 'calendar_holidays'
+    
+    calendar_id = db.Column(db.Integer, db.ForeignKey('work_calendars.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    name = db.Column(db.String(255))
+    
+    # Relationships
+    calendar = db.relationship('WorkCalendar', back_populates='holidays')
+    
+    def __repr__(self):
+        return f'<CalendarHoliday {self.day} {self.name}>'
+
+
+class StageDate(db.Model):
+    """
+    Parsed planned/actual date of one document stage
+    
+    Typed copy of the free-form *_date_planned/*_date_actual strings, written on
+    flush (see refresh_stage_dates) so overdue queries can use date ranges.
+    """
+    __tablename__ = 'stage_dates'
+    
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='CASCADE'), primary_key=True)
+    stage = db.Column(db.String(10), primary_key=True)
+    portfolio_id = db.Column(db.Integer, nullable=False)
+    discipline_id = db.Column(db.Integer)
+    planned = db.Column(db.Date)
+    actual = db.Column(db.Date)
+    # An actual date was entered (even one that could not be parsed)
+    done = db.Column(db.Boolean, nullable=False, default=False)
+    
+    __table_args__ = (
+        # Open stages by planned date: overdue = not done and planned < today
+        db.Index('ix_stage_dates_portfolio_open', 'portfolio_id', 'done', 'planned'),
+        db.Index('ix_stage_dates_discipline_open', 'discipline_id', 'done', 'planned'),
+    )
+    
+    def __repr__(self):
+        return f'<StageDate doc={self.document_id} {self.stage} planned={self.planned} actual={self.actual}>'
+
+
+class SummaryCounts:
+    """Document counters shared by the portfolio and discipline summaries (see shared.summary)"""
+    
+    documents = db.Column(db.Integer, nullable=False, default=0)
+    # Per status_code
+    draft = db.Column(db.Integer, nullable=False, default=0)
+    in_progress = db.Column(db.Integer, nullable=False, default=0)
+    submitted = db.Column(db.Integer, nullable=False, default=0)
+    client_review = db.Column(db.Integer, nullable=False, default=0)
+    approved = db.Column(db.Integer, nullable=False, default=0)
+    afc = db.Column(db.Integer, nullable=False, default=0)
+    # In the kanban Client Review column
+    awaiting_client = db.Column(db.Integer, nullable=False, default=0)
+    # With a client reply for some stage
+    requires_attention = db.Column(db.Integer, nullable=False, default=0)
+    # With an overdue stage as of the as_of date
+    overdue = db.Column(db.Integer, nullable=False, default=0)
+    # Documents with an actual date per stage
+    ifr_completed = db.Column(db.Integer, nullable=False, default=0)
+    ifh_completed = db.Column(db.Integer, nullable=False, default=0)
+    ifd_completed = db.Column(db.Integer, nullable=False, default=0)
+    ift_completed = db.Column(db.Integer, nullable=False, default=0)
+    ifp_completed = db.Column(db.Integer, nullable=False, default=0)
+    ifa_completed = db.Column(db.Integer, nullable=False, default=0)
+    ifc_completed = db.Column(db.Integer, nullable=False, default=0)
+    afc_completed = db.Column(db.Integer, nullable=False, default=0)
+    as_of = db.Column(db.Date)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class PortfolioSummary(SummaryCounts, db.Model):
+    """Materialized document counts of a portfolio, kept current on flush"""
+    __tablename__ = 'portfolio_summary'
+    
+    portfolio_id = db.Column(db.Integer, db.ForeignKey('portfolios.id', ondelete='CASCADE'), primary_key=True)
+    disciplines = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<PortfolioSummary portfolio={self.portfolio_id} documents={self.documents}>'
+
+
+class DisciplineSummary(SummaryCounts, db.Model):
+    """Materialized document counts of one discipline; discipline_id 0 holds the unassigned documents"""
+    __tablename__ = 'discipline_summary'
+    
+    portfolio_id = db.Column(db.Integer, db.ForeignKey('portfolios.id', ondelete='CASCADE'), primary_key=True)
+    discipline_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    
+    def __repr__(self):
+        return f'<DisciplineSummary portfolio={self.portfolio_id} discipline={self.discipline_id}>'
+
+
+class PortfolioVersion(db.Model):
+    """Change counter per portfolio, bumped whenever its documents or disciplines change"""
+    __tablename__ = 'portfolio_versions'
+    
+    portfolio_id = db.Column(db.Integer, db.ForeignKey('portfolios.id', ondelete='CASCADE'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<PortfolioVersion portfolio={self.portfolio_id} v{self.version}>'
+
+
+def get_portfolio_version(portfolio_id, session=None):
+    """Current version of a portfolio (0 if it never changed since creation)"""
+    session = session or db.session
+    version = session.query(PortfolioVersion.version).filter_by(portfolio_id=portfolio_id).scalar()
+    return version or 0
+
+
+# INSERT constructs with ON CONFLICT support, by dialect name
+_DIALECT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def bump_portfolio_version(session, portfolio_id):
+    """
+    Increment a portfolio's version in the current transaction; returns the new version
+    
+    Called automatically on flush for ORM changes; call it explicitly for bulk
+    INSERT/UPDATE statements, which bypass the flush hook, and set the rows'
+    change_version to the returned version.
+    """
+    # One atomic upsert: concurrent writers never lose a bump, and two first
+    # bumps of a portfolio never both insert its row
+    table = PortfolioVersion.__table__
+    now = datetime.utcnow()
+    upsert = (_DIALECT_INSERTS[session.get_bind().dialect.name](table)
+              .values(portfolio_id=portfolio_id, version=1, changed_at=now))
+    upsert = upsert.on_conflict_do_update(index_elements=[table.c.portfolio_id],
+                                          set_={'version': table.c.version + 1, 'changed_at': now})
+    return session.execute(upsert.returning(table.c.version)).scalar()
+
+
+def documents_changed_since(portfolio_id, version, session=None):
+    """
+    Change feed: (id, discipline name, doc number, title, current status) of the
+    documents added or modified after the given portfolio version
+    
+    Deleted documents are not listed; compare the document count to notice them.
+    """
+    session = session or db.session
+    return session.execute(
+        select(Document.id, Discipline.name, Document.doc_number, Document.doc_title, Document.current_status)
+        .outerjoin(Discipline, Document.discipline_id == Discipline.id)
+        .where(Document.portfolio_id == portfolio_id, Document.change_version > version)
+        .order_by(Document.id)
+    ).all()
+
+
+@event.listens_for(Session, 'before_flush')
+def _classify_changed_documents(session, flush_context, instances):
+    """Recompute the derived status columns of new and modified documents"""
+    for obj in chain(session.new, session.dirty):
+        if isinstance(obj, Document) and obj not in session.deleted:
+            classify(obj)
+
+
+# Document columns the stage_dates rows are computed from
+STAGE_DATE_SOURCES = ['portfolio_id', 'discipline_id'] + [
+    f"{stage['code'].lower()}_{field}" for stage in STANDARD_STAGES for field in PARSED_STAGE_FIELDS
+]
+
+
+def refresh_stage_dates(connection, documents):
+    """
+    Rewrite the stage_dates rows of documents (Document objects or row mappings
+    with id, portfolio_id, discipline_id and the stage date fields)
+    
+    Runs automatically after every flush; call it for documents written with bulk
+    INSERT/UPDATE statements.
+    """
+    rows = []
+    document_ids = []
+    for document in documents:
+        get = document.get if isinstance(document, Mapping) else partial(getattr, document)
+        document_ids.append(get('id'))
+        rows.extend(dict(values, document_id=get('id'), portfolio_id=get('portfolio_id'),
+                         discipline_id=get('discipline_id'))
+                    for values in stage_date_values(get))
+    if document_ids:
+        connection.execute(delete(StageDate.__table__).where(StageDate.__table__.c.document_id.in_(document_ids)))
+    if rows:
+        connection.execute(insert(StageDate.__table__), rows)
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_stage_date_changes(session, flush_context, instances):
+    """Remember the documents whose stage_dates rows this flush makes stale"""
+    changed = [obj for obj in session.new if isinstance(obj, Document)]
+    for obj in session.dirty:
+        if isinstance(obj, Document) and obj not in session.deleted:
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in STAGE_DATE_SOURCES):
+                changed.append(obj)
+    session.info['stage_dates_changed'] = changed
+    # Deleted rows by owner; documents deleted by cascade are only covered through their portfolio
+    deleted = {Document: [], Portfolio: [], Discipline: []}
+    for obj in session.deleted:
+        if type(obj) in deleted and obj.id is not None:
+            deleted[type(obj)].append(obj.id)
+    session.info['stage_dates_deleted'] = deleted
+
+
+@event.listens_for(Session, 'after_flush')
+def _write_stage_dates(session, flush_context):
+    """Bring stage_dates in line with the documents just flushed"""
+    changed = session.info.pop('stage_dates_changed', [])
+    deleted = session.info.pop('stage_dates_deleted', {})
+    table = StageDate.__table__
+    connection = session.connection()
+    if deleted.get(Document):
+        connection.execute(delete(table).where(table.c.document_id.in_(deleted[Document])))
+    if deleted.get(Portfolio):
+        connection.execute(delete(table).where(table.c.portfolio_id.in_(deleted[Portfolio])))
+    if deleted.get(Discipline):
+        connection.execute(update(table).where(table.c.discipline_id.in_(deleted[Discipline]))
+                           .values(discipline_id=None))
+    if changed:
+        refresh_stage_dates(connection, changed)
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_summary_changes(session, flush_context, instances):
+    """Remember which portfolio/discipline summaries this flush makes stale"""
+    groups = set()      # (portfolio_id, discipline_id) known before the flush
+    documents = []      # new and changed documents, resolved after the flush
+    portfolios = []     # new portfolios and changed disciplines: recompute the whole portfolio
+    deleted = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, Document):
+            if obj in session.deleted:
+                groups.add((obj.portfolio_id, obj.discipline_id))
+                continue
+            # A moved document also changes the group it left
+            state = inspect(obj)
+            old_portfolio = state.attrs.portfolio_id.history.deleted
+            old_discipline = state.attrs.discipline_id.history.deleted
+            if old_portfolio or old_discipline:
+                groups.add((old_portfolio[0] if old_portfolio else obj.portfolio_id,
+                            old_discipline[0] if old_discipline else obj.discipline_id))
+            documents.append(obj)
+        elif isinstance(obj, Discipline):
+            portfolios.append(obj)
+        elif isinstance(obj, Portfolio):
+            if obj in session.deleted:
+                deleted.add(obj.id)
+            elif obj in session.new:
+                portfolios.append(obj)
+    session.info['summary_changes'] = (groups, documents, portfolios, deleted)
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_summaries(session, flush_context):
+    """Recompute the summaries touched by this flush (after stage_dates are written)"""
+    groups, documents, portfolios, deleted = session.info.pop('summary_changes', (set(), [], [], set()))
+    if not (groups or documents or portfolios or deleted):
+        return
+    from shared.summary import refresh_summaries, delete_summaries
+    
+    groups.update((document.portfolio_id, document.discipline_id) for document in documents)
+    whole = {obj.portfolio_id if isinstance(obj, Discipline) else obj.id for obj in portfolios}
+    connection = session.connection()
+    if deleted:
+        delete_summaries(connection, deleted)
+    for portfolio_id in whole - deleted - {None}:
+        refresh_summaries(connection, portfolio_id)
+    by_portfolio = {}
+    for portfolio_id, discipline_id in groups:
+        by_portfolio.setdefault(portfolio_id, set()).add(discipline_id)
+    for portfolio_id, discipline_ids in by_portfolio.items():
+        if portfolio_id not in whole and portfolio_id not in deleted and portfolio_id is not None:
+            refresh_summaries(connection, portfolio_id, discipline_ids)
+
+
+@event.listens_for(Session, 'before_flush')
+def _bump_changed_portfolios(session, flush_context, instances):
+    """Bump the version of every portfolio touched by this flush and stamp its changed documents"""
+    touched = set()
+    documents = []
+    deleted = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, Portfolio):
+            if obj in session.deleted:
+                if obj.id is not None:
+                    deleted.add(obj.id)
+                continue
+            portfolio_id = obj.id
+        elif isinstance(obj, (Document, Discipline)):
+            portfolio_id = obj.portfolio_id or (obj.portfolio.id if obj.portfolio else None)
+        else:
+            continue
+        # New portfolios have no id yet; they start at version 0
+        if portfolio_id is not None:
+            touched.add(portfolio_id)
+            if isinstance(obj, Document) and obj not in session.deleted:
+                documents.append((portfolio_id, obj))
+    
+    versions = {portfolio_id: bump_portfolio_version(session, portfolio_id)
+                for portfolio_id in sorted(touched - deleted)}
+    for portfolio_id, document in documents:
+        document.change_version = versions[portfolio_id]
+    
+    # SQLite reuses the ids of deleted portfolios: a new one must start at version 0
+    # without the old counter, and without the old one's cached exports (after commit)
+    if deleted:
+        session.execute(delete(PortfolioVersion).where(PortfolioVersion.portfolio_id.in_(sorted(deleted))))
+        session.info.setdefault('deleted_portfolios', set()).update(deleted)
+
+
+@event.listens_for(Session, 'after_commit')
+def _remove_deleted_artifacts(session):
+    """Delete the cached exports of the portfolios this transaction deleted"""
+    deleted = session.info.pop('deleted_portfolios', None)
+    if not deleted:
+        return
+    from shared.jobs import remove_artifacts
+    
+    for portfolio_id in sorted(deleted):
+        remove_artifacts(portfolio_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _keep_rolled_back_artifacts(session):
+    """Rolled-back deletes leave the portfolio and its cached exports in place"""
+    session.info.pop('deleted_portfolios', None)
+
+
+# Document and Submission columns the submissions' turnaround is computed from
+FEEDBACK_SOURCES = [f"{stage['code'].lower()}_{field}" for stage in STANDARD_STAGES
+                    for field in ('date_received', 'rev_status')]
+SUBMISSION_SOURCES = ['document_id', 'stage', 'date_sent', 'response_date']
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_feedback_changes(session, flush_context, instances):
+    """Remember the documents and submissions whose client turnaround this flush makes stale"""
+    documents = []      # client feedback written onto existing documents (new ones have no submissions)
+    submissions = []    # resolved to ids after the flush
+    clients = set()     # of deleted submissions and renamed or deleted portfolios
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Portfolio):
+            if obj in session.deleted:
+                clients.add(obj.client or '')
+            elif obj in session.dirty:
+                # Rows are keyed by client name: refresh the old and the new one
+                history = inspect(obj).attrs.client.history
+                if history.has_changes():
+                    old = history.deleted or [session.execute(
+                        select(Portfolio.client).where(Portfolio.id == obj.id)).scalar()]
+                    clients.update(client or '' for client in chain(old, history.added))
+        elif isinstance(obj, Document):
+            if obj in session.dirty and obj not in session.deleted:
+                state = inspect(obj)
+                if any(state.attrs[field].history.has_changes() for field in FEEDBACK_SOURCES):
+                    documents.append(obj)
+        elif isinstance(obj, Submission):
+            if obj in session.deleted:
+                portfolio = obj.document.portfolio if obj.document else None
+                if portfolio is not None:
+                    clients.add(portfolio.client or '')
+            elif obj in session.new or any(inspect(obj).attrs[field].history.has_changes()
+                                           for field in SUBMISSION_SOURCES):
+                submissions.append(obj)
+    session.info['feedback_changes'] = (documents, submissions, clients)
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_turnarounds(session, flush_context):
+    """Match feedback to submissions and refresh the client turnarounds touched by this flush"""
+    documents, submissions, clients = session.info.pop('feedback_changes', ([], [], set()))
+    if not (documents or submissions or clients):
+        return
+    from shared.turnaround import update_turnarounds
+    
+    update_turnarounds(session, {document.id for document in documents},
+                       {submission.id for submission in submissions}, clients)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_changed_calendars(session, flush_context):
+    """Bump the version of calendars whose weekmask or holidays this flush changed"""
+    changed = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, CalendarHoliday):
+            calendar_id = obj.calendar_id or (obj.calendar.id if obj.calendar else None)
+        elif isinstance(obj, WorkCalendar) and obj not in session.new and session.is_modified(obj):
+            calendar_id = obj.id
+        else:
+            continue
+        if calendar_id is not None:
+            changed.add(calendar_id)
+    if changed:
+        session.connection().execute(
+            update(WorkCalendar.__table__)
+            .where(WorkCalendar.__table__.c.id.in_(changed))
+            .values(version=WorkCalendar.__table__.c.version + 1)
+        )
@@ -0,0 +1,261 @@
+"""
+Per-discipline multi-sheet MDR export
+Each discipline sheet is rendered in its own worker process; the sheets are
+then assembled into a single workbook package with a summary sheet in front.
+
+openpyxl cannot merge workbooks, so the assembly works on the .xlsx package:
+the main process builds the summary and one empty placeholder sheet per
+discipline, saves the package and swaps each placeholder's sheet XML for the
+one rendered by a worker. Cell style indices are remapped on the way in,
+because every worker numbers its styles independently.
+"""
+
+import io
+import re
+import time
+import zipfile
+from datetime import datetime
+
+import openpyxl
+from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.worksheet.hyperlink import Hyperlink
+from sqlalchemy import func
+
+from shared.models import db, Portfolio, Discipline, Document
+from shared.excel_handler import MDRExcelExporter
+from shared.jobs import run_pool, init_worker
+
+UNASSIGNED = "Unassigned"
+
+# Custom number formats are numbered from 164 in styles.xml
+_FIRST_CUSTOM_NUMFMT = 164
+
+_CELL_STYLE_RE = re.compile(rb'(<c\b[^>]*?\ss=")(\d+)(")')
+_COL_STYLE_RE = re.compile(rb'(<col\b[^>]*?\sstyle=")(\d+)(")')
+
+
+def sheet_title(name, used):
+    """Excel-safe, unique worksheet title (max 31 chars, no []:*?/\\)"""
+    title = re.sub(r'[\[\]:*?/\\]', '-', name).strip("'") or UNASSIGNED
+    title = title[:31]
+    candidate, n = title, 2
+    while candidate.lower() in used:
+        suffix = f" ({n})"
+        candidate = title[:31 - len(suffix)] + suffix
+        n += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def _style_table(workbook):
+    """Describe every cell style of a saved workbook by value, so another workbook can register it"""
+    table = []
+    for style in workbook._cell_styles:
+        if style.numFmtId >= _FIRST_CUSTOM_NUMFMT:
+            number_format = workbook._number_formats[style.numFmtId - _FIRST_CUSTOM_NUMFMT]
+        else:
+            number_format = style.numFmtId
+        table.append({
+            'font': workbook._fonts[style.fontId],
+            'fill': workbook._fills[style.fillId],
+            'border': workbook._borders[style.borderId],
+            'alignment': workbook._alignments[style.alignmentId],
+            'protection': workbook._protections[style.protectionId],
+            'number_format': number_format,
+            'quote_prefix': style.quotePrefix,
+            'pivot_button': style.pivotButton,
+        })
+    return table
+
+
+def _register_styles(workbook, table):
+    """Add a worker's style table to workbook; returns worker style index -> workbook style index"""
+    mapping = []
+    for entry in table:
+        style = StyleArray()
+        style.fontId = workbook._fonts.add(entry['font'])
+        style.fillId = workbook._fills.add(entry['fill'])
+        style.borderId = workbook._borders.add(entry['border'])
+        style.alignmentId = workbook._alignments.add(entry['alignment'])
+        style.protectionId = workbook._protections.add(entry['protection'])
+        if isinstance(entry['number_format'], str):
+            style.numFmtId = workbook._number_formats.add(entry['number_format']) + _FIRST_CUSTOM_NUMFMT
+        else:
+            style.numFmtId = entry['number_format']
+        style.quotePrefix = entry['quote_prefix']
+        style.pivotButton = entry['pivot_button']
+        mapping.append(workbook._cell_styles.add(style))
+    return mapping
+
+
+def _remap_styles(sheet_xml, mapping):
+    """Rewrite the style indices of a worksheet part"""
+    def replace(match):
+        return match.group(1) + str(mapping[int(match.group(2))]).encode() + match.group(3)
+    
+    sheet_xml = _CELL_STYLE_RE.sub(replace, sheet_xml)
+    sheet_xml = _COL_STYLE_RE.sub(replace, sheet_xml)
+    # Only the summary sheet may be selected, otherwise Excel opens the sheets grouped
+    return sheet_xml.replace(b' tabSelected="1"', b'')
+
+
+def render_discipline_sheet(task):
+    """
+    Worker: render one discipline section; task is (portfolio_id, discipline_id, name, title)
+    
+    Returns the worksheet XML part and the style table it refers to.
+    """
+    portfolio_id, discipline_id, name, title = task
+    started = time.perf_counter()
+    
+    portfolio = db.session.get(Portfolio, portfolio_id)
+    documents = (Document.query
+                 .filter_by(portfolio_id=portfolio_id, discipline_id=discipline_id)
+                 .order_by(Document.id)
+                 .all())
+    
+    exporter = MDRExcelExporter(portfolio)
+    exporter.worksheet.title = title
+    buffer = io.BytesIO()
+    exporter.export_section(buffer, name, documents)
+    
+    with zipfile.ZipFile(buffer) as package:
+        sheet_xml = package.read('xl/worksheets/sheet1.xml')
+    
+    return {
+        'discipline_id': discipline_id,
+        'name': name,
+        'documents': len(documents),
+        'sheet_xml': sheet_xml,
+        'styles': _style_table(exporter.workbook),
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+class MultiSheetExporter:
+    """Export an MDR as one worksheet per discipline plus a summary sheet"""
+    
+    def __init__(self, portfolio, workers=1):
+        self.portfolio = portfolio
+        self.workers = workers
+        self.timings = {}
+        
+        self.header_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")  # Yellow
+        self.header_font = Font(color="000000", bold=True, size=10)
+        self.discipline_fill = PatternFill(start_color="92D050", end_color="92D050", fill_type="solid")  # Green
+        self.border = Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        )
+    
+    def export(self, output):
+        """Generate the workbook into a path or binary file object"""
+        started = time.perf_counter()
+        
+        # Disciplines with documents, in the same order as the single-sheet export
+        counts = (
+            db.session.query(Document.discipline_id, Discipline.name, func.count(Document.id))
+            .outerjoin(Discipline, Document.discipline_id == Discipline.id)
+            .filter(Document.portfolio_id == self.portfolio.id)
+            .group_by(Document.discipline_id, Discipline.name)
+            .all()
+        )
+        sections = sorted(((name or UNASSIGNED, discipline_id, count) for discipline_id, name, count in counts),
+                          key=lambda section: section[0])
+        
+        used_titles = {'summary'}
+        titles = [sheet_title(name, used_titles) for name, _, _ in sections]
+        tasks = [(self.portfolio.id, discipline_id, name, title)
+                 for (name, discipline_id, _), title in zip(sections, titles)]
+        
+        render_started = time.perf_counter()
+        results = run_pool(render_discipline_sheet, tasks, self.workers, initializer=init_worker)
+        self.timings['render'] = round(time.perf_counter() - render_started, 3)
+        
+        failed = [r for r in results if 'error' in r]
+        if failed:
+            raise RuntimeError(f"Rendering sheet failed: {failed[0]['error']}")
+        
+        # Summary + placeholder sheets; worker styles registered before saving
+        assemble_started = time.perf_counter()
+        workbook = openpyxl.Workbook()
+        summary = workbook.active
+        summary.title = "Summary"
+        self._write_summary(summary, list(zip(titles, sections)))
+        
+        placeholders = [workbook.create_sheet(title) for title in titles]
+        mappings = [_register_styles(workbook, result['styles']) for result in results]
+        self._store_metadata(workbook)
+        
+        skeleton = io.BytesIO()
+        workbook.save(skeleton)
+        
+        replacements = {
+            sheet.path.lstrip('/'): _remap_styles(result['sheet_xml'], mapping)
+            for sheet, result, mapping in zip(placeholders, results, mappings)
+        }
+        with zipfile.ZipFile(skeleton) as source, \
+                zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as package:
+            for item in source.infolist():
+                package.writestr(item.filename, replacements.get(item.filename) or source.read(item.filename),
+                                 compress_type=zipfile.ZIP_DEFLATED)
+        
+        self.timings['assemble'] = round(time.perf_counter() - assemble_started, 3)
+        self.timings['total'] = round(time.perf_counter() - started, 3)
+        self.timings['sheets'] = {result['name']: result['seconds'] for result in results}
+        return output
+    
+    def _write_summary(self, worksheet, sections):
+        """Portfolio details and a linked table of discipline sheets"""
+        worksheet['A1'] = self.portfolio.name
+        worksheet['A1'].font = Font(bold=True, size=14)
+        worksheet['A2'] = f"Project Code: {self.portfolio.code}"
+        if self.portfolio.client:
+            worksheet['A3'] = f"Client: {self.portfolio.client}"
+        worksheet['A4'] = f"Generated: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
+        worksheet['A4'].font = Font(size=8)
+        
+        header_row = 6
+        for col, text in enumerate(["Discipline", "Sheet", "Documents"], 1):
+            cell = worksheet.cell(row=header_row, column=col, value=text)
+            cell.fill = self.header_fill
+            cell.font = self.header_font
+            cell.alignment = Alignment(horizontal='center', vertical='center')
+            cell.border = self.border
+        
+        row = header_row
+        for title, (name, _, count) in sections:
+            row += 1
+            worksheet.cell(row=row, column=1, value=name).border = self.border
+            link = worksheet.cell(row=row, column=2, value=title)
+            link.hyperlink = Hyperlink(ref=link.coordinate, location="'{}'!A1".format(title.replace("'", "''")))
+            link.font = Font(color="0563C1", underline='single')
+            link.border = self.border
+            worksheet.cell(row=row, column=3, value=count).border = self.border
+        
+        total = worksheet.cell(row=row + 1, column=1, value="Total")
+        total.font = Font(bold=True)
+        total.fill = self.discipline_fill
+        total.border = self.border
+        worksheet.cell(row=row + 1, column=2).fill = self.discipline_fill
+        worksheet.cell(row=row + 1, column=2).border = self.border
+        total_count = worksheet.cell(row=row + 1, column=3, value=sum(section[2] for _, section in sections))
+        total_count.font = Font(bold=True)
+        total_count.fill = self.discipline_fill
+        total_count.border = self.border
+        
+        worksheet.column_dimensions['A'].width = 45
+        worksheet.column_dimensions['B'].width = 33
+        worksheet.column_dimensions['C'].width = 12
+    
+    def _store_metadata(self, workbook):
+        """Same document properties as the single-sheet export"""
+        props = workbook.properties
+        props.title = self.portfolio.name
+        props.subject = f"Project Code: {self.portfolio.code}"
+        props.description = self.portfolio.description or ""
+        props.creator = "MDR Portfolio Manager"
+        props.keywords = f"MDR,{self.portfolio.code}"
@@ -0,0 +1,102 @@
+"""
+Overdue stage detection
+A stage is overdue when its planned date is before today and it has no actual
+date. Queries run on the typed stage_dates table, which the flush hooks keep in
+line with the free-form stage date strings (see shared.models.refresh_stage_dates),
+so whole portfolios are evaluated with index range scans on (owner, done, planned).
+"""
+
+from datetime import date
+
+from sqlalchemy import select, func, false
+
+from shared.models import db, Document, StageDate, STAGE_DATE_SOURCES, refresh_stage_dates
+from shared.calendars import portfolio_calendar
+
+
+def overdue_conditions(today=None):
+    """WHERE conditions on StageDate for stages overdue as of today"""
+    return [StageDate.done == false(), StageDate.planned < (today or date.today())]
+
+
+def count_overdue_documents(discipline_ids=None, portfolio_ids=None, today=None, session=None):
+    """Number of documents with at least one overdue stage in the given disciplines or portfolios"""
+    session = session or db.session
+    query = select(func.count(func.distinct(StageDate.document_id))).where(*overdue_conditions(today))
+    if discipline_ids is not None:
+        query = query.where(StageDate.discipline_id.in_(discipline_ids))
+    if portfolio_ids is not None:
+        query = query.where(StageDate.portfolio_id.in_(portfolio_ids))
+    return session.execute(query).scalar()
+
+
+def overdue_by_portfolio(today=None, session=None):
+    """{portfolio_id: (overdue documents, overdue stages)} for every portfolio with overdue work"""
+    session = session or db.session
+    rows = session.execute(
+        select(StageDate.portfolio_id, func.count(func.distinct(StageDate.document_id)), func.count())
+        .where(*overdue_conditions(today))
+        .group_by(StageDate.portfolio_id)
+    ).all()
+    return {portfolio_id: (documents, stages) for portfolio_id, documents, stages in rows}
+
+
+def overdue_stages(portfolio_id, today=None, limit=None, session=None):
+    """
+    (document id, doc number, stage, planned date, days late) of a portfolio's
+    overdue stages, latest first
+    
+    Days late are working days on the portfolio's calendar (shared.calendars).
+    """
+    session = session or db.session
+    today = today or date.today()
+    query = (
+        select(StageDate.document_id, Document.doc_number, StageDate.stage, StageDate.planned)
+        .join(Document, Document.id == StageDate.document_id)
+        .where(StageDate.portfolio_id == portfolio_id, *overdue_conditions(today))
+        .order_by(StageDate.planned, Document.doc_number)
+    )
+    if limit:
+        query = query.limit(limit)
+    rows = session.execute(query).all()
+    if not rows:
+        return []
+    late = portfolio_calendar(portfolio_id, session).count([planned for *_, planned in rows], today)
+    return [(document_id, doc_number, stage, planned, int(days))
+            for (document_id, doc_number, stage, planned), days in zip(rows, late)]
+
+
+def backfill_stage_dates(session, portfolio_id=None, batch_size=1000, progress=None):
+    """
+    Rebuild the stage_dates rows of every document (or one portfolio's) in batches
+    
+    For databases created before the table existed and after bulk INSERTs,
+    which bypass the flush hooks. Commits after each batch, then refreshes the
+    summaries of the portfolios processed (their overdue counts come from
+    stage_dates); returns the number of documents processed.
+    """
+    from shared.summary import refresh_summaries
+    
+    columns = [Document.id] + [getattr(Document, field) for field in STAGE_DATE_SOURCES]
+    done = 0
+    last_id = 0
+    portfolio_ids = set()
+    while True:
+        query = select(*columns).where(Document.id > last_id).order_by(Document.id).limit(batch_size)
+        if portfolio_id is not None:
+            query = query.where(Document.portfolio_id == portfolio_id)
+        rows = session.execute(query).mappings().all()
+        if not rows:
+            break
+        refresh_stage_dates(session.connection(), rows)
+        session.commit()
+        portfolio_ids.update(row['portfolio_id'] for row in rows)
+        done += len(rows)
+        last_id = rows[-1]['id']
+        if progress:
+            progress(done)
+    
+    for portfolio_id in sorted(portfolio_ids):
+        refresh_summaries(session.connection(), portfolio_id)
+        session.commit()
+    return done
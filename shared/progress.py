@@ -0,0 +1,104 @@
+"""
+Progress reporting and cooperative cancellation
+Long-running engines (Excel import, export, load and generate) accept an
+optional progress callback and CancellationToken. The callback receives a
+Progress tuple per phase and every few hundred milliseconds; the engine checks
+the token between rows and raises OperationCancelled once it is set.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+
+class Progress(namedtuple('Progress', 'phase done total elapsed rate')):
+    """Snapshot of one phase: rows done (of total, None if unknown), seconds elapsed and rows/sec"""
+    
+    __slots__ = ()
+    
+    @property
+    def fraction(self):
+        """Share of the phase completed (0-1), or None when the total is unknown"""
+        if not self.total:
+            return None
+        return min(self.done / self.total, 1.0)
+    
+    def __str__(self):
+        count = f"{self.done}/{self.total}" if self.total else f"{self.done}"
+        return f"{self.phase}: {count} rows ({self.elapsed:.1f}s, {self.rate:.0f} rows/s)"
+
+
+class OperationCancelled(Exception):
+    """Raised inside an operation after its CancellationToken was cancelled"""
+
+
+class CancellationToken:
+    """Thread-safe flag another thread (or a GUI callback) sets to stop an operation"""
+    
+    def __init__(self):
+        self._event = threading.Event()
+    
+    def cancel(self):
+        self._event.set()
+    
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+    
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise OperationCancelled("Operation cancelled")
+
+
+class ProgressTracker:
+    """
+    Row counter used by the engines; rate-limits the callback and checks the token
+    
+    Both arguments are optional, so engines can always call into a tracker.
+    """
+    
+    def __init__(self, callback=None, cancel_token=None, interval=0.2):
+        self.callback = callback
+        self.cancel_token = cancel_token
+        self.interval = interval
+        self.phase_name = None
+        self.total = None
+        self.done = 0
+        self._started = time.perf_counter()
+        self._last_report = 0.0
+    
+    def phase(self, name, total=None):
+        """Start a new phase (reported immediately)"""
+        self.check()
+        self.phase_name = name
+        self.total = total
+        self.done = 0
+        self._started = time.perf_counter()
+        self._report()
+    
+    def advance(self, rows=1):
+        """Count processed rows; reports when the interval has passed"""
+        self.check()
+        self.done += rows
+        if self.callback and time.perf_counter() - self._last_report >= self.interval:
+            self._report()
+    
+    def finish(self, done=None):
+        """Report the final count of the current phase (without checking for cancellation)"""
+        if done is not None:
+            self.done = done
+        self._report()
+    
+    def check(self):
+        """Raise OperationCancelled if cancellation was requested"""
+        if self.cancel_token is not None:
+            self.cancel_token.raise_if_cancelled()
+    
+    def _report(self):
+        if not self.callback:
+            return
+        now = time.perf_counter()
+        elapsed = now - self._started
+        self._last_report = now
+        self.callback(Progress(self.phase_name, self.done, self.total, elapsed,
+                               self.done / elapsed if elapsed > 0 else 0.0))
@@ -0,0 +1,177 @@
+"""
+Back-scheduling of planned stage dates
+Planned issue dates are worked back from a target AFC date: each scheduled stage
+is issued its duration in working days (STAGE_DURATIONS) before the next one,
+on the portfolio's working-day calendar. The dates of a whole portfolio or
+discipline come from one busday_offset call; plan_schedule lists the resulting
+changes for review and apply_schedule writes them with a single bulk UPDATE.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+from sqlalchemy import select, update, bindparam
+
+from shared.models import db, Document, Discipline, get_portfolio_version, bump_portfolio_version, \
+    refresh_stage_dates
+from shared.dates import normalize_date
+from shared.calendars import DEFAULT_CALENDAR, portfolio_calendar
+from shared.summary import refresh_summaries
+from mdr_stages_config import STANDARD_STAGES, STAGE_DURATIONS
+
+STAGE_CODES = [stage['code'] for stage in STANDARD_STAGES]
+PLANNED_FIELDS = [f"{code.lower()}_date_planned" for code in STAGE_CODES]
+ACTUAL_FIELDS = [f"{code.lower()}_date_actual" for code in STAGE_CODES]
+
+ScheduleChange = namedtuple('ScheduleChange', 'document_id doc_number discipline stage old new')
+
+
+class Schedule:
+    """
+    Planned dates computed for a set of documents
+    
+    changes lists every planned date that differs from the stored one; rows
+    holds the complete planned/actual fields of the documents with changes (what
+    apply_schedule writes); version is the portfolio version the plan was
+    computed from.
+    """
+    
+    def __init__(self, portfolio_id, version, documents, skipped, changes, rows):
+        self.portfolio_id = portfolio_id
+        self.version = version
+        self.documents = documents
+        self.skipped = skipped
+        self.changes = changes
+        self.rows = rows
+    
+    def __repr__(self):
+        return f'<Schedule portfolio={self.portfolio_id} v{self.version} changes={len(self.changes)}>'
+
+
+def stage_offsets(durations=None):
+    """
+    Working days each stage is issued before AFC, and which stages are scheduled
+    
+    durations maps stage codes to the working days until the next scheduled
+    stage (default STAGE_DURATIONS); stages left out are not scheduled. AFC is
+    always scheduled, at offset 0. Raises ValueError for unknown stages or
+    negative durations.
+    """
+    durations = STAGE_DURATIONS if durations is None else durations
+    unknown = set(durations) - set(STAGE_CODES[:-1])
+    if unknown:
+        raise ValueError(f"No duration can be set for: {', '.join(sorted(unknown))}")
+    offsets = np.zeros(len(STAGE_CODES), dtype=np.int64)
+    scheduled = np.zeros(len(STAGE_CODES), dtype=bool)
+    scheduled[-1] = True
+    total = 0
+    for i in range(len(STAGE_CODES) - 2, -1, -1):
+        code = STAGE_CODES[i]
+        if code in durations:
+            days = int(durations[code])
+            if days < 0:
+                raise ValueError(f"Duration of {code} must not be negative")
+            total += days
+            offsets[i] = total
+            scheduled[i] = True
+    return offsets, scheduled
+
+
+def back_schedule(targets, offsets, calendar=DEFAULT_CALENDAR):
+    """
+    Planned dates (documents x stages, datetime64[D]) from AFC targets
+    
+    Targets on a non-working day are moved back to the working day before.
+    """
+    targets = np.asarray(targets, dtype='datetime64[D]')
+    return calendar.offset(targets[:, None], -offsets[None, :], roll='preceding')
+
+
+def plan_schedule(portfolio_id, target=None, durations=None, discipline_id=None, overwrite=True,
+                  calendar=None, holidays=(), session=None):
+    """
+    Back-schedule a portfolio's (or one discipline's) documents without writing anything
+    
+    target is the AFC date of every document; without one each document keeps
+    its own planned AFC date and documents with none are skipped. Stages with an
+    actual date keep their planned date, and so do planned dates already filled
+    in unless overwrite is set. calendar defaults to the portfolio's (see
+    shared.calendars) and holidays adds days off for this run. Returns a
+    Schedule; raises ValueError for invalid durations or holidays.
+    """
+    session = session or db.session
+    offsets, scheduled = stage_offsets(durations)
+    calendar = calendar or portfolio_calendar(portfolio_id, session)
+    if holidays:
+        calendar = calendar.with_holidays(holidays)
+    # Version first: apply_schedule refuses a plan made from older data
+    version = get_portfolio_version(portfolio_id, session)
+    
+    columns = [Document.id, Document.portfolio_id, Document.discipline_id, Document.doc_number,
+               Discipline.name.label('discipline_name')]
+    columns += [getattr(Document, field) for field in PLANNED_FIELDS + ACTUAL_FIELDS]
+    query = (select(*columns).outerjoin(Discipline, Discipline.id == Document.discipline_id)
+             .where(Document.portfolio_id == portfolio_id).order_by(Document.doc_number, Document.id))
+    if discipline_id is not None:
+        query = query.where(Document.discipline_id == discipline_id)
+    documents = session.execute(query).mappings().all()
+    
+    if target is not None:
+        targets = [target] * len(documents)
+    else:
+        targets = [normalize_date(row[PLANNED_FIELDS[-1]]) for row in documents]
+    dated = [(row, day) for row, day in zip(documents, targets) if day]
+    if not dated:
+        return Schedule(portfolio_id, version, 0, len(documents), [], [])
+    
+    planned = np.datetime_as_string(back_schedule([day for _, day in dated], offsets, calendar), unit='D')
+    
+    changes = []
+    rows = []
+    for (row, _), values in zip(dated, planned):
+        new_row = None
+        for i, code in enumerate(STAGE_CODES):
+            old = row[PLANNED_FIELDS[i]] or ''
+            if not scheduled[i] or (row[ACTUAL_FIELDS[i]] or '').strip():
+                continue
+            if old.strip() and not overwrite:
+                continue
+            # The same date in another format is not a change
+            old_date = normalize_date(old)
+            if old_date is not None and old_date.isoformat() == values[i]:
+                continue
+            if new_row is None:
+                new_row = dict(row)
+            new_row[PLANNED_FIELDS[i]] = str(values[i])
+            changes.append(ScheduleChange(row['id'], row['doc_number'], row['discipline_name'] or 'Unassigned',
+                                          code, old, str(values[i])))
+        if new_row is not None:
+            rows.append(new_row)
+    return Schedule(portfolio_id, version, len(dated), len(documents) - len(dated), changes, rows)
+
+
+def apply_schedule(schedule, session=None):
+    """
+    Write a Schedule's planned dates with one bulk UPDATE and commit; returns the documents updated
+    
+    Raises ValueError if the portfolio changed since the schedule was planned.
+    """
+    session = session or db.session
+    if not schedule.rows:
+        return 0
+    if get_portfolio_version(schedule.portfolio_id, session) != schedule.version:
+        raise ValueError("The portfolio changed since this schedule was planned; preview it again")
+    
+    # Bulk statements bypass the flush hooks: version, stage_dates and summaries by hand.
+    # The derived status columns do not depend on planned dates.
+    version = bump_portfolio_version(session, schedule.portfolio_id)
+    statement = update(Document.__table__).where(Document.__table__.c.id == bindparam('document_id'))
+    session.execute(statement, [
+        dict({field: row[field] for field in PLANNED_FIELDS}, document_id=row['id'], change_version=version)
+        for row in schedule.rows
+    ])
+    connection = session.connection()
+    refresh_stage_dates(connection, schedule.rows)
+    refresh_summaries(connection, schedule.portfolio_id)
+    session.commit()
+    return len(schedule.rows)
@@ -0,0 +1,191 @@
+"""
+Full-text document search
+doc_number, doc_title, remarks and every stage's transmittal numbers (*_tr_no,
+*_tr_received) are indexed by the database itself: an FTS5 table kept in sync
+by triggers on SQLite, a GIN index over their tsvector on PostgreSQL. ORM and
+bulk writes are therefore searchable as soon as they commit. install_search
+creates the index (init_db runs it); search_documents returns ranked pages of
+matches and search_condition the same match as a filter for other queries.
+Databases without either fall back to unindexed LIKE matching.
+"""
+
+import re
+
+from sqlalchemy import select, func, text, literal_column, table, column, or_, and_, inspect
+from sqlalchemy.exc import OperationalError
+
+from shared.models import db, Portfolio, Discipline, Document
+from mdr_stages_config import STANDARD_STAGES
+
+TRANSMITTAL_FIELDS = [f"{stage['code'].lower()}_{field}" for stage in STANDARD_STAGES
+                      for field in ('tr_no', 'tr_received')]
+SEARCH_FIELDS = ['doc_number', 'doc_title', 'remarks'] + TRANSMITTAL_FIELDS
+
+# Relative weight of a match per field: numbers and transmittals outrank words in titles and remarks
+FIELD_WEIGHTS = dict({'doc_number': 10.0, 'doc_title': 5.0, 'remarks': 1.0},
+                     **{field: 8.0 for field in TRANSMITTAL_FIELDS})
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# Words of a query beyond this are ignored
+MAX_TERMS = 10
+
+FTS_TABLE = 'documents_fts'
+PG_INDEX = 'ix_documents_search'
+
+# tsvector of a document on PostgreSQL; queries repeat it verbatim so the GIN index applies
+_PG_WEIGHTS = {'doc_number': 'A', 'doc_title': 'B', 'remarks': 'D'}
+PG_VECTOR = ' || '.join(
+    [f"setweight(to_tsvector('simple'::regconfig, coalesce({field}, '')), '{weight}')"
+     for field, weight in _PG_WEIGHTS.items()]
+    + ["setweight(to_tsvector('simple'::regconfig, "
+       + " || ' ' || ".join(f"coalesce({field}, '')" for field in TRANSMITTAL_FIELDS) + "), 'A')"]
+)
+_PG_TEXT = " || ' ' || ".join(f"coalesce({field}, '')" for field in SEARCH_FIELDS)
+
+_WORD = re.compile(r'\w+')
+
+
+def _sqlite_ddl():
+    """Statements creating the FTS5 table and the triggers keeping it in sync with documents"""
+    fields = ', '.join(SEARCH_FIELDS)
+    new = ', '.join(f"new.{field}" for field in SEARCH_FIELDS)
+    old = ', '.join(f"old.{field}" for field in SEARCH_FIELDS)
+    insert_new = f"INSERT INTO {FTS_TABLE}(rowid, {fields}) VALUES (new.id, {new});"
+    delete_old = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {fields}) VALUES ('delete', old.id, {old});"
+    return [
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({fields}, content='documents', content_rowid='id', "
+        f"prefix='2 3')",
+        f"CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON documents BEGIN {insert_new} END",
+        f"CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON documents BEGIN {delete_old} END",
+        f"CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF {fields} ON documents "
+        f"BEGIN {delete_old} {insert_new} END",
+        # Index the documents that exist already
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ]
+
+
+def install_search(engine):
+    """Create the full-text index of the documents table if it is missing"""
+    if engine.dialect.name == 'sqlite':
+        if inspect(engine).has_table(FTS_TABLE):
+            return
+        try:
+            with engine.begin() as connection:
+                for statement in _sqlite_ddl():
+                    connection.exec_driver_sql(statement)
+        except OperationalError as e:
+            print(f"[WARN] Full-text search unavailable ({e.orig}); searching without an index")
+            return
+        print("[OK] Created full-text search index")
+    elif engine.dialect.name == 'postgresql':
+        with engine.begin() as connection:
+            connection.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON documents USING GIN ({PG_VECTOR})")
+
+
+def _backend(session):
+    """'fts5', 'postgresql' or 'like' for the session's database"""
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return 'postgresql'
+    if dialect == 'sqlite':
+        found = session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+        ).scalar()
+        if found:
+            return 'fts5'
+    return 'like'
+
+
+def parse_query(text_query):
+    """Search terms of a query: its words, each split into letter/digit runs ('TR-0453' -> ['tr', '0453'])"""
+    terms = []
+    for word in (text_query or '').split()[:MAX_TERMS]:
+        parts = [part.lower() for part in _WORD.findall(word)]
+        if parts:
+            terms.append(parts)
+    if not terms:
+        raise ValueError("Enter a word or number to search for")
+    return terms
+
+
+def _search_clauses(backend, terms):
+    """(FROM clause, WHERE condition, rank, snippet) of a search; rank ascending is best first"""
+    if backend == 'fts5':
+        fts = table(FTS_TABLE, column('rowid'))
+        # Every word must match; a word's parts form a phrase, its last part a prefix
+        match = ' '.join('"' + ' '.join(parts) + '"*' for parts in terms)
+        weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in SEARCH_FIELDS)
+        return (fts.join(Document.__table__, Document.id == fts.c.rowid),
+                text(f"{FTS_TABLE} MATCH :match").bindparams(match=match),
+                literal_column(f"bm25({FTS_TABLE}, {weights})"),
+                literal_column(f"snippet({FTS_TABLE}, -1, '[', ']', '...', 12)"))
+    if backend == 'postgresql':
+        query = func.to_tsquery(literal_column("'simple'::regconfig"),
+                                ' & '.join(f"{part}:*" for parts in terms for part in parts))
+        vector = literal_column(f"({PG_VECTOR})")
+        return (Document.__table__,
+                vector.op('@@')(query),
+                -func.ts_rank_cd(vector, query),
+                func.ts_headline(literal_column("'simple'::regconfig"), literal_column(f"({_PG_TEXT})"), query,
+                                 'StartSel=[, StopSel=], MaxFragments=1, MaxWords=12, MinWords=4'))
+    conditions = [or_(*[getattr(Document, field).ilike(f"%{part}%") for field in SEARCH_FIELDS])
+                  for parts in terms for part in parts]
+    return Document.__table__, and_(*conditions), literal_column('0'), literal_column('NULL')
+
+
+def search_condition(text_query, session=None):
+    """
+    WHERE condition on documents matching a query as search_documents does
+    
+    Answered from the full-text index (a rowid subquery on FTS5, the GIN
+    expression on PostgreSQL). Raises ValueError for an empty query.
+    """
+    session = session or db.session
+    backend = _backend(session)
+    _, condition, _, _ = _search_clauses(backend, parse_query(text_query))
+    if backend == 'fts5':
+        return Document.id.in_(select(column('rowid')).select_from(table(FTS_TABLE)).where(condition))
+    return condition
+
+
+def search_documents(text_query, portfolio_ids=None, page=1, per_page=DEFAULT_PAGE_SIZE, session=None):
+    """
+    One page of the documents matching a query, best matches first
+    
+    Searches doc numbers, titles, remarks and transmittal numbers of the given
+    portfolios (None: all); every word must match, as a word prefix. Returns a
+    JSON-ready dict with the total and the page's results, each with a snippet
+    of the matching text ('[' and ']' around the matches). Raises ValueError for
+    an empty query or bad paging.
+    """
+    session = session or db.session
+    terms = parse_query(text_query)
+    if page < 1 or not 1 <= per_page <= MAX_PAGE_SIZE:
+        raise ValueError(f"page must be 1 or more and per_page between 1 and {MAX_PAGE_SIZE}")
+    result = {'query': text_query, 'page': page, 'per_page': per_page, 'total': 0, 'results': []}
+    if portfolio_ids is not None and not portfolio_ids:
+        return result
+    
+    backend = _backend(session)
+    source, condition, rank, snippet = _search_clauses(backend, terms)
+    conditions = [condition]
+    if portfolio_ids is not None:
+        conditions.append(Document.portfolio_id.in_(sorted(portfolio_ids)))
+    
+    result['total'] = session.execute(select(func.count()).select_from(source).where(*conditions)).scalar()
+    if not result['total']:
+        return result
+    rows = session.execute(
+        select(Document.id, Document.portfolio_id, Portfolio.code.label('portfolio_code'),
+               Discipline.name.label('discipline'), Document.doc_number, Document.doc_title,
+               Document.current_status, rank.label('rank'), snippet.label('snippet'))
+        .select_from(source)
+        .join(Portfolio, Portfolio.id == Document.portfolio_id)
+        .outerjoin(Discipline, Discipline.id == Document.discipline_id)
+        .where(*conditions)
+        .order_by(rank, Document.doc_number, Document.id)
+        .limit(per_page).offset((page - 1) * per_page)
+    ).mappings()
+    result['results'] = [dict(row, rank=-round(float(row['rank']), 4) if row['rank'] else 0.0) for row in rows]
+    return result
@@ -0,0 +1,140 @@
+"""
+Document status classification
+Normalizes the free-text current_status and the stage dates into the derived
+Document columns status_code, current_stage, feedback_stage and board_column.
+The flush hook in shared.models keeps them up to date for ORM writes; bulk
+INSERT/UPDATE statements call derived_fields themselves, and
+backfill_derived_fields fills rows written before the columns existed.
+"""
+
+from mdr_stages_config import STANDARD_STAGES
+
+# Normalized current_status values
+STATUS_DRAFT = 'draft'
+STATUS_IN_PROGRESS = 'in_progress'
+STATUS_SUBMITTED = 'submitted'
+STATUS_CLIENT_REVIEW = 'client_review'
+STATUS_APPROVED = 'approved'
+STATUS_AFC = 'afc'
+
+# Dashboard counters -> status codes
+STATUS_GROUPS = {
+    'pending': (STATUS_DRAFT,),
+    'submitted': (STATUS_SUBMITTED, STATUS_CLIENT_REVIEW),
+    'approved': (STATUS_APPROVED, STATUS_AFC),
+}
+
+# Kanban column codes and titles, in board order
+BOARD_COLUMNS = {
+    'todo': 'To Do',
+    'submitted': 'Submitted',
+    'client_review': 'Client Review',
+    'approved': 'Approved',
+}
+
+# Latest stage first
+_STAGES = [stage['code'] for stage in reversed(STANDARD_STAGES)]
+
+# Columns the classification reads; a change to any other column leaves it unchanged
+SOURCE_FIELDS = ['current_status'] + [
+    f"{code.lower()}_{field}" for code in _STAGES for field in ('date_actual', 'date_sent', 'date_received')
+]
+
+DERIVED_FIELDS = ('status_code', 'current_stage', 'feedback_stage', 'board_column')
+
+
+def status_code(current_status):
+    """Normalized code for a free-text status ('AFC', 'With client for review', ...)"""
+    status = (current_status or '').strip().lower()
+    if 'afc' in status or 'approved for construction' in status:
+        return STATUS_AFC
+    if 'approved' in status:
+        return STATUS_APPROVED
+    if 'client' in status or 'review' in status:
+        return STATUS_CLIENT_REVIEW
+    if 'submitted' in status:
+        return STATUS_SUBMITTED
+    if not status or 'draft' in status:
+        return STATUS_DRAFT
+    return STATUS_IN_PROGRESS
+
+
+def _latest_stage(get, *fields):
+    for code in _STAGES:
+        if any(get(f"{code.lower()}_{field}") for field in fields):
+            return code
+    return None
+
+
+def derived_fields(get):
+    """
+    Derived column values for one document
+    
+    get(field_name) returns a source field's value, e.g. a Document's
+    getattr or a row dict's get.
+    """
+    status = (get('current_status') or '').lower()
+    current_stage = _latest_stage(get, 'date_actual', 'date_sent')
+    
+    if 'afc' in status or 'approved for construction' in status:
+        column = 'approved'
+    elif 'client' in status or 'review' in status or 'awaiting' in status:
+        column = 'client_review'
+    elif 'submitted' in status or _latest_stage(get, 'date_sent'):
+        column = 'submitted'
+    else:
+        column = 'todo'
+    
+    return {
+        'status_code': status_code(status),
+        'current_stage': current_stage,
+        'feedback_stage': _latest_stage(get, 'date_received'),
+        'board_column': column,
+    }
+
+
+def classify(document):
+    """Set a Document's derived columns from its current values"""
+    for name, value in derived_fields(lambda field: getattr(document, field, None)).items():
+        setattr(document, name, value)
+
+
+def backfill_derived_fields(session, only_missing=True, batch_size=1000, progress=None):
+    """
+    Compute the derived columns of existing documents in batches
+    
+    Only rows without a status_code are touched unless only_missing is False.
+    The update leaves change_version alone: the visible document content does
+    not change. The summaries of the portfolios touched are refreshed at the
+    end, as the bulk UPDATE bypasses the flush hooks. Returns the number of
+    rows updated.
+    """
+    from sqlalchemy import select, update, bindparam
+    from shared.models import Document
+    from shared.summary import refresh_summaries
+    
+    columns = [Document.id, Document.portfolio_id] + [getattr(Document, field) for field in SOURCE_FIELDS]
+    # SET clause from the parameter names (the DERIVED_FIELDS)
+    statement = update(Document.__table__).where(Document.__table__.c.id == bindparam('document_id'))
+    updated = 0
+    last_id = 0
+    portfolio_ids = set()
+    while True:
+        query = select(*columns).where(Document.id > last_id).order_by(Document.id).limit(batch_size)
+        if only_missing:
+            query = query.where(Document.status_code.is_(None))
+        rows = session.execute(query).mappings().all()
+        if not rows:
+            break
+        session.execute(statement, [dict(derived_fields(row.get), document_id=row['id']) for row in rows])
+        session.commit()
+        portfolio_ids.update(row['portfolio_id'] for row in rows)
+        updated += len(rows)
+        last_id = rows[-1]['id']
+        if progress:
+            progress(updated)
+    
+    for portfolio_id in sorted(portfolio_ids):
+        refresh_summaries(session.connection(), portfolio_id)
+        session.commit()
+    return updated
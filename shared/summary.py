@@ -0,0 +1,186 @@
+"""
+Materialized portfolio and discipline summaries
+portfolio_summary and discipline_summary hold the document counters the home
+pages show: per status code, per completed stage, overdue, awaiting client and
+with client feedback. The flush hooks in shared.models recompute the disciplines
+a flush touches; bulk INSERT/UPDATE statements call refresh_summaries, and
+rebuild_summaries ('mdr_cli.py rebuild-summaries') recomputes everything.
+Overdue counts depend on the day, so readers refresh rows from an earlier day.
+"""
+
+from datetime import date, datetime
+
+from sqlalchemy import select, func, case, and_, or_, delete, insert
+
+from shared.models import db, Portfolio, Discipline, Document, StageDate, PortfolioSummary, DisciplineSummary
+from shared.overdue import overdue_conditions
+from shared.status import STATUS_GROUPS
+from mdr_stages_config import STANDARD_STAGES
+
+# discipline_summary key of the documents without a discipline
+UNASSIGNED = 0
+
+# Counter columns named after the status codes they count
+STATUS_COLUMNS = ('draft', 'in_progress', 'submitted', 'client_review', 'approved', 'afc')
+COMPLETED_COLUMNS = {f"{stage['code'].lower()}_completed": stage['code'].lower() for stage in STANDARD_STAGES}
+COUNT_COLUMNS = ('documents',) + STATUS_COLUMNS + ('awaiting_client', 'requires_attention', 'overdue') \
+    + tuple(COMPLETED_COLUMNS)
+
+
+def _count(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _in_keys(column, keys):
+    """column matches one of the discipline keys (UNASSIGNED matching NULL)"""
+    conditions = []
+    ids = [key for key in keys if key != UNASSIGNED]
+    if ids:
+        conditions.append(column.in_(ids))
+    if UNASSIGNED in keys:
+        conditions.append(column.is_(None))
+    return or_(*conditions)
+
+
+def _discipline_counts(connection, portfolio_id, keys, today):
+    """{discipline key: {column: count}} for the portfolio's documents in keys (None: all)"""
+    key = func.coalesce(Document.discipline_id, UNASSIGNED)
+    columns = [func.count(Document.id).label('documents')]
+    columns += [_count(Document.status_code == code).label(code) for code in STATUS_COLUMNS]
+    columns.append(_count(Document.board_column == 'client_review').label('awaiting_client'))
+    columns.append(_count(Document.feedback_stage.isnot(None)).label('requires_attention'))
+    for name, stage in COMPLETED_COLUMNS.items():
+        actual = getattr(Document, f'{stage}_date_actual')
+        columns.append(_count(and_(actual.isnot(None), actual != '')).label(name))
+    query = select(key.label('key'), *columns).where(Document.portfolio_id == portfolio_id).group_by(key)
+    
+    overdue_key = func.coalesce(StageDate.discipline_id, UNASSIGNED)
+    overdue_query = (select(overdue_key, func.count(func.distinct(StageDate.document_id)))
+                     .where(StageDate.portfolio_id == portfolio_id, *overdue_conditions(today))
+                     .group_by(overdue_key))
+    if keys is not None:
+        query = query.where(_in_keys(Document.discipline_id, keys))
+        overdue_query = overdue_query.where(_in_keys(StageDate.discipline_id, keys))
+    
+    counts = {row.key: dict(row._mapping, overdue=0) for row in connection.execute(query)}
+    for group, overdue in connection.execute(overdue_query):
+        if group in counts:
+            counts[group]['overdue'] = overdue
+    return counts
+
+
+def refresh_summaries(connection, portfolio_id, discipline_ids=None, today=None):
+    """
+    Recompute a portfolio's summary row and the rows of the given disciplines
+    
+    discipline_ids None recomputes every discipline; None inside it stands for
+    the unassigned documents. A portfolio last refreshed on an earlier day is
+    always recomputed completely so its overdue counts agree.
+    """
+    today = today or date.today()
+    now = datetime.utcnow()
+    keys = None if discipline_ids is None else {UNASSIGNED if d is None else d for d in discipline_ids}
+    if keys is not None:
+        as_of = connection.execute(
+            select(PortfolioSummary.as_of).where(PortfolioSummary.portfolio_id == portfolio_id)
+        ).scalar()
+        if as_of != today:
+            keys = None
+    
+    table = DisciplineSummary.__table__
+    stale = delete(table).where(table.c.portfolio_id == portfolio_id)
+    if keys is not None:
+        stale = stale.where(table.c.discipline_id.in_(keys))
+    connection.execute(stale)
+    counts = _discipline_counts(connection, portfolio_id, keys, today)
+    if counts:
+        connection.execute(insert(table), [
+            dict(values, portfolio_id=portfolio_id, discipline_id=key, as_of=today, updated_at=now)
+            for key, values in counts.items()
+        ])
+    
+    # The portfolio row adds up its discipline rows
+    totals = connection.execute(
+        select(*[func.coalesce(func.sum(getattr(table.c, name)), 0).label(name) for name in COUNT_COLUMNS])
+        .where(table.c.portfolio_id == portfolio_id)
+    ).one()._mapping
+    disciplines = connection.execute(
+        select(func.count(Discipline.id)).where(Discipline.portfolio_id == portfolio_id)
+    ).scalar()
+    portfolio_table = PortfolioSummary.__table__
+    connection.execute(delete(portfolio_table).where(portfolio_table.c.portfolio_id == portfolio_id))
+    connection.execute(insert(portfolio_table).values(
+        dict(totals, portfolio_id=portfolio_id, disciplines=disciplines, as_of=today, updated_at=now)
+    ))
+
+
+def delete_summaries(connection, portfolio_ids):
+    """Drop the summary rows of deleted portfolios"""
+    for table in (DisciplineSummary.__table__, PortfolioSummary.__table__):
+        connection.execute(delete(table).where(table.c.portfolio_id.in_(portfolio_ids)))
+
+
+def rebuild_summaries(session, today=None, progress=None):
+    """Recompute the summaries of every portfolio, one transaction each; returns the portfolio count"""
+    portfolio_ids = session.execute(select(Portfolio.id).order_by(Portfolio.id)).scalars().all()
+    for done, portfolio_id in enumerate(portfolio_ids, start=1):
+        refresh_summaries(session.connection(), portfolio_id, today=today)
+        session.commit()
+        if progress:
+            progress(done, len(portfolio_ids))
+    
+    # Rows left behind by portfolios deleted outside the ORM
+    orphans = select(PortfolioSummary.portfolio_id).where(PortfolioSummary.portfolio_id.notin_(
+        select(Portfolio.id)))
+    orphan_ids = session.execute(orphans).scalars().all()
+    if orphan_ids:
+        delete_summaries(session.connection(), orphan_ids)
+        session.commit()
+    return len(portfolio_ids)
+
+
+def portfolio_summaries(portfolio_ids=None, session=None, today=None):
+    """
+    {portfolio_id: PortfolioSummary} for the given portfolios (None: all)
+    
+    Portfolios without a summary or with one from an earlier day are refreshed
+    (and committed) first.
+    """
+    session = session or db.session
+    today = today or date.today()
+    query = select(Portfolio.id, PortfolioSummary.as_of).outerjoin(
+        PortfolioSummary, PortfolioSummary.portfolio_id == Portfolio.id)
+    if portfolio_ids is not None:
+        query = query.where(Portfolio.id.in_(portfolio_ids))
+    stale = [portfolio_id for portfolio_id, as_of in session.execute(query) if as_of != today]
+    if stale:
+        for portfolio_id in stale:
+            refresh_summaries(session.connection(), portfolio_id, today=today)
+        session.commit()
+    
+    # Core statements rewrote the rows; don't return stale objects from the identity map
+    query = select(PortfolioSummary).execution_options(populate_existing=True)
+    if portfolio_ids is not None:
+        query = query.where(PortfolioSummary.portfolio_id.in_(portfolio_ids))
+    return {summary.portfolio_id: summary for summary in session.execute(query).scalars()}
+
+
+def discipline_summaries(portfolio_id, session=None, today=None):
+    """{discipline_id: DisciplineSummary} of a portfolio's disciplines with documents (UNASSIGNED: none)"""
+    session = session or db.session
+    portfolio_summaries([portfolio_id], session=session, today=today)
+    rows = session.execute(select(DisciplineSummary).where(DisciplineSummary.portfolio_id == portfolio_id)
+                           .execution_options(populate_existing=True))
+    return {summary.discipline_id: summary for summary in rows.scalars()}
+
+
+def combine(summaries):
+    """
+    Counter totals of several summary rows for the dashboards
+    
+    'pending', 'submitted' and 'approved' are the STATUS_GROUPS totals (e.g.
+    submitted includes client_review); the other keys are the raw columns.
+    """
+    totals = {name: sum(getattr(summary, name) for summary in summaries) for name in COUNT_COLUMNS}
+    groups = {name: sum(totals[code] for code in codes) for name, codes in STATUS_GROUPS.items()}
+    return dict(totals, **groups)
@@ -0,0 +1,220 @@
+"""
+Client turnaround
+Links client feedback to the submissions it answers and measures how long each
+submission stayed with the client, in working days of the portfolio's calendar
+(shared.calendars). A received date on a document (*_date_received) answers the
+latest submission of that stage sent on or before it. client_turnarounds keeps
+the mean and P90 days per client and stage for the dashboards. The flush hooks
+in shared.models update the submissions and clients a flush touches;
+sync_turnarounds ('mdr_cli.py backfill-turnarounds') recomputes everything,
+e.g. after bulk imports or calendar changes.
+"""
+
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import select, update, delete, insert, bindparam, func, or_
+
+from shared.models import db, Portfolio, Document, Submission, ClientTurnaround
+from shared.dates import normalize_date
+from shared.calendars import load_calendar
+from mdr_stages_config import STANDARD_STAGES
+
+STAGE_CODES = [stage['code'] for stage in STANDARD_STAGES]
+RECEIVED_FIELDS = [f"{code.lower()}_date_received" for code in STAGE_CODES]
+STATUS_FIELDS = [f"{code.lower()}_rev_status" for code in STAGE_CODES]
+
+# Key of portfolios without a client
+CLIENT_KEY = func.coalesce(Portfolio.client, '')
+
+
+def _update_submissions(session, rows):
+    """Executemany UPDATE of submissions from dicts with submission_id and the columns to set"""
+    by_columns = defaultdict(list)
+    for row in rows:
+        by_columns[tuple(sorted(row))].append(row)
+    table = Submission.__table__
+    for batch in by_columns.values():
+        session.execute(update(table).where(table.c.id == bindparam('submission_id')), batch)
+
+
+def match_feedback(session, document_ids=None):
+    """
+    Link the documents' received dates to the submissions they answer
+    
+    Sets response_date (and response_status from *_rev_status) of the latest
+    submission of each stage sent on or before the received date. Returns the
+    ids of the submissions changed.
+    """
+    columns = [Submission.id, Submission.document_id, Submission.stage, Submission.date_sent,
+               Submission.response_date, Submission.response_status]
+    columns += [getattr(Document, field) for field in RECEIVED_FIELDS + STATUS_FIELDS]
+    query = (select(*columns).join(Document, Document.id == Submission.document_id)
+             .where(Submission.date_sent.isnot(None))
+             .order_by(Submission.document_id, Submission.stage, Submission.date_sent, Submission.id))
+    if document_ids is not None:
+        query = query.where(Submission.document_id.in_(document_ids))
+    
+    # Rows are sorted, so the last candidate of each document stage is the latest sent
+    answered = {}
+    for row in session.execute(query).mappings():
+        stage = (row['stage'] or '').upper()
+        if stage not in STAGE_CODES:
+            continue
+        i = STAGE_CODES.index(stage)
+        received = normalize_date(row[RECEIVED_FIELDS[i]])
+        if received and row['date_sent'] <= received:
+            answered[(row['document_id'], stage)] = (row, received, (row[STATUS_FIELDS[i]] or '').strip())
+    
+    changes = []
+    for row, received, status in answered.values():
+        values = {}
+        if row['response_date'] != received:
+            values['response_date'] = received
+        if status and status != row['response_status']:
+            values['response_status'] = status
+        if values:
+            changes.append(dict(values, submission_id=row['id']))
+    if changes:
+        _update_submissions(session, changes)
+    return [change['submission_id'] for change in changes]
+
+
+def count_days_with_client(session, submission_ids=None):
+    """
+    Store the working days each answered submission spent with the client
+    
+    Days are counted from date_sent to response_date on the portfolio's
+    calendar, one vectorized count per calendar; submissions without both
+    dates get None. Returns the number of submissions changed.
+    """
+    query = (select(Submission.id, Submission.date_sent, Submission.response_date, Submission.days_with_client,
+                    Portfolio.calendar_id)
+             .join(Document, Document.id == Submission.document_id)
+             .join(Portfolio, Portfolio.id == Document.portfolio_id))
+    if submission_ids is not None:
+        query = query.where(Submission.id.in_(submission_ids))
+    else:
+        query = query.where(or_(Submission.days_with_client.isnot(None), Submission.response_date.isnot(None)))
+    
+    by_calendar = defaultdict(list)
+    changes = []
+    for row in session.execute(query):
+        if row.date_sent and row.response_date:
+            by_calendar[row.calendar_id].append(row)
+        elif row.days_with_client is not None:
+            changes.append({'submission_id': row.id, 'days_with_client': None})
+    for calendar_id, rows in by_calendar.items():
+        sent = np.array([row.date_sent for row in rows], dtype='datetime64[D]')
+        received = np.array([row.response_date for row in rows], dtype='datetime64[D]')
+        days = load_calendar(calendar_id, session).count(sent, received)
+        for row, value in zip(rows, days.tolist()):
+            # A reply dated before the submission is a data-entry error, not a turnaround
+            value = value if value >= 0 else None
+            if value != row.days_with_client:
+                changes.append({'submission_id': row.id, 'days_with_client': value})
+    if changes:
+        _update_submissions(session, changes)
+    return len(changes)
+
+
+def refresh_client_turnarounds(session, clients=None):
+    """
+    Recompute the client_turnarounds rows of the given client names (None: all)
+    
+    Rows hold the answered submissions' mean and P90 days with the client, and
+    the submissions still waiting for a reply.
+    """
+    query = (select(CLIENT_KEY.label('client'), Submission.stage, Submission.days_with_client,
+                    Submission.response_date)
+             .join(Document, Document.id == Submission.document_id)
+             .join(Portfolio, Portfolio.id == Document.portfolio_id)
+             .where(Submission.date_sent.isnot(None)))
+    if clients is not None:
+        clients = sorted(clients)
+        query = query.where(CLIENT_KEY.in_(clients))
+    
+    samples = defaultdict(list)
+    outstanding = defaultdict(int)
+    for client, stage, days, response_date in session.execute(query):
+        key = (client, (stage or '').upper())
+        if response_date is None:
+            outstanding[key] += 1
+        elif days is not None:
+            samples[key].append(days)
+    
+    now = datetime.utcnow()
+    rows = []
+    for key in sorted(set(samples) | set(outstanding)):
+        days = np.array(samples.get(key, []), dtype=np.float64)
+        rows.append({
+            'client': key[0],
+            'stage': key[1],
+            'samples': len(days),
+            'mean_days': round(float(days.mean()), 1) if len(days) else None,
+            'p90_days': round(float(np.percentile(days, 90)), 1) if len(days) else None,
+            'outstanding': outstanding.get(key, 0),
+            'updated_at': now,
+        })
+    table = ClientTurnaround.__table__
+    stale = delete(table)
+    if clients is not None:
+        stale = stale.where(table.c.client.in_(clients))
+    session.execute(stale)
+    if rows:
+        session.execute(insert(table), rows)
+
+
+def update_turnarounds(session, document_ids=(), submission_ids=(), clients=()):
+    """
+    Bring submissions and client_turnarounds in line with changed documents and submissions
+    
+    Runs automatically after every flush; call it after bulk statements that
+    write received dates or submissions.
+    """
+    submission_ids = set(submission_ids)
+    document_ids = set(document_ids)
+    if submission_ids:
+        # A new or edited submission may already be answered by a received date on its document
+        document_ids.update(session.execute(
+            select(Submission.document_id).where(Submission.id.in_(sorted(submission_ids)))
+        ).scalars())
+    if document_ids:
+        submission_ids.update(match_feedback(session, sorted(document_ids)))
+    if submission_ids:
+        count_days_with_client(session, sorted(submission_ids))
+    
+    # Clients of every document touched, directly or through a submission
+    clients = set(clients)
+    if document_ids:
+        clients.update(session.execute(
+            select(CLIENT_KEY).join(Document, Document.portfolio_id == Portfolio.id)
+            .where(Document.id.in_(sorted(document_ids))).distinct()
+        ).scalars())
+    if clients:
+        refresh_client_turnarounds(session, clients)
+
+
+def sync_turnarounds(session):
+    """
+    Match all feedback, recount every submission and rebuild client_turnarounds; commits
+    
+    Returns (submissions matched to feedback, days_with_client values changed).
+    """
+    matched = match_feedback(session)
+    counted = count_days_with_client(session)
+    refresh_client_turnarounds(session)
+    session.commit()
+    return len(matched), counted
+
+
+def client_turnarounds(clients=None, session=None):
+    """ClientTurnaround rows of the given client names (None: all), by client and stage order"""
+    session = session or db.session
+    query = select(ClientTurnaround).execution_options(populate_existing=True)
+    if clients is not None:
+        query = query.where(ClientTurnaround.client.in_([client or '' for client in clients]))
+    order = {code: i for i, code in enumerate(STAGE_CODES)}
+    rows = session.execute(query).scalars().all()
+    return sorted(rows, key=lambda row: (row.client, order.get(row.stage, len(order))))